@@ -27,8 +27,6 @@ def init_session_state():
         st.session_state.user_role = "User"
     if 'current_time' not in st.session_state:
         st.session_state.current_time = time.strftime("%Y-%m-%d %H:%M:%S")
-    if 'history' not in st.session_state:
-        st.session_state.history = []
     if 'page' not in st.session_state:
         st.session_state.page = "dashboard"
 
@@ -0,0 +1,227 @@
+"""
+Rollups over the resolved-ticket log (TicketStore) for the Analytics tab.
+
+Two small tables live next to `tickets` in the same SQLite file:
+  rollup_daily   (day, category, priority) -> ticket count
+  rollup_latency (category, latency bucket) -> ticket count
+AFTER INSERT triggers keep them current for every writer process, the same way
+the FTS index is maintained, so a dashboard render sums a few hundred rollup rows
+instead of scanning millions of tickets. Tickets logged before the triggers
+existed are backfilled once, in resumable chunks, with vectorized pandas/NumPy.
+Days are UTC.
+"""
+import datetime
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Upper bounds (ms) of the resolution latency buckets; the last bucket is open-ended
+LATENCY_BOUNDS_MS = (250, 500, 1000, 2000, 4000, 8000, 15000, 30000, 60000)
+
+
+def _latency_bucket_sql(column):
+    cases = " ".join(f"WHEN {column} <= {bound} THEN {i}" for i, bound in enumerate(LATENCY_BOUNDS_MS))
+    return f"CASE {cases} ELSE {len(LATENCY_BOUNDS_MS)} END"
+
+
+def bucket_label(bucket):
+    if bucket >= len(LATENCY_BOUNDS_MS):
+        return f">{LATENCY_BOUNDS_MS[-1] / 1000:g}s"
+    return f"≤{LATENCY_BOUNDS_MS[bucket] / 1000:g}s"
+
+
+class TicketAnalytics:
+    """
+    Incrementally maintained aggregates of a TicketStore database.
+    Open the TicketStore first: the triggers read its latency_ms column.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._backfill_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)  # explicit transactions
+        self._db.execute("PRAGMA journal_mode=WAL")
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._create_schema()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _create_schema(self):
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rollup_daily (day TEXT NOT NULL, category TEXT NOT NULL, "
+            "priority TEXT NOT NULL, n INTEGER NOT NULL, PRIMARY KEY (day, category, priority)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rollup_latency (category TEXT NOT NULL, bucket INTEGER NOT NULL, "
+            "n INTEGER NOT NULL, PRIMARY KEY (category, bucket)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS rollup_state (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        existed = self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'tickets_rollup_daily'").fetchone()
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS tickets_rollup_daily AFTER INSERT ON tickets BEGIN "
+            "INSERT INTO rollup_daily (day, category, priority, n) VALUES "
+            "(date(new.created, 'unixepoch'), COALESCE(new.category, ''), COALESCE(new.priority, ''), 1) "
+            "ON CONFLICT (day, category, priority) DO UPDATE SET n = n + 1; END"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS tickets_rollup_latency AFTER INSERT ON tickets "
+            "WHEN new.latency_ms IS NOT NULL BEGIN "
+            "INSERT INTO rollup_latency (category, bucket, n) VALUES "
+            f"(COALESCE(new.category, ''), {_latency_bucket_sql('new.latency_ms')}, 1) "
+            "ON CONFLICT (category, bucket) DO UPDATE SET n = n + 1; END"
+        )
+        if not existed:
+            # Rows up to here predate the triggers and are counted by backfill()
+            self._reset_backfill()
+
+    def _reset_backfill(self):
+        upto = self._db.execute("SELECT COALESCE(MAX(id), 0) FROM tickets").fetchone()[0]
+        self._db.executemany("INSERT OR REPLACE INTO rollup_state (key, value) VALUES (?, ?)",
+                             [("backfill_upto", upto), ("backfill_done", 0)])
+
+    def _state(self):
+        rows = dict(self._db.execute("SELECT key, value FROM rollup_state").fetchall())
+        return rows.get("backfill_done", 0), rows.get("backfill_upto", 0)
+
+    @property
+    def backfilling(self):
+        with self._lock:
+            done, upto = self._state()
+        return done < upto
+
+    def backfill(self, chunk_size=250000):
+        """
+        Aggregates the tickets logged before the triggers existed, chunk by chunk.
+        Each chunk commits with its high-water mark, so an interrupted backfill resumes.
+        Returns: tickets aggregated
+        """
+        total = 0
+        with self._backfill_lock:
+            while True:
+                with self._lock:
+                    done, upto = self._state()
+                    if done >= upto: return total
+                    frame = pd.read_sql_query(
+                        "SELECT id, created, category, priority, latency_ms FROM tickets "
+                        "WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                        self._db, params=(done, upto, chunk_size)
+                    )
+                    high = int(frame["id"].iloc[-1]) if len(frame) else upto
+                    daily, latency = self._aggregate(frame)
+                    self._db.execute("BEGIN IMMEDIATE")
+                    try:
+                        self._db.executemany(
+                            "INSERT INTO rollup_daily (day, category, priority, n) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT (day, category, priority) DO UPDATE SET n = n + excluded.n", daily)
+                        self._db.executemany(
+                            "INSERT INTO rollup_latency (category, bucket, n) VALUES (?, ?, ?) "
+                            "ON CONFLICT (category, bucket) DO UPDATE SET n = n + excluded.n", latency)
+                        self._db.execute("UPDATE rollup_state SET value = ? WHERE key = 'backfill_done'", (high,))
+                        self._db.execute("COMMIT")
+                    except Exception:
+                        self._db.execute("ROLLBACK")
+                        raise
+                total += len(frame)
+
+    @staticmethod
+    def _aggregate(frame):
+        """Vectorized group-by of one chunk. Returns: (daily rows, latency rows) for executemany"""
+        if frame.empty: return [], []
+        frame = frame.assign(
+            day=frame["created"].to_numpy() // 86400,  # UTC day number, as date(created, 'unixepoch')
+            category=frame["category"].fillna(""),
+            priority=frame["priority"].fillna(""),
+        )
+        daily = frame.groupby(["day", "category", "priority"], sort=False).size()
+        days = {d: (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(d))).isoformat()
+                for d in daily.index.unique(level="day")}
+        daily_rows = [(days[d], c, p, int(n)) for (d, c, p), n in daily.items()]
+
+        timed = frame[frame["latency_ms"].notna()]
+        buckets = np.searchsorted(LATENCY_BOUNDS_MS, timed["latency_ms"].to_numpy(), side="left")
+        latency = timed.assign(bucket=buckets).groupby(["category", "bucket"], sort=False).size()
+        latency_rows = [(c, int(b), int(n)) for (c, b), n in latency.items()]
+        return daily_rows, latency_rows
+
+    def rebuild(self):
+        """Recounts everything from the ticket log (e.g. after changing LATENCY_BOUNDS_MS)."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM rollup_daily")
+                self._db.execute("DELETE FROM rollup_latency")
+                self._reset_backfill()
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.backfill()
+
+    # --- Reads: each touches only the rollup tables
+
+    def total(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(n), 0) FROM rollup_daily").fetchone()[0]
+
+    def counts(self, by, since=None):
+        """
+        Ticket counts grouped by "category", "priority" or "day", optionally from day `since` (YYYY-MM-DD).
+        Returns: {key: count}, largest first (days in date order)
+        """
+        if by not in ("category", "priority", "day"):
+            raise ValueError(f"Unknown rollup dimension '{by}'")
+        sql = f"SELECT {by}, SUM(n) FROM rollup_daily"
+        args = []
+        if since:
+            sql += " WHERE day >= ?"
+            args.append(since)
+        order = "day" if by == "day" else "SUM(n) DESC"
+        with self._lock:
+            return dict(self._db.execute(f"{sql} GROUP BY {by} ORDER BY {order}", args).fetchall())
+
+    def daily(self, days=30, today=None):
+        """Returns: {YYYY-MM-DD: count} for the last `days` days (UTC), zero-filled"""
+        today = today or datetime.datetime.now(datetime.timezone.utc).date()
+        start = today - datetime.timedelta(days=days - 1)
+        found = self.counts("day", since=start.isoformat())
+        return {(start + datetime.timedelta(days=i)).isoformat(): found.get((start + datetime.timedelta(days=i)).isoformat(), 0)
+                for i in range(days)}
+
+    def latency(self, category=None):
+        """
+        Resolution latency distribution (all categories by default).
+        Returns: {"count", "p50_ms", "p95_ms", "buckets": {label: count}}; quantiles are bucket estimates
+        """
+        sql, args = "SELECT bucket, SUM(n) FROM rollup_latency", []
+        if category is not None:
+            sql += " WHERE category = ?"
+            args.append(category)
+        with self._lock:
+            found = dict(self._db.execute(sql + " GROUP BY bucket", args).fetchall())
+        counts = np.array([found.get(i, 0) for i in range(len(LATENCY_BOUNDS_MS) + 1)], dtype=np.int64)
+        total = int(counts.sum())
+        result = {"count": total, "buckets": {bucket_label(i): int(n) for i, n in enumerate(counts)}}
+        for q in (50, 95):
+            result[f"p{q}_ms"] = _bucket_quantile(counts, q / 100) if total else None
+        return result
+
+
+def _bucket_quantile(counts, q):
+    # Linear interpolation inside the bucket holding the q-th ticket; the open bucket reports its lower bound
+    rank = q * counts.sum()
+    cumulative = np.cumsum(counts)
+    i = int(np.searchsorted(cumulative, rank, side="left"))
+    if i >= len(LATENCY_BOUNDS_MS):
+        return float(LATENCY_BOUNDS_MS[-1])
+    lower = LATENCY_BOUNDS_MS[i - 1] if i else 0.0
+    before = cumulative[i - 1] if i else 0
+    return lower + (LATENCY_BOUNDS_MS[i] - lower) * (rank - before) / counts[i]
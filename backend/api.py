@@ -0,0 +1,142 @@
+"""
+Headless HTTP service for the Knowledge Base Engine.
+
+Run with:  uvicorn backend.api:app --host 0.0.0.0 --port 8000
+"""
+from contextlib import asynccontextmanager
+import json
+import os
+from typing import Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+from backend.deadline import Deadline
+from backend.metrics import metrics
+from backend.rag import kb_engine
+from backend.scheduler import LLM_CONCURRENCY, QueueFullError
+
+MAX_BATCH = int(os.environ.get("SUPPORTAI_MAX_BATCH", "100"))  # tickets per /analyze/batch request
+
+
+class TicketIn(BaseModel):
+    text: str
+    priority: Optional[str] = None  # Urgent/High/Medium/Low selects the time budget
+
+
+class TicketBatchIn(BaseModel):
+    texts: List[str] = Field(max_length=MAX_BATCH)
+    max_concurrency: int = Field(LLM_CONCURRENCY, ge=1)  # capped at SUPPORTAI_LLM_CONCURRENCY
+    budget_s: Optional[float] = None  # whole-batch deadline in seconds
+
+
+class AnalysisOut(BaseModel):
+    category: str
+    recommendations: List[str]
+    solution: str
+    timed_out: Optional[bool] = None
+    degraded: Optional[List[str]] = None
+    timings: Optional[Dict[str, float]] = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Warm the engine ONCE so the first request doesn't pay for index loading
+    await run_in_threadpool(kb_engine.ensure_kb_initialized)
+    kb_engine.watch_kb()
+    kb_engine.start_llm_probe()
+    yield
+
+
+app = FastAPI(title="SupportAI Knowledge API", version="1.2.0", lifespan=lifespan)
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full(request, exc):
+    # Backpressure: shed load instead of queueing without bound
+    return JSONResponse({"detail": f"Server busy, retry shortly ({exc})"}, status_code=503,
+                        headers={"Retry-After": "1"})
+
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "initialized": kb_engine.initialized,
+        "articles": len(getattr(kb_engine, "docs", [])),
+        "vector_search": kb_engine.retriever is not None,
+        "generation_mode": kb_engine.generation_mode,
+        "llm": kb_engine.llm_status,
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency histograms and fallback/cache/error counters in Prometheus text format."""
+    return PlainTextResponse(metrics.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/analyze")
+async def analyze(ticket: TicketIn, stream: bool = False):
+    if stream:
+        return StreamingResponse(_stream_analysis(ticket.text, ticket.priority), media_type="application/x-ndjson")
+    result = await kb_engine.aanalyze(ticket.text, ticket.priority)
+    await run_in_threadpool(kb_engine.record_ticket, ticket.text, result["category"], result["recommendations"],
+                            result["solution"], priority=ticket.priority or "",
+                            latency_ms=result["timings"]["total_ms"], best_doc=result["best_doc"],
+                            resolved=result["resolved"])
+    return AnalysisOut(category=result["category"], recommendations=result["recommendations"],
+                       solution=result["solution"], timed_out=result["timed_out"],
+                       degraded=result["degraded"], timings=result["timings"])
+
+
+@app.post("/analyze/batch")
+async def analyze_batch(batch: TicketBatchIn):
+    deadline = Deadline(batch.budget_s)
+    # Generations share the scheduler's LLM slots and queue with /analyze (503 when saturated)
+    results = await kb_engine.aanalyze_tickets(batch.texts, min(batch.max_concurrency, LLM_CONCURRENCY), deadline)
+    for text, r in zip(batch.texts, results):
+        await run_in_threadpool(kb_engine.record_ticket, text, r["category"], r["recommendations"], r["solution"],
+                                best_doc=r["best_doc"], resolved=r["resolved"])
+    return [AnalysisOut(category=r["category"], recommendations=r["recommendations"], solution=r["solution"],
+                        timed_out=r["timed_out"]) for r in results]
+
+
+@app.post("/categorize")
+async def categorize(ticket: TicketIn):
+    return {"category": await kb_engine.acategorize(ticket.text)}
+
+
+@app.post("/recommend")
+async def recommend(ticket: TicketIn):
+    return {"recommendations": await kb_engine.arecommend(ticket.text)}
+
+
+async def _stream_analysis(text, priority=None):
+    """
+    NDJSON stream: one {"category", "recommendations"} line first, then
+    {"token": ...} lines as the LLM produces them, then {"done": true, "timed_out", "timings", ...}.
+    """
+    deadline = kb_engine.deadline_for(priority)
+    try:
+        cat, recs, best_doc, query_vec = await kb_engine.aretrieve_context(text, deadline)
+    except Exception as e:
+        yield json.dumps({"error": f"Analysis failed: {e}"}) + "\n"
+        return
+    yield json.dumps({"category": cat, "recommendations": recs}) + "\n"
+
+    tokens = []
+    try:
+        async for token in kb_engine.astream_solution(text, best_doc, deadline, query_vec):
+            tokens.append(token)
+            yield json.dumps({"token": token}) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": f"Generation failed: {e}"}) + "\n"
+        tokens = []
+    report = deadline.finish()
+    await run_in_threadpool(kb_engine.record_ticket, text, cat, recs, "".join(tokens), priority=priority or "",
+                            latency_ms=report["timings"]["total_ms"], best_doc=best_doc,
+                            resolved=report["resolved"])
+    yield json.dumps({"done": True, **report}) + "\n"
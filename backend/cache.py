@@ -0,0 +1,259 @@
+import atexit
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def _doc_key(text):
+    # Stable 63-bit key so doc matching is a vectorized integer compare
+    return int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest()[:8], "big") >> 1
+
+
+class SemanticAnswerCache:
+    """
+    Caches generated solutions keyed on the query embedding.
+    A lookup hits when a stored query is within `threshold` cosine similarity AND
+    resolved to the same top article, so near-duplicate tickets skip the LLM.
+    Eviction is LRU (bounded by max_entries) with an optional TTL in seconds.
+    """
+
+    def __init__(self, path=None, threshold=0.92, max_entries=1000, ttl=None, save_every=10):
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.save_every = save_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._reset()
+        if path:
+            self.load()
+            atexit.register(self.flush)
+
+    def _reset(self, dim=None):
+        self._vecs = None if dim is None else np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._keys = np.zeros(self.max_entries, dtype=np.int64)
+        self._created = np.zeros(self.max_entries, dtype=np.float64)
+        self._valid = np.zeros(self.max_entries, dtype=bool)
+        self._docs = [None] * self.max_entries
+        self._solutions = [None] * self.max_entries
+        self._lru = OrderedDict()  # slot -> None, least recently used first
+
+    @staticmethod
+    def _normalize(vec):
+        vec = np.asarray(vec, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def get(self, query_vec, best_doc):
+        """Returns the cached solution or None."""
+        q = self._normalize(query_vec)
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                self.misses += 1
+                return None
+            if self.ttl:
+                self._expire(time.time() - self.ttl)
+            candidates = np.flatnonzero(self._valid & (self._keys == _doc_key(best_doc)))
+            if candidates.size:
+                sims = self._vecs[candidates] @ q
+                best = int(np.argmax(sims))
+                if sims[best] >= self.threshold:
+                    slot = int(candidates[best])
+                    self._lru.move_to_end(slot)
+                    self.hits += 1
+                    return self._solutions[slot]
+            self.misses += 1
+            return None
+
+    def put(self, query_vec, best_doc, solution):
+        q = self._normalize(query_vec)
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                # First entry or the embedder changed: old vectors are not comparable
+                self._reset(q.shape[0])
+            if len(self._lru) >= self.max_entries:
+                slot, _ = self._lru.popitem(last=False)
+            else:
+                slot = int(np.flatnonzero(~self._valid)[0])
+            self._vecs[slot] = q
+            self._keys[slot] = _doc_key(best_doc)
+            self._created[slot] = time.time()
+            self._valid[slot] = True
+            self._docs[slot] = best_doc
+            self._solutions[slot] = solution
+            self._lru[slot] = None
+            self._dirty += 1
+            should_save = self.path and self._dirty >= self.save_every
+        if should_save:
+            self.save()
+
+    def _expire(self, cutoff):
+        for slot in np.flatnonzero(self._valid & (self._created < cutoff)):
+            slot = int(slot)
+            self._valid[slot] = False
+            self._docs[slot] = self._solutions[slot] = None
+            self._lru.pop(slot, None)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._dirty += 1
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
+
+    def flush(self):
+        if self._dirty: self.save()
+
+    def save(self):
+        """Writes vectors.npy + entries.json (no pickle) in LRU order."""
+        if not self.path: return
+        with self._lock:
+            slots = list(self._lru)
+            vecs = self._vecs[slots] if self._vecs is not None else np.zeros((0, 0), dtype=np.float32)
+            entries = [{"doc": self._docs[s], "solution": self._solutions[s], "created": float(self._created[s])}
+                       for s in slots]
+            self._dirty = 0
+        os.makedirs(self.path, exist_ok=True)
+        np.save(os.path.join(self.path, "vectors.npy"), vecs)
+        with open(os.path.join(self.path, "entries.json"), "w") as f:
+            json.dump(entries, f)
+
+    def load(self):
+        vec_path = os.path.join(self.path, "vectors.npy")
+        meta_path = os.path.join(self.path, "entries.json")
+        if not (os.path.exists(vec_path) and os.path.exists(meta_path)): return
+        try:
+            vecs = np.load(vec_path)
+            with open(meta_path, "r") as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"Answer cache load failed, starting empty: {e}")
+            return
+        if not entries or len(entries) != len(vecs): return
+        with self._lock:
+            self._reset(vecs.shape[1])
+            for slot, (vec, entry) in enumerate(zip(vecs[-self.max_entries:], entries[-self.max_entries:])):
+                self._vecs[slot] = vec
+                self._keys[slot] = _doc_key(entry["doc"])
+                self._created[slot] = entry["created"]
+                self._valid[slot] = True
+                self._docs[slot] = entry["doc"]
+                self._solutions[slot] = entry["solution"]
+                self._lru[slot] = None
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Memoizes an Embeddings backend by content hash, so identical ticket text is
+    embedded only once. Keeps a bounded in-memory LRU and, if `path` is given,
+    a SQLite store (float32 blobs) that survives restarts.
+    Covers both embed_query and embed_documents.
+    """
+
+    def __init__(self, underlying, namespace="", path=None, max_entries=10000):
+        self.underlying = underlying
+        self.namespace = namespace  # model name: vectors from different models never mix
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(path, check_same_thread=False)
+                self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"Embedding cache store unavailable, using memory only: {e}")
+                self._db = None
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key):
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+                return vec
+            if self._db is None: return None
+            row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None: return None
+        vec = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self._remember(key, vec)
+        return vec
+
+    def _remember(self, key, vec):
+        with self._lock:
+            self._memory[key] = vec
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def embed_documents(self, texts):
+        keys = [self._key(t) for t in texts]
+        vectors = [self._lookup(k) for k in keys]
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # Only the misses go to the model, still as ONE batched call
+            fresh = self.underlying.embed_documents([texts[i] for i in missing])
+            for i, vec in zip(missing, fresh):
+                vectors[i] = vec
+                self._remember(keys[i], vec)
+            if self._db is not None:
+                rows = [(keys[i], np.asarray(vectors[i], dtype=np.float32).tobytes()) for i in missing]
+                with self._lock:
+                    self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+                    self._db.commit()
+        return vectors
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vec = self._lookup(key)
+        if vec is not None:
+            self.hits += 1
+            return vec
+        self.misses += 1
+        vec = self.underlying.embed_query(text)
+        self._remember(key, vec)
+        if self._db is not None:
+            with self._lock:
+                self._db.execute("INSERT OR REPLACE INTO embeddings VALUES (?, ?)",
+                                 (key, np.asarray(vec, dtype=np.float32).tobytes()))
+                self._db.commit()
+        return vec
+
+    def stats(self):
+        total = self.hits + self.misses
+        persisted = None
+        if self._db is not None:
+            with self._lock:
+                persisted = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "size": len(self._memory),
+            "persisted": persisted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
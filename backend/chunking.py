@@ -0,0 +1,33 @@
+import re
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_text(text, size=1500, overlap=200):
+    """
+    Splits text into pieces of at most `size` characters, breaking at sentence ends
+    (or whitespace for very long sentences); consecutive pieces share about
+    `overlap` characters so an answer spanning a boundary survives in one of them.
+    Returns: [text] unchanged when it already fits
+    """
+    text = text.strip()
+    if len(text) <= size: return [text] if text else []
+    if overlap >= size:
+        raise ValueError("overlap must be smaller than size")
+
+    chunks, start = [], 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            breaks = [m.end() for m in SENTENCE_END_RE.finditer(window)]
+            cut = breaks[-1] if breaks and breaks[-1] > size // 2 else window.rfind(" ") + 1
+            if cut > overlap:
+                end = start + cut
+        chunks.append(text[start:end].strip())
+        if end >= len(text): break
+        # Step back by `overlap`, then forward to a word start
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return [c for c in chunks if c]
@@ -0,0 +1,128 @@
+"""
+Password hashing with scrypt (hashlib, memory-hard).
+
+Stored format: scrypt$<n>$<r>$<p>$<salt b64>$<hash b64>, with a random 16-byte salt
+per user. Cost is tuned per deployment through SUPPORTAI_SCRYPT_N / _R / _P; records
+hashed with other parameters, and legacy plaintext records, verify once and are
+flagged for rehashing, so they migrate transparently on the next successful login.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+SCRYPT_N = int(os.environ.get("SUPPORTAI_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("SUPPORTAI_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("SUPPORTAI_SCRYPT_P", "1"))
+VERIFY_TIMEOUT = 5.0  # seconds a login or signup waits on the pool before failing closed
+PREFIX = "scrypt"
+
+# Bounded KDF pool: hashlib.scrypt releases the GIL, so up to four hashes run in parallel and no
+# more (each holds 128 * n * r bytes). Callers still wait on the future, with a timeout
+_executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="kdf")
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode("ascii")
+
+
+def _scrypt(password, salt, n, r, p):
+    # maxmem must cover 128 * n * r * p bytes plus OpenSSL's own overhead
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * n * r * p + 1024 * 1024, dklen=32)
+
+
+def hash_password(password, n=None, r=None, p=None):
+    n, r, p = n or SCRYPT_N, r or SCRYPT_R, p or SCRYPT_P
+    salt = os.urandom(16)
+    return f"{PREFIX}${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def verify_password(password, stored):
+    """Returns: (matches, needs_rehash)"""
+    if not stored:
+        return False, False
+    if not stored.startswith(PREFIX + "$"):
+        # Legacy plaintext record
+        return hmac.compare_digest(password.encode("utf-8"), stored.encode("utf-8")), True
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        expected = base64.b64decode(digest)
+        actual = _scrypt(password, base64.b64decode(salt), n, r, p)
+    except ValueError:
+        return False, False
+    return hmac.compare_digest(actual, expected), (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+# Unknown usernames verify against this so response time doesn't reveal which accounts exist
+_DUMMY_HASH = hash_password("not a real password")
+
+
+class VerificationCache:
+    """
+    Remembers recent successful verifications (e.g. Streamlit reruns of the login
+    form) for `ttl` seconds. Keys are HMACs under a per-process random key, so the
+    cache never holds passwords or fast unsalted hashes of them. ttl=0 disables it.
+    """
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()  # key -> expiry
+        self._lock = threading.Lock()
+
+    def _key(self, password, stored):
+        return hmac.new(self._secret, f"{stored}\0{password}".encode("utf-8"), hashlib.sha256).digest()
+
+    def hit(self, password, stored):
+        if not self.ttl: return False
+        key = self._key(password, stored)
+        with self._lock:
+            expiry = self._entries.get(key)
+            if expiry is None: return False
+            if expiry < time.monotonic():
+                del self._entries[key]
+                return False
+            return True
+
+    def add(self, password, stored):
+        if not self.ttl: return
+        with self._lock:
+            self._entries[self._key(password, stored)] = time.monotonic() + self.ttl
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+verification_cache = VerificationCache()
+
+
+def check_password(password, stored):
+    """
+    Constant-work verification for a login attempt (stored=None for unknown users).
+    Returns: (matches, needs_rehash)
+    """
+    if stored and verification_cache.hit(password, stored):
+        return True, False
+    matches, needs_rehash = verify_password(password, stored or _DUMMY_HASH)
+    if not stored:
+        return False, False
+    if not stored.startswith(PREFIX + "$"):
+        verify_password(password, _DUMMY_HASH)  # same KDF cost as a migrated account
+    if matches and not needs_rehash:
+        verification_cache.add(password, stored)
+    return matches, needs_rehash
+
+
+def check_password_async(password, stored):
+    """Runs check_password in the KDF pool. Returns: Future[(matches, needs_rehash)]"""
+    return _executor.submit(check_password, password, stored)
+
+
+def hash_password_async(password):
+    return _executor.submit(hash_password, password)
@@ -0,0 +1,69 @@
+import time
+from contextlib import contextmanager
+
+from backend.metrics import metrics
+
+# End-to-end budget in seconds per ticket priority (retrieval + generation)
+PRIORITY_BUDGETS = {"Urgent": 8.0, "High": 15.0, "Medium": 30.0, "Low": 60.0}
+RETRIEVAL_SHARE = 0.25  # at most this fraction of the budget is spent waiting on the embedder
+
+
+class Deadline:
+    """
+    Per-request time budget shared by the retrieval and generation stages.
+    seconds=None means no limit. Stages record their wall time in `timings`
+    (milliseconds) and in the process-wide stage metrics, and set `timed_out`
+    when they gave up on the budget. The solution step sets `completed` when the
+    model's answer (or a cached one) finished cleanly; it is "resolved" only if
+    nothing timed out, so a truncated answer is never reused as a resolution.
+    """
+
+    def __init__(self, seconds=None):
+        self.seconds = seconds
+        self.start = time.monotonic()
+        self.timings = {}
+        self.timed_out = False
+        self.completed = False
+        self.degraded = []  # stages that fell back (e.g. "retrieval" -> keyword only)
+        self._finished = False
+
+    @classmethod
+    def for_priority(cls, priority, budgets=None):
+        return cls((budgets or PRIORITY_BUDGETS).get(priority))
+
+    @property
+    def limited(self):
+        return self.seconds is not None
+
+    def remaining(self, share=1.0):
+        """Seconds left (None if unlimited); `share` caps it at a fraction of the whole budget."""
+        if self.seconds is None: return None
+        left = self.seconds - (time.monotonic() - self.start)
+        return max(0.0, min(left, self.seconds * share))
+
+    def expired(self):
+        return self.seconds is not None and time.monotonic() - self.start >= self.seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.monotonic()
+        try:
+            yield self
+        finally:
+            elapsed = time.monotonic() - start
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed * 1000
+            metrics.observe(name, elapsed)
+
+    def report(self):
+        """Returns: JSON-ready timing metadata for a result"""
+        timings = {f"{k}_ms": round(v, 1) for k, v in self.timings.items()}
+        timings["total_ms"] = round((time.monotonic() - self.start) * 1000, 1)
+        return {"budget_s": self.seconds, "timed_out": self.timed_out, "resolved": self.completed and not self.timed_out,
+                "degraded": list(self.degraded), "timings": timings}
+
+    def finish(self):
+        """Ends the request: records its total in the "request" metric (once). Returns: report()"""
+        if not self._finished:
+            self._finished = True
+            metrics.observe("request", time.monotonic() - self.start)
+        return self.report()
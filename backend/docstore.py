@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Maps FAISS labels to article records in a single SQLite table and fetches a
+    record only when it is retrieved, so startup never materializes the corpus and
+    nothing is unpickled. Labels are the int64 ids stored in the FAISS index.
+    Records are article chunks; each names its full article in `parents` via
+    metadata["parent_id"] (records without one are whole articles).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "label INTEGER PRIMARY KEY, doc_id TEXT UNIQUE NOT NULL, page_content TEXT NOT NULL, parent_id TEXT)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS parents (parent_id TEXT PRIMARY KEY, page_content TEXT NOT NULL)")
+        if "parent_id" not in {row[1] for row in self._db.execute("PRAGMA table_info(docs)")}:
+            self._db.execute("ALTER TABLE docs ADD COLUMN parent_id TEXT")
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_parent ON docs (parent_id)")
+        self._db.commit()
+
+    def search(self, search):
+        with self._lock:
+            row = self._db.execute("SELECT page_content, parent_id FROM docs WHERE doc_id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata={"parent_id": row[1]} if row[1] else {})
+
+    def parent(self, parent_id):
+        """Returns: the full article text, or None"""
+        with self._lock:
+            row = self._db.execute("SELECT page_content FROM parents WHERE parent_id = ?", (parent_id,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, texts, parents=None):
+        """
+        Adds {doc_id: Document}, assigning the next free labels, and {parent_id: article text}.
+        Returns the labels in order.
+        """
+        with self._lock:
+            start = self._next_label()
+            rows = [(start + j, doc_id, doc.page_content, doc.metadata.get("parent_id"))
+                    for j, (doc_id, doc) in enumerate(texts.items())]
+            self._db.executemany("INSERT INTO docs VALUES (?, ?, ?, ?)", rows)
+            if parents:
+                self._db.executemany("INSERT OR IGNORE INTO parents VALUES (?, ?)", parents.items())
+            self._db.commit()
+        return [row[0] for row in rows]
+
+    def delete_parents(self, parent_ids):
+        """Deletes articles and all their chunks. Returns the FAISS labels that were freed."""
+        parent_ids = list(parent_ids)
+        with self._lock:
+            labels = [r[0] for part in _parts(parent_ids) for r in self._db.execute(
+                f"SELECT label FROM docs WHERE parent_id IN ({_marks(part)})", part)]
+            for part in _parts(parent_ids):
+                self._db.execute(f"DELETE FROM docs WHERE parent_id IN ({_marks(part)})", part)
+                self._db.execute(f"DELETE FROM parents WHERE parent_id IN ({_marks(part)})", part)
+            self._db.commit()
+        return labels
+
+    def existing(self, ids):
+        """Returns: the subset of doc_ids already stored"""
+        return self._existing("docs", "doc_id", ids)
+
+    def existing_parents(self, parent_ids):
+        """Returns: the subset of parent_ids already stored"""
+        return self._existing("parents", "parent_id", parent_ids)
+
+    def _existing(self, table, column, ids):
+        ids = list(ids)
+        with self._lock:
+            return {r[0] for part in _parts(ids)
+                    for r in self._db.execute(f"SELECT {column} FROM {table} WHERE {column} IN ({_marks(part)})", part)}
+
+    def delete_after(self, label):
+        """Drops records with labels above `label` (rows written after the last saved index). Returns: rows dropped"""
+        with self._lock:
+            cur = self._db.execute("DELETE FROM docs WHERE label > ?", (label,))
+            # Articles whose chunks all went with them
+            self._db.execute("DELETE FROM parents WHERE parent_id NOT IN (SELECT parent_id FROM docs WHERE parent_id IS NOT NULL)")
+            self._db.commit()
+        return cur.rowcount
+
+    def last_label(self):
+        with self._lock:
+            return self._next_label() - 1
+
+    def _next_label(self):
+        return self._db.execute("SELECT COALESCE(MAX(label) + 1, 0) FROM docs").fetchone()[0]
+
+    def label_map(self):
+        return LabelMap(self)
+
+    def close(self):
+        self._db.close()
+
+
+def _parts(ids, size=500):
+    # Stay under SQLite's bound-parameter limit
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+def _marks(part):
+    return ",".join("?" * len(part))
+
+
+class LabelMap(Mapping):
+    """Lazy FAISS label -> doc_id view used as the vector store's index_to_docstore_id."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, label):
+        with self.store._lock:
+            row = self.store._db.execute("SELECT doc_id FROM docs WHERE label = ?", (int(label),)).fetchone()
+        if row is None:
+            raise KeyError(label)
+        return row[0]
+
+    def __iter__(self):
+        with self.store._lock:
+            labels = [r[0] for r in self.store._db.execute("SELECT label FROM docs ORDER BY label")]
+        return iter(labels)
+
+    def __len__(self):
+        with self.store._lock:
+            return self.store._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
@@ -0,0 +1,69 @@
+"""
+Pluggable embedders for the Knowledge Base Engine.
+
+Select one with the SUPPORTAI_EMBEDDER environment variable (default "ollama").
+The embedder id is recorded in the index manifest, so switching embedders
+triggers a full re-index on the next start.
+"""
+import os
+
+from langchain_core.embeddings import Embeddings
+from langchain_ollama import OllamaEmbeddings
+
+DEFAULT_EMBEDDER = os.environ.get("SUPPORTAI_EMBEDDER", "ollama")
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """
+    Compact sentence-embedding model running in-process on CPU
+    (all-MiniLM-L6-v2: 384-dim vectors, ~22M parameters).
+    Requires the optional `sentence-transformers` package; the model loads lazily.
+    """
+
+    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2", batch_size=32,
+                 num_threads=None, device="cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.device = device
+        self._model = None
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            if self.num_threads:
+                import torch
+                torch.set_num_threads(self.num_threads)
+            self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def embed_documents(self, texts):
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,  # cosine == inner product == monotone in L2
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+# name -> (embedder id recorded in the manifest, factory)
+EMBEDDERS = {
+    "ollama": ("llama3.2:1b", lambda: OllamaEmbeddings(model="llama3.2:1b")),
+    "minilm": ("st:all-MiniLM-L6-v2", lambda: SentenceTransformerEmbeddings(
+        num_threads=int(os.environ.get("SUPPORTAI_EMBED_THREADS", "0")) or None)),
+}
+
+
+def make_embedder(name=None):
+    """Returns: (embedder_id, Embeddings instance)"""
+    name = name or DEFAULT_EMBEDDER
+    if name not in EMBEDDERS:
+        raise ValueError(f"Unknown embedder '{name}'. Choose one of: {', '.join(EMBEDDERS)}")
+    embedder_id, factory = EMBEDDERS[name]
+    return embedder_id, factory()
@@ -0,0 +1,178 @@
+"""
+Content gap detection over recent ticket queries.
+
+A ticket is poorly covered when its best knowledge base match scores under a
+threshold. Those tickets are grouped with spherical k-means (cosine, NumPy only),
+deliberately over-split, and clusters whose centres are nearly the same direction
+are merged back, so the number of gaps follows the data rather than k. The groups
+are ranked by volume: each is one missing article, labelled by its most
+distinctive terms and illustrated by the tickets nearest its centre.
+"""
+import math
+from collections import Counter
+
+import numpy as np
+
+from backend.lexical import tokenize
+
+ASSIGN_BLOCK = 16384  # rows per similarity block: bounds the (rows x k) score matrix
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def choose_k(n, max_clusters=20):
+    # Rule of thumb sqrt(n/2), capped: a dashboard can't act on hundreds of gaps.
+    # An upper bound only: merge_clusters() folds the splits of one topic back together
+    return max(1, min(max_clusters, n, int(math.sqrt(n / 2))))
+
+
+def _assign(vectors, centroids):
+    labels = np.empty(len(vectors), dtype=np.int64)
+    best = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), ASSIGN_BLOCK):
+        sims = vectors[start:start + ASSIGN_BLOCK] @ centroids.T
+        labels[start:start + ASSIGN_BLOCK] = sims.argmax(axis=1)
+        best[start:start + ASSIGN_BLOCK] = sims.max(axis=1)
+    return labels, best
+
+
+def _init_centroids(vectors, k, rng, sample_size=10000):
+    # Greedy k-means++ seeding on a sample: O(sample * k) instead of O(n * k). Each step
+    # keeps the best of a few D^2-drawn candidates, so noisy embeddings (where every
+    # point is far from every other) still seed each dense topic instead of a random few
+    sample = vectors
+    if len(vectors) > sample_size:
+        sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    trials = 2 + int(math.log(k))
+    centroids = [sample[rng.integers(len(sample))]]
+    closest = 1.0 - sample @ centroids[0]
+    for _ in range(1, k):
+        weights = np.maximum(closest, 0.0)
+        total = weights.sum()
+        if total > 0:
+            candidates = rng.choice(len(sample), trials, p=weights / total)
+        else:
+            candidates = rng.integers(len(sample), size=trials)
+        distances = np.minimum(closest[None, :], 1.0 - sample[candidates] @ sample.T)
+        best = distances.sum(axis=1).argmin()
+        centroids.append(sample[candidates[best]])
+        closest = distances[best]
+    return np.vstack(centroids)
+
+
+def kmeans(vectors, k, iters=25, seed=0, tol=1e-4):
+    """
+    Spherical k-means over L2-normalized rows.
+    Returns: (labels, centroids) with unit-length centroids
+    """
+    rng = np.random.default_rng(seed)
+    centroids = _init_centroids(vectors, k, rng)
+    labels, best = _assign(vectors, centroids)
+    previous = best.mean()
+    for _ in range(iters):
+        # Per-cluster sums in one pass: sort by label, then reduce contiguous runs
+        order = np.argsort(labels, kind="stable")
+        present, starts = np.unique(labels[order], return_index=True)
+        sums = np.zeros_like(centroids)
+        sums[present] = np.add.reduceat(vectors[order], starts, axis=0)
+        # Empty clusters restart at the points their centroid explains worst
+        empty = np.setdiff1d(np.arange(k), present)
+        if len(empty):
+            sums[empty] = vectors[np.argsort(best)[:len(empty)]]
+        centroids = normalize_rows(sums)
+        labels, best = _assign(vectors, centroids)
+        score = best.mean()
+        if score - previous < tol: break
+        previous = score
+    return labels, centroids
+
+
+def merge_clusters(vectors, labels, centroids, threshold=0.8):
+    """
+    Repeatedly merges the two clusters whose centroids are most similar while that
+    cosine similarity is at least `threshold` (k is small: the k x k matrix is cheap).
+    Returns: (labels, centroids) renumbered 0..k'-1
+    """
+    k = len(centroids)
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, labels, vectors)
+    alive = np.bincount(labels, minlength=k) > 0
+    target = np.arange(k)
+    while alive.sum() > 1:
+        live = np.flatnonzero(alive)
+        unit = normalize_rows(sums[live])
+        sims = unit @ unit.T
+        np.fill_diagonal(sims, -np.inf)
+        a, b = np.unravel_index(np.argmax(sims), sims.shape)
+        if sims[a, b] < threshold: break
+        keep, gone = live[a], live[b]
+        sums[keep] += sums[gone]
+        alive[gone] = False
+        target[target == gone] = keep
+    live = np.flatnonzero(alive)
+    renumber = np.full(k, -1, dtype=np.int64)
+    renumber[live] = np.arange(len(live))
+    return renumber[target[labels]], normalize_rows(sums[live])
+
+
+def _ranked_terms(texts, doc_freq, n_docs):
+    # Terms frequent in this cluster but rare across all analyzed tickets
+    counts = Counter(t for text in texts for t in set(tokenize(text)))
+    return sorted(counts, key=lambda t: counts[t] * math.log(n_docs / doc_freq[t]), reverse=True)
+
+
+def _label(ranked, taken, terms=3):
+    # The top terms; a label another gap already has gets its next distinctive term instead
+    label = " ".join(ranked[:terms]).title() or "Unlabelled"
+    for extra in ranked[terms:]:
+        if label not in taken: break
+        label = " ".join(ranked[:terms - 1] + [extra]).title()
+    suffix = 2
+    unique = label
+    while unique in taken:
+        unique, suffix = f"{label} ({suffix})", suffix + 1
+    return unique
+
+
+def find_gaps(texts, vectors, coverage, threshold=0.5, max_clusters=20, min_size=2, examples=3,
+              merge_threshold=0.8):
+    """
+    texts/vectors: the ticket queries and their embeddings (one row per ticket, duplicates count)
+    coverage: each ticket's best knowledge base relevance score
+    merge_threshold: clusters whose centres are at least this cosine-similar are one gap
+    Returns: [{"label", "count", "share", "coverage", "examples"}] largest first, labels unique
+    """
+    coverage = np.asarray(coverage, dtype=np.float32)
+    poor = np.flatnonzero(coverage < threshold)
+    if len(poor) < min_size: return []
+    gap_vectors = normalize_rows(np.asarray(vectors, dtype=np.float32)[poor])
+    labels, centroids = kmeans(gap_vectors, choose_k(len(poor), max_clusters))
+    labels, centroids = merge_clusters(gap_vectors, labels, centroids, merge_threshold)
+
+    doc_freq = Counter(t for i in poor for t in set(tokenize(texts[i])))
+    sizes = np.bincount(labels, minlength=len(centroids))
+    gaps, taken = [], set()
+    for cluster in np.argsort(-sizes):
+        if sizes[cluster] < min_size: break
+        members = np.flatnonzero(labels == cluster)
+        central = members[np.argsort(-(gap_vectors[members] @ centroids[cluster]))]
+        nearest = []
+        for i in central:
+            example = texts[poor[i]].strip()
+            if example not in nearest:
+                nearest.append(example)
+            if len(nearest) == examples: break
+        label = _label(_ranked_terms([texts[poor[i]] for i in members], doc_freq, len(poor)), taken)
+        taken.add(label)
+        gaps.append({
+            "label": label,
+            "count": int(sizes[cluster]),
+            "share": float(sizes[cluster]) / len(texts),
+            "coverage": float(coverage[poor[members]].mean()),
+            "examples": nearest,
+        })
+    return gaps
@@ -0,0 +1,388 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, a single process should own the index
+    fcntl = None
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from backend.chunking import chunk_text
+from backend.docstore import SQLiteDocstore
+
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+LOCK_FILE = "index.lock"
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+
+
+class RebuildRefusedError(RuntimeError):
+    """Raised when a rebuild would drop bulk-ingested records and no current index can serve instead."""
+
+
+class IndexConfig:
+    """
+    FAISS index construction and search parameters.
+    Small corpora silently fall back to a cheaper type (IVF needs ~39 training
+    points per list, PQ needs ~256 per sub-quantizer centroid), see effective_type().
+    Articles are indexed as chunks of at most chunk_size characters (see article_chunks()).
+    """
+
+    def __init__(self, index_type="flat", nlist=None, nprobe=8, hnsw_m=32, ef_search=64,
+                 ef_construction=80, pq_m=None, train_size=50000, mmap=True, chunk_size=800, chunk_overlap=100):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Choose one of: {', '.join(INDEX_TYPES)}")
+        self.index_type = index_type
+        self.nlist = nlist            # IVF lists; default ~4 * sqrt(n)
+        self.nprobe = nprobe          # IVF lists visited per query
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search    # HNSW candidate list size per query
+        self.ef_construction = ef_construction
+        self.pq_m = pq_m              # PQ sub-quantizers; default largest divisor of dim <= dim / 8
+        self.train_size = train_size  # IVF/PQ train on a random sample of this many vectors
+        self.mmap = mmap
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            index_type=env.get("SUPPORTAI_INDEX", "flat"),
+            nprobe=int(env.get("SUPPORTAI_NPROBE", "8")),
+            ef_search=int(env.get("SUPPORTAI_EF_SEARCH", "64")),
+            mmap=env.get("SUPPORTAI_INDEX_MMAP", "1") != "0",
+            chunk_size=int(env.get("SUPPORTAI_CHUNK_SIZE", "800")),
+            chunk_overlap=int(env.get("SUPPORTAI_CHUNK_OVERLAP", "100")),
+        )
+
+    @property
+    def chunking(self):
+        return [self.chunk_size, self.chunk_overlap]
+
+    def effective_type(self, n):
+        if self.index_type == "ivf_pq" and n < 256 * 39:
+            return "ivf_flat" if n >= 39 * 2 else "flat"
+        if self.index_type == "ivf_flat" and n < 39 * 2:
+            return "flat"
+        return self.index_type
+
+    def nlist_for(self, n):
+        nlist = self.nlist or max(2, int(4 * math.sqrt(n)))
+        return max(2, min(nlist, n // 39))  # enough training points per list
+
+    def factory_string(self, dim, n):
+        kind = self.effective_type(n)
+        nlist = self.nlist_for(n)
+        if kind == "flat":
+            return "IDMap2,Flat"
+        if kind == "hnsw":
+            return f"IDMap2,HNSW{self.hnsw_m}"
+        if kind == "ivf_flat":
+            return f"IVF{nlist},Flat"
+        pq_m = self.pq_m or max(m for m in range(1, max(1, dim // 8) + 1) if dim % m == 0)
+        return f"IVF{nlist},PQ{pq_m}"
+
+    def tune(self, index):
+        """Applies the query-time knobs (nprobe / efSearch) to a built or loaded index."""
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = self.nprobe
+        base = _base_index(index)
+        if hasattr(base, "hnsw"):
+            base.hnsw.efSearch = self.ef_search
+        return index
+
+
+def article_text(doc):
+    return f"{doc['topic']}: {doc['content']}"
+
+
+def article_id(doc):
+    # Content hash doubles as the FAISS docstore id, so changed articles get new ids
+    return hashlib.sha1(f"{doc['topic']}\0{doc['content']}".encode("utf-8")).hexdigest()
+
+
+def article_chunks(doc, size, overlap):
+    """
+    The indexed pieces of one article: "topic: chunk" texts under ids "<article_id>:<n>".
+    Returns: [(chunk_id, text)]; an article shorter than `size` is a single chunk
+    """
+    parent = article_id(doc)
+    return [(f"{parent}:{n}", article_text({"topic": doc['topic'], "content": chunk}))
+            for n, chunk in enumerate(chunk_text(doc['content'], size, overlap))]
+
+
+def load_manifest(index_path):
+    path = os.path.join(index_path, MANIFEST_FILE)
+    if not os.path.exists(path): return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def save_manifest(index_path, embedder, index_type, articles, ingested=None, chunking=None, ingested_chunks=0,
+                  built=None):
+    """
+    ingested: sources bulk-loaded by backend.ingest; their records aren't listed in `articles`
+    ingested_chunks: vectors those sources added, counted when sizing the index type
+    built: when the index was last built from scratch (ingest checkpoints are only valid against that build)
+    """
+    manifest = {"embedder": embedder, "index_type": index_type, "chunking": chunking, "articles": articles,
+                "built": built}
+    if ingested:
+        manifest["ingested"] = ingested
+    if ingested_chunks:
+        manifest["ingested_chunks"] = ingested_chunks
+    tmp = os.path.join(index_path, MANIFEST_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(index_path, MANIFEST_FILE))
+
+
+def build_index(vectors, config, labels=None):
+    """
+    Creates, trains (on a sample) and fills a FAISS index for the given vectors.
+    Vectors are added under explicit int64 labels (0..n-1 by default), which stay
+    stable across deletions for every index type.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    n, dim = vectors.shape
+    sample = vectors
+    if n > config.train_size:
+        sample = vectors[np.random.default_rng(0).choice(n, config.train_size, replace=False)]
+    index = empty_index(config, dim, n, sample)
+    index.add_with_ids(vectors, np.arange(n, dtype=np.int64) if labels is None else np.asarray(labels, dtype=np.int64))
+    return config.tune(index)
+
+
+def empty_index(config, dim, n, sample):
+    """An empty index of the type config picks for n vectors, trained on `sample` if the type needs it."""
+    index = faiss.index_factory(dim, config.factory_string(dim, n))
+    base = _base_index(index)
+    if hasattr(base, "hnsw"):
+        base.hnsw.efConstruction = config.ef_construction
+    if not index.is_trained:
+        index.train(np.asarray(sample, dtype=np.float32))
+    return index
+
+
+def _base_index(index):
+    # Flat/HNSW are wrapped in IndexIDMap2 to support explicit labels
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def load_index(index_path, embeddings, config, index_type="flat", writable=False):
+    """
+    Loads the index + SQLite docstore (no pickle). Read-only loads memory-map the FAISS
+    file and documents are fetched lazily, so startup time and resident memory
+    don't grow with corpus size.
+    """
+    index = faiss.read_index(os.path.join(index_path, INDEX_FILE), _read_flags(config, index_type, writable))
+    store = SQLiteDocstore(os.path.join(index_path, DOCSTORE_FILE))
+    return FAISS(embeddings, config.tune(index), store, store.label_map())
+
+
+def _read_flags(config, index_type, writable):
+    if not config.mmap or writable: return 0
+    # IVF inverted lists use the on-disk hook; flat codes (Flat/HNSW storage) use MMAP_IFC
+    mmap_flag = faiss.IO_FLAG_MMAP
+    if not index_type.startswith("ivf"):
+        mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    return mmap_flag | faiss.IO_FLAG_READ_ONLY
+
+
+@contextmanager
+def index_lock(index_path, blocking=True):
+    """
+    Exclusive lock on the index directory across processes (the app, the API's KB
+    watcher, the ingest CLI): writers share its file names, so they take turns.
+    Yields: True once held; with blocking=False, False at once if another process holds it
+    """
+    os.makedirs(index_path, exist_ok=True)
+    with open(os.path.join(index_path, LOCK_FILE), "a") as f:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def sync_index(index_path, docs, embeddings, embedder="", config=None, wait=True, drop_ingested=False):
+    """
+    Brings the FAISS index at index_path in line with docs, embedding ONLY new or
+    changed articles and deleting removed ones. A manifest of {article_id: topic}
+    is written next to the index, so a restart with nothing changed embeds nothing.
+    Each article is indexed as chunks whose docstore records point back to it (parent-document
+    retrieval). A missing/legacy manifest, a different embedder, index type or chunking triggers a full rebuild,
+    as do deletions from an HNSW index (HNSW can't remove vectors).
+    Updates are written to temporary files and swapped in, so an engine still
+    serving the previous index is never pointed at half-written data. Only writes take
+    index_lock(), so another process never writes the same files meanwhile; an index
+    that is already up to date loads without it, so readers never queue behind a long
+    writer such as a bulk ingest. With wait=False, changes that would have to wait for
+    another process's lock are deferred: the current index loads and report["deferred"] is set.
+    Bulk-ingested records (backend.ingest) live only in the index, so a rebuild would drop them:
+    unless drop_ingested=True (the ingest CLI, which then ingests their sources again), the rebuild
+    is refused. The current index keeps serving, stale, with report["refused"] set, or, when it
+    can't serve (a different embedder or chunking), RebuildRefusedError is raised.
+    Returns: (vectorstore, report) where report counts added/changed/removed/unchanged.
+    """
+    config = config or IndexConfig()
+    plan = _plan(index_path, docs, embedder, config)
+    if plan["unchanged"]:
+        return load_index(index_path, embeddings, config, plan["index_type"]), plan["report"]
+    with index_lock(index_path, blocking=wait or not _loadable(plan["manifest"], index_path, embedder, config)) as held:
+        if held:
+            return _sync_index(index_path, docs, embeddings, embedder, config, drop_ingested)
+    manifest = plan["manifest"]
+    print("Another process is writing the index; serving the current one until it finishes.")
+    report = dict(plan["report"], deferred=True)
+    return load_index(index_path, embeddings, config, manifest["index_type"]), report
+
+
+def _loadable(manifest, index_path, embedder, config):
+    # An existing index built for this embedder and chunking (possibly stale) can serve meanwhile
+    return (manifest is not None and manifest.get("embedder") == embedder
+            and manifest.get("chunking") == config.chunking
+            and os.path.exists(os.path.join(index_path, INDEX_FILE))
+            and os.path.exists(os.path.join(index_path, DOCSTORE_FILE)))
+
+
+def _plan(index_path, docs, embedder, config):
+    """
+    Compares docs with the manifest on disk (read-only).
+    Returns: {"current", "manifest", "index_type", "reusable", "new_ids", "removed_ids", "ingested",
+    "ingested_chunks", "report", "unchanged"}
+    """
+    current = {}
+    for d in docs:
+        current[article_id(d)] = d
+    manifest = load_manifest(index_path)
+    # The index holds chunks, not articles: size the index type by the vectors it will hold
+    chunk_count = sum(len(article_chunks(d, config.chunk_size, config.chunk_overlap)) for d in current.values())
+    ingested_chunks = (manifest or {}).get("ingested_chunks", 0)
+    index_type = config.effective_type(chunk_count + ingested_chunks)
+    reusable = (
+        manifest is not None
+        and manifest.get("index_type") == index_type
+        and _loadable(manifest, index_path, embedder, config)
+    )
+    indexed = manifest.get("articles", {}) if reusable else {}
+
+    new_ids = [i for i in current if i not in indexed]
+    removed_ids = [i for i in indexed if i not in current]
+    if removed_ids and index_type == "hnsw":
+        reusable = False
+    ingested = (manifest or {}).get("ingested", {})
+    if not reusable:
+        index_type = config.effective_type(chunk_count)  # a rebuild only holds the KB's own chunks
+
+    # An article whose topic survives but whose hash changed counts as "changed"
+    removed_topics = {indexed[i] for i in removed_ids}
+    changed = sum(1 for i in new_ids if current[i]['topic'] in removed_topics)
+    report = {
+        "added": len(new_ids) - changed,
+        "changed": changed,
+        "removed": len(removed_ids) - changed,
+        "unchanged": len(current) - len(new_ids),
+        "rebuilt": not reusable,
+    }
+    return {"current": current, "manifest": manifest, "index_type": index_type, "reusable": reusable,
+            "new_ids": new_ids, "removed_ids": removed_ids, "ingested": ingested, "ingested_chunks": ingested_chunks,
+            "report": report, "unchanged": reusable and not new_ids and not removed_ids}
+
+
+def _sync_index(index_path, docs, embeddings, embedder, config, drop_ingested):
+    # Planned again under the lock: another writer may have changed the index since
+    plan = _plan(index_path, docs, embedder, config)
+    current, manifest, index_type, reusable = plan["current"], plan["manifest"], plan["index_type"], plan["reusable"]
+    new_ids, removed_ids, report = plan["new_ids"], plan["removed_ids"], plan["report"]
+    ingested, ingested_chunks = plan["ingested"], plan["ingested_chunks"]
+    # Bulk-ingested records live only in the index and docstore: a rebuild drops them
+    if (ingested or ingested_chunks) and not reusable:
+        if not drop_ingested:
+            reason = (f"the index needs a full rebuild, which would drop {ingested_chunks} bulk-ingested chunks; rebuild "
+                      "it with the ingest CLI, which ingests their sources again: python -m backend.ingest [--embedder NAME]")
+            if not _loadable(manifest, index_path, embedder, config):
+                raise RebuildRefusedError(reason)
+            print(f"KB changes not applied: {reason}")
+            report = dict(report, rebuilt=False, refused=True)
+            return load_index(index_path, embeddings, config, manifest["index_type"]), report
+        print(f"Rebuilding the index drops {ingested_chunks} bulk-ingested chunks from: {', '.join(ingested)}")
+        ingested, ingested_chunks = {}, 0
+
+    if plan["unchanged"]:
+        return load_index(index_path, embeddings, config, index_type), report
+    if not current:
+        return None, report
+
+    os.makedirs(index_path, exist_ok=True)
+    db_tmp = os.path.join(index_path, DOCSTORE_FILE + ".tmp")
+    if os.path.exists(db_tmp):
+        os.remove(db_tmp)
+
+    if reusable:
+        index = faiss.read_index(os.path.join(index_path, INDEX_FILE))
+        # Copy-on-write: the live docstore may still be serving queries
+        live = sqlite3.connect(os.path.join(index_path, DOCSTORE_FILE))
+        copy = sqlite3.connect(db_tmp)
+        live.backup(copy)
+        copy.close()
+        live.close()
+        store = SQLiteDocstore(db_tmp)
+        if removed_ids:
+            index.remove_ids(np.asarray(store.delete_parents(removed_ids), dtype=np.int64))
+        present = store.existing_parents(new_ids)  # already ingested in bulk
+        new_ids = [i for i in new_ids if i not in present]
+        if new_ids:
+            vectors, labels = _add_articles(store, [current[i] for i in new_ids], embeddings, config)
+            index.add_with_ids(vectors, np.asarray(labels, dtype=np.int64))
+    else:
+        store = SQLiteDocstore(db_tmp)
+        vectors, labels = _add_articles(store, list(current.values()), embeddings, config)
+        index = build_index(vectors, config, labels)
+        index_type = config.effective_type(len(vectors))  # what build_index built, for the manifest
+
+    # Swap in: index, then docstore, then the manifest that declares them valid
+    store.close()
+    faiss.write_index(index, os.path.join(index_path, INDEX_FILE + ".tmp"))
+    os.replace(os.path.join(index_path, INDEX_FILE + ".tmp"), os.path.join(index_path, INDEX_FILE))
+    os.replace(db_tmp, os.path.join(index_path, DOCSTORE_FILE))
+    legacy_pickle = os.path.join(index_path, "index.pkl")
+    if os.path.exists(legacy_pickle):
+        os.remove(legacy_pickle)
+    built = manifest.get("built") if reusable else time.time()
+    save_manifest(index_path, embedder, index_type, {i: d['topic'] for i, d in current.items()}, ingested,
+                  config.chunking, ingested_chunks, built)
+    return load_index(index_path, embeddings, config, index_type), report
+
+
+def _add_articles(store, docs, embeddings, config):
+    """Embeds the chunks of docs and records them with their parent articles. Returns: (vectors, labels)"""
+    chunks, parents = {}, {}
+    for doc in docs:
+        parent = article_id(doc)
+        parents[parent] = article_text(doc)
+        for chunk_id, text in article_chunks(doc, config.chunk_size, config.chunk_overlap):
+            chunks[chunk_id] = Document(id=chunk_id, page_content=text, metadata={"parent_id": parent})
+    vectors = np.asarray(embeddings.embed_documents([d.page_content for d in chunks.values()]), dtype=np.float32)
+    return vectors, store.add(chunks, parents)
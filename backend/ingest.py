@@ -0,0 +1,433 @@
+"""
+Streaming bulk ingestion into the knowledge base vector index.
+
+Usage: python -m backend.ingest [SOURCE ...] [--chunk-size 800] [--overlap 100]
+                                [--batch-size 256] [--workers 4] [--checkpoint-every 20] [--restart]
+
+Sources are .json (an array of {"topic", "content"} objects), .jsonl (one object
+per line) or .csv (question/answer or topic/content columns, e.g. data/knowledge.csv).
+They are parsed record by record and long articles are chunked like the KB's own
+(chunks point back to their full article), so memory is bounded by the batches in
+flight, not the corpus. Batches are embedded on a worker pool and recorded next to
+data/knowledge_base.json's articles. Every few batches the new vectors are appended
+as a shard file along with a checkpoint of the records done per source: an
+interrupted run resumes there, and re-running a finished, unchanged source is a no-op.
+At the end the shards are merged into the index in one pass; when the corpus has
+grown past what the index type suits, the index is retrained as the SUPPORTAI_INDEX type.
+
+A run holds the index lock (see backend.indexer.index_lock): a KB sync started
+meanwhile by the app or the API's watcher that has changes to write waits for it
+instead of rewriting the same files (an app starting up serves the current index
+meanwhile; an unchanged KB loads without the lock). Restart or reload the app
+afterwards to serve the new articles.
+
+Ingested records live only in the index, so the app refuses KB changes that need a full
+rebuild (a new embedder, chunking or index type, or deletions from an HNSW index) and keeps
+serving the current index. A run first syncs the KB itself, rebuilding if needed, and then
+ingests again the sources the manifest records, along with any given (with no SOURCE it
+just does that). Ingested records are found by vector search only: the app's keyword index
+(BM25, used for the keyword fallback and the lexical half of hybrid search) covers
+data/knowledge_base.json's articles alone.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.docstore import SQLiteDocstore
+from backend.embedders import DEFAULT_EMBEDDER, make_embedder
+from backend.indexer import (DOCSTORE_FILE, INDEX_FILE, IndexConfig, article_chunks, article_id, article_text,
+                             empty_index, index_lock, load_manifest, save_manifest, sync_index)
+
+CHECKPOINT_FILE = "ingest_checkpoint.json"
+SHARD_PREFIX = "ingest-shard-"  # vectors appended at each checkpoint, merged into the index by close()
+# (title field, body field) pairs accepted in source records, in order of preference
+FIELD_PAIRS = (("topic", "content"), ("question", "answer"), ("title", "body"), ("title", "content"))
+
+
+def _article(record):
+    """Returns: {"topic", "content"} for a usable record, else None"""
+    if not isinstance(record, dict): return None
+    for title, body in FIELD_PAIRS:
+        topic, content = str(record.get(title) or "").strip(), str(record.get(body) or "").strip()
+        if topic and content:
+            # CSV files with a repeated header row: skip it
+            if (topic, content) == (title, body): return None
+            return {"topic": topic, "content": content}
+    return None
+
+
+def iter_json_array(f, buffer_size=1 << 20):
+    """Yields the elements of a top-level JSON array without loading the whole file."""
+    decoder = json.JSONDecoder()
+    buf, pos, opened = "", 0, False
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or buf[pos] == "," or (buf[pos] == "[" and not opened)):
+            opened = opened or buf[pos] == "["
+            pos += 1
+        if pos == len(buf):
+            buf, pos = f.read(buffer_size), 0
+            if not buf: return
+            continue
+        if buf[pos] == "]": return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            # Element cut off at the buffer end: read more and retry
+            more = f.read(buffer_size)
+            if not more: raise
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield item
+        pos = end
+
+
+def read_records(path):
+    """Yields one article dict (or None for an unusable record) per source record."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "r", encoding="utf-8", newline="" if ext == ".csv" else None) as f:
+        if ext == ".json":
+            records = iter_json_array(f)
+        elif ext == ".jsonl":
+            records = (json.loads(line) for line in f if line.strip())
+        elif ext == ".csv":
+            records = csv.DictReader(f)
+        else:
+            raise ValueError(f"Unsupported source '{path}': expected .json, .jsonl or .csv")
+        for record in records:
+            yield _article(record)
+
+
+def batches(records, skip=0, batch_size=256, chunk_size=800, overlap=100):
+    """
+    Groups the chunks of `records` (after the first `skip`) into batches.
+    Yields: (records_done, [(chunk_id, text, parent_id)], {parent_id: article text});
+    a record split across batches only counts as done with its last chunk, so
+    resuming at records_done never loses a chunk.
+    """
+    chunks, parents, done = [], {}, skip
+    for position, article in enumerate(records, 1):
+        if position <= skip: continue
+        if article:
+            parent = article_id(article)
+            for chunk_id, text in article_chunks(article, chunk_size, overlap):
+                chunks.append((chunk_id, text, parent))
+                parents[parent] = article_text(article)
+                if len(chunks) == batch_size:
+                    yield position - 1, chunks, parents
+                    chunks, parents = [], {}
+        done = position
+    yield done, chunks, parents
+
+
+def _source_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+class Ingestor:
+    """
+    Appends documents to an existing KB index (FAISS file + SQLite docstore) with
+    resumable checkpoints. Records already in the docstore (same topic and content)
+    are skipped before embedding, so overlapping sources and re-runs embed nothing twice.
+    Checkpoints never rewrite the index: each appends the vectors embedded since the
+    last one as a shard file, and close() merges the shards in one pass, retraining
+    the index as the configured type (IVF/IVF-PQ on a sample) once the grown corpus calls for it.
+    """
+
+    def __init__(self, index_path, embeddings, embedder, batch_size=256, workers=4, checkpoint_every=20,
+                 chunk_size=800, overlap=100, config=None):
+        self.index_path = index_path
+        self.embeddings = embeddings
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.workers = workers
+        self.checkpoint_every = checkpoint_every
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.config = config or IndexConfig()
+        # Held until close(): a KB sync replaces the docstore and index this run is writing
+        self._lock = index_lock(index_path)
+        self._lock.__enter__()
+        self.store = SQLiteDocstore(os.path.join(index_path, DOCSTORE_FILE))
+        # Checkpoints (and their shard labels) only hold for the index build they were taken on
+        self.built = (load_manifest(index_path) or {}).get("built")
+        self.state = {"embedder": embedder, "built": self.built, "label": self.store.last_label(), "running": True,
+                      "sources": {}, "shards": []}
+        self._vectors, self._labels = [], []  # committed since the last checkpoint
+        self.added = 0
+        self.skipped = 0
+
+    def resume(self, restart=False):
+        """
+        Loads per-source progress (unless restart=True). If the previous run was killed,
+        first rolls back the records it wrote after its last checkpoint.
+        """
+        path = os.path.join(self.index_path, CHECKPOINT_FILE)
+        try:
+            with open(path, "r") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = None
+        if saved is None or saved.get("embedder") != self.embedder or saved.get("built") != self.built:
+            # Nothing saved, or the index was rebuilt since: the saved sources start over
+            self._drop_shards(keep=())
+            self._checkpoint()
+            return
+        shards = saved.get("shards", [])
+        if saved.get("running"):
+            dropped = self.store.delete_after(saved["label"])
+            if dropped:
+                print(f"Rolled back {dropped} records written after the last checkpoint.")
+        self._drop_shards(keep={shard["file"] for shard in shards})
+        self.state = {"embedder": self.embedder, "built": self.built, "label": self.store.last_label(),
+                      "running": True, "sources": {} if restart else saved["sources"], "shards": shards}
+        merging = saved.get("merging")
+        if merging and faiss.read_index(os.path.join(self.index_path, INDEX_FILE)).ntotal == merging["ntotal"]:
+            # Killed after writing a merged index: only its bookkeeping is left to do
+            self.state["merging"] = merging
+            self._merged()
+        self._checkpoint()
+
+    def ingest(self, path):
+        """Streams one source into the index. Returns: records read in this run"""
+        key, signature = _source_key(path)
+        progress = self.state["sources"].get(key)
+        if progress is None or {k: progress.get(k) for k in signature} != signature:
+            progress = {**signature, "records": 0, "finished": False}  # new or modified since the checkpoint
+        if progress["finished"]:
+            print(f"{path}: already ingested, skipping.")
+            return 0
+        self.state["sources"][key] = progress
+        start = progress["records"]
+
+        pending, since_save = deque(), 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for done, chunks, parents in batches(read_records(path), start, self.batch_size, self.chunk_size,
+                                                 self.overlap):
+                present = self.store.existing(c[0] for c in chunks)
+                fresh = [c for c in chunks if c[0] not in present]
+                self.skipped += len(chunks) - len(fresh)
+                future = pool.submit(self.embeddings.embed_documents, [c[1] for c in fresh]) if fresh else None
+                pending.append((done, fresh, parents, future))
+                # Bounded in-flight work: at most 2 batches per worker are parsed or embedding
+                while len(pending) > 2 * self.workers:
+                    self._commit(progress, *pending.popleft())
+                    since_save += 1
+                    if since_save >= self.checkpoint_every:
+                        self._checkpoint()
+                        since_save = 0
+            while pending:
+                self._commit(progress, *pending.popleft())
+        progress["finished"] = True
+        self._checkpoint()
+        return progress["records"] - start
+
+    def _commit(self, progress, done, fresh, parents, future):
+        if future is not None:
+            vectors = np.asarray(future.result(), dtype=np.float32)
+            # Batches embed concurrently, so a duplicate may have landed since the pre-check
+            present = self.store.existing(c[0] for c in fresh)
+            keep, seen = [], set()
+            for j, (i, _, _) in enumerate(fresh):
+                if i not in present and i not in seen:
+                    keep.append(j)
+                    seen.add(i)
+            if keep:
+                docs = {fresh[j][0]: Document(id=fresh[j][0], page_content=fresh[j][1],
+                                              metadata={"parent_id": fresh[j][2]}) for j in keep}
+                labels = self.store.add(docs, {fresh[j][2]: parents[fresh[j][2]] for j in keep})
+                self._vectors.append(vectors[keep])
+                self._labels.append(np.asarray(labels, dtype=np.int64))
+                self.added += len(keep)
+        progress["records"] = done
+
+    def _checkpoint(self):
+        # Shard first, then the checkpoint that declares it (and the docstore up to `label`) valid.
+        # Only vectors committed since the last checkpoint are written: I/O stays linear in the records ingested
+        if self._labels:
+            labels = np.concatenate(self._labels)
+            name = f"{SHARD_PREFIX}{labels[0]:012d}.npz"
+            tmp = os.path.join(self.index_path, name + ".tmp")
+            with open(tmp, "wb") as f:
+                np.savez(f, vectors=np.concatenate(self._vectors), labels=labels)
+            os.replace(tmp, os.path.join(self.index_path, name))
+            self.state["shards"].append({"file": name, "count": len(labels)})
+            self._vectors, self._labels = [], []
+        self.state["label"] = self.store.last_label()
+        self._save_state()
+
+    def _save_state(self):
+        tmp = os.path.join(self.index_path, CHECKPOINT_FILE + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, os.path.join(self.index_path, CHECKPOINT_FILE))
+
+    def _shards(self):
+        """Yields: (vectors, labels) per checkpointed shard, in ingestion order"""
+        for shard in self.state["shards"]:
+            with np.load(os.path.join(self.index_path, shard["file"])) as data:
+                yield data["vectors"], data["labels"]
+
+    def _drop_shards(self, keep):
+        # Shards a checkpoint doesn't list were written after it (or belong to a superseded run)
+        for name in os.listdir(self.index_path):
+            if name.startswith(SHARD_PREFIX) and name not in keep:
+                os.remove(os.path.join(self.index_path, name))
+
+    def _merge(self):
+        """Adds the shards to the index, which is read and written once per run."""
+        if not self.state["shards"]:
+            self._merged()  # nothing to add; still records the finished sources
+            return
+        manifest = load_manifest(self.index_path) or {}
+        index = faiss.read_index(os.path.join(self.index_path, INDEX_FILE))
+        count = sum(shard["count"] for shard in self.state["shards"])
+        total = index.ntotal + count
+        index_type = self.config.effective_type(total)
+        ivf = faiss.try_extract_index_ivf(index)
+        if index_type != manifest.get("index_type") or (ivf is not None and 2 * ivf.nlist <= self.config.nlist_for(total)):
+            # The ingested records outgrew the index (e.g. flat -> IVF, or too few IVF lists): retrain it
+            print(f"Rebuilding the index as {index_type} for {total} vectors...")
+            index = self._rebuilt(index, total)
+        else:
+            for vectors, labels in self._shards():
+                index.add_with_ids(vectors, labels)
+        self.state["merging"] = {"ntotal": total, "index_type": index_type,
+                                 "ingested_chunks": manifest.get("ingested_chunks", 0) + count}
+        self._save_state()
+        tmp = os.path.join(self.index_path, INDEX_FILE + ".ingest.tmp")
+        faiss.write_index(index, tmp)
+        os.replace(tmp, os.path.join(self.index_path, INDEX_FILE))
+        self._merged()
+
+    def _rebuilt(self, index, total):
+        """Returns: a new index of the configured type for `total` vectors, trained on a sample of them"""
+        labels = _stored_labels(index)
+        picks = np.sort(np.random.default_rng(0).choice(total, min(total, self.config.train_size), replace=False))
+        sample = [_stored_vectors(index, labels[picks[picks < len(labels)]])]
+        offset = len(labels)
+        for vectors, _ in self._shards():
+            sample.append(vectors[picks[(picks >= offset) & (picks < offset + len(vectors))] - offset])
+            offset += len(vectors)
+        fresh = empty_index(self.config, index.d, total, np.vstack(sample))
+        for start in range(0, len(labels), self.batch_size * 64):
+            part = labels[start:start + self.batch_size * 64]
+            fresh.add_with_ids(_stored_vectors(index, part), part)
+        for vectors, shard_labels in self._shards():
+            fresh.add_with_ids(vectors, shard_labels)
+        return fresh
+
+    def _merged(self):
+        # The merged index is on disk: record it in the manifest, then retire its shards
+        merging = self.state.pop("merging", None) or {}
+        manifest = load_manifest(self.index_path)
+        if manifest is not None:
+            # Also records the finished sources, so a KB-triggered rebuild can say what to re-ingest
+            ingested = manifest.get("ingested", {})
+            ingested.update({key: p["records"] for key, p in self.state["sources"].items() if p["finished"]})
+            save_manifest(self.index_path, manifest["embedder"], merging.get("index_type", manifest["index_type"]),
+                          manifest["articles"], ingested, manifest.get("chunking"),
+                          merging.get("ingested_chunks", manifest.get("ingested_chunks", 0)), manifest.get("built"))
+        if merging:
+            self.state["shards"] = []
+            self._save_state()
+            self._drop_shards(keep=())
+
+    def close(self):
+        # Save what was committed, so the next run resumes without a rollback, then merge it into the index
+        self.state["running"] = False
+        self._checkpoint()
+        try:
+            self._merge()
+        finally:
+            self.store.close()
+            self._lock.__exit__(None, None, None)
+
+
+def _stored_labels(index):
+    """Returns: the labels of every vector in a Flat/HNSW (IDMap2) or IVF index"""
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        return faiss.vector_to_array(index.id_map).astype(np.int64)
+    lists = ivf.invlists
+    return np.concatenate([faiss.rev_swig_ptr(lists.get_ids(i), lists.list_size(i)).copy()
+                           for i in range(ivf.nlist) if lists.list_size(i)] or [np.empty(0, dtype=np.int64)])
+
+
+def _stored_vectors(index, labels):
+    """Returns: the stored vectors for `labels` (PQ codes decode to approximations)"""
+    if not len(labels): return np.empty((0, index.d), dtype=np.float32)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and ivf.direct_map.type != faiss.DirectMap.Hashtable:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)  # lookup by explicit label
+    return index.reconstruct_batch(np.asarray(labels, dtype=np.int64))
+
+
+def _sync_base_index(index_path, kb_path, embeddings, embedder, config):
+    """
+    Syncs the index with knowledge_base.json like the app does, building it first if needed. Unlike
+    the app, this may rebuild an index holding bulk-ingested records (see sync_index).
+    Returns: the sources the rebuild dropped, to be ingested again
+    """
+    manifest = load_manifest(index_path) or {}
+    docs = []
+    if os.path.exists(kb_path):
+        with open(kb_path, "r") as f:
+            docs = [{"topic": item['topic'], "content": item['content']} for item in json.load(f)]
+    if not docs:
+        if manifest.get("embedder") == embedder and manifest.get("chunking") == config.chunking \
+                and os.path.exists(os.path.join(index_path, INDEX_FILE)):
+            return []
+        raise SystemExit(f"No index for embedder '{embedder}' at {index_path} and no articles in {kb_path} to build one")
+    print(f"Syncing the base index with {kb_path}...")
+    _, report = sync_index(index_path, docs, embeddings, embedder=embedder, config=config, drop_ingested=True)
+    return list(manifest.get("ingested", {})) if report["rebuilt"] else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream JSON/JSONL/CSV sources into the knowledge base index.")
+    parser.add_argument("sources", nargs="*", help="also ingests again the sources a rebuild of the index dropped")
+    parser.add_argument("--index", default=os.path.join("data", "faiss_index"))
+    parser.add_argument("--kb", default=os.path.join("data", "knowledge_base.json"))
+    parser.add_argument("--embedder", default=DEFAULT_EMBEDDER)
+    parser.add_argument("--chunk-size", type=int, help="max characters per indexed chunk (default: SUPPORTAI_CHUNK_SIZE)")
+    parser.add_argument("--overlap", type=int, help="characters shared by consecutive chunks (default: SUPPORTAI_CHUNK_OVERLAP)")
+    parser.add_argument("--batch-size", type=int, default=256, help="texts per embedding call")
+    parser.add_argument("--workers", type=int, default=4, help="embedding calls in flight")
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="batches between index saves")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress (ingested records are kept)")
+    args = parser.parse_args()
+
+    config = IndexConfig.from_env()
+    embedder, embeddings = make_embedder(args.embedder)
+    sources = list(args.sources)
+    for path in _sync_base_index(args.index, args.kb, embeddings, embedder, config):
+        if not os.path.exists(path):
+            print(f"{path}: dropped by the rebuild but no longer exists, skipping.")
+        elif path not in map(os.path.abspath, sources):
+            sources.append(path)
+    ingestor = Ingestor(args.index, embeddings, embedder, batch_size=args.batch_size, workers=args.workers,
+                        checkpoint_every=args.checkpoint_every, chunk_size=args.chunk_size or config.chunk_size,
+                        overlap=args.overlap if args.overlap is not None else config.chunk_overlap, config=config)
+    start = time.perf_counter()
+    try:
+        ingestor.resume(restart=args.restart)
+        for path in sources:
+            records = ingestor.ingest(path)
+            print(f"{path}: {records} records read, {ingestor.added} chunks indexed so far")
+    finally:
+        ingestor.close()
+    print(f"Done in {time.perf_counter() - start:.1f}s: {ingestor.added} chunks added, "
+          f"{ingestor.skipped} already indexed. Restart or reload the app to serve them.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does", "for", "from",
+    "has", "have", "how", "i", "if", "in", "is", "it", "its", "me", "my", "not", "of", "on",
+    "or", "so", "that", "the", "this", "to", "was", "we", "what", "when", "with", "you", "your",
+}
+
+
+def tokenize(text):
+    tokens = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        if tok in STOPWORDS: continue
+        # Light plural folding so "printers" matches "printer"
+        if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+            tok = tok[:-1]
+        tokens.append(tok)
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring, built once over the KB texts.
+    Term weights are query independent, so each posting list is stored as
+    (doc_ids, weights) arrays and a search is a few vectorized scatter-adds over
+    the postings of the query terms only.
+    """
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        postings = defaultdict(list)  # term -> [(doc_idx, term_freq)]
+        doc_len = []
+        for idx, text in enumerate(texts):
+            tf = Counter(tokenize(text))
+            doc_len.append(sum(tf.values()))
+            for term, freq in tf.items():
+                postings[term].append((idx, freq))
+
+        self.n_docs = len(doc_len)
+        doc_len = np.asarray(doc_len, dtype=np.float32)
+        avg_len = float(doc_len.mean()) if self.n_docs else 0.0
+        norm = k1 * (1 - b + b * doc_len / avg_len) if avg_len else np.full(self.n_docs, k1, dtype=np.float32)
+
+        self.postings = {}
+        for term, plist in postings.items():
+            ids = np.fromiter((i for i, _ in plist), dtype=np.int32, count=len(plist))
+            tf = np.fromiter((f for _, f in plist), dtype=np.float32, count=len(plist))
+            idf = math.log(1 + (self.n_docs - len(plist) + 0.5) / (len(plist) + 0.5))
+            self.postings[term] = (ids, (idf * tf * (k1 + 1) / (tf + norm[ids])).astype(np.float32))
+
+    def search(self, query, k=3):
+        """Returns up to k (doc_idx, score) pairs, best first."""
+        terms = [self.postings[t] for t in set(tokenize(query)) if t in self.postings]
+        if not terms: return []
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for ids, weights in terms:
+            scores[ids] += weights  # ids are unique within a posting list
+        matched = np.count_nonzero(scores)
+        k = min(k, matched)
+        if k == 0: return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < self.n_docs else np.arange(self.n_docs)
+        top = top[np.argsort(-scores[top], kind="stable")][:k]
+        return [(int(i), float(scores[i])) for i in top]
@@ -0,0 +1,133 @@
+"""
+In-process metrics for the RAG pipeline: per-stage latency histograms and labelled
+counters (fallbacks, cache hits, errors), cheap enough for the hot path.
+
+`metrics.snapshot()` returns p50/p95/p99 per stage for in-process consumers (the
+dashboard); `metrics.prometheus()` renders the Prometheus text format (GET /metrics).
+Quantiles are estimated from fixed log-scale buckets, so memory stays constant.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds: 0.5 ms doubling up to ~65 s
+BUCKETS = tuple(0.0005 * 2 ** i for i in range(18))
+QUANTILES = (0.5, 0.95, 0.99)
+PREFIX = "supportai"
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Linear interpolation inside the bucket holding the q-th observation. Returns: seconds"""
+        if not self.count: return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if seen + n >= rank and n:
+                if i == len(self.buckets): return self.max
+                lower = max(self.buckets[i - 1] if i else 0.0, self.min)
+                upper = min(self.buckets[i], self.max)
+                return lower + (upper - lower) * max(0.0, rank - seen) / n
+            seen += n
+        return self.max
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}    # stage -> Histogram
+        self._counters = {}  # (name, ((label, value), ...)) -> int
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name, n=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def count(self, name, **labels):
+        """Sum of a counter over all label sets matching `labels`."""
+        wanted = set(labels.items())
+        with self._lock:
+            return sum(v for (n, lbl), v in self._counters.items() if n == name and wanted <= set(lbl))
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """
+        Returns: {"stages": {stage: {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"}},
+                  "counters": {"name{label=value}": n}}
+        """
+        with self._lock:
+            stages = {}
+            for stage, hist in sorted(self._stages.items()):
+                row = {"count": hist.count, "mean_ms": round(hist.sum / hist.count * 1000, 2) if hist.count else 0.0}
+                for q in QUANTILES:
+                    row[f"p{int(q * 100)}_ms"] = round(hist.quantile(q) * 1000, 2)
+                row["max_ms"] = round(hist.max * 1000, 2)
+                stages[stage] = row
+            counters = {_series(name, labels): v for (name, labels), v in sorted(self._counters.items())}
+        return {"stages": stages, "counters": counters}
+
+    def prometheus(self):
+        """Returns: the Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            name = f"{PREFIX}_stage_duration_seconds"
+            lines += [f"# HELP {name} Wall time per pipeline stage.", f"# TYPE {name} histogram"]
+            for stage, hist in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, n in zip(hist.buckets, hist.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {hist.sum:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {hist.count}')
+            typed = set()
+            for (counter, labels), v in sorted(self._counters.items()):
+                full = f"{PREFIX}_{counter}"
+                if full not in typed:
+                    lines.append(f"# TYPE {full} counter")
+                    typed.add(full)
+                lines.append(f"{_series(full, labels)} {v}")
+        return "\n".join(lines) + "\n"
+
+
+def _series(name, labels):
+    if not labels: return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+metrics = Metrics()
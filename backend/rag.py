@@ -1,18 +1,126 @@
-from langchain_community.vectorstores import FAISS
-from langchain_ollama import ChatOllama, OllamaEmbeddings
+from langchain_ollama import ChatOllama
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+import numpy as np
 import os
 import json
+import queue
+import re
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from backend.analytics import TicketAnalytics
+from backend.cache import CachedEmbeddings, SemanticAnswerCache
+from backend.chunking import chunk_text
+from backend.deadline import PRIORITY_BUDGETS, RETRIEVAL_SHARE, Deadline
+from backend.embedders import DEFAULT_EMBEDDER, make_embedder
+from backend.gaps import find_gaps
+from backend.indexer import IndexConfig, article_text, sync_index
+from backend.lexical import BM25Index, tokenize
+from backend.metrics import metrics
+from backend.scheduler import LLM_CONCURRENCY, QueueFullError, Scheduler
+from backend.tickets import TicketIndex, TicketStore
+
+# Static instructions go in the system message so every request starts with the
+# same tokens and Ollama can reuse their KV cache; only the human turn varies.
+SOLUTION_SYSTEM = (
+    "You are a helpful and professional IT Support Agent. "
+    "Using the Reference Info provided, give a detailed and comprehensive answer to the user's question. "
+    "Expand on the solution with standard professional troubleshooting steps if the reference is brief.\n"
+    "Do NOT include the phrase 'Reference Info' or internal IDs (like #123) in your final response."
+)
+SOLUTION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SOLUTION_SYSTEM),
+    ("human", "Reference Info:\n{c}\n\nQuestion: {t}"),
+])
+
+# How long Ollama keeps the model loaded after a request (Ollama's default is 5m)
+KEEP_ALIVE = os.environ.get("SUPPORTAI_KEEP_ALIVE", "30m")
+
+# off: top article verbatim, extractive: best-matching article sentences (no LLM),
+# llm: always the model, llm_with_fallback: the model within llm_timeout, else extractive
+GENERATION_MODES = ("off", "extractive", "llm", "llm_with_fallback")
+NO_ARTICLE = "I couldn't find any specific articles for this issue."
+TRUNCATED_NOTE = "\n\n_(Stopped at this ticket's time limit; see the recommended articles for the full procedure.)_"
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several ranked [(key, score)] lists: score(key) = sum(1 / (k + rank)).
+    Only ranks are used, so vector relevance and BM25 scores need no calibration.
+    Returns: [(key, fused_score)] best first
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, (key, _) in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda kv: kv[1], reverse=True)
+
+def extractive_answer(text, doc, max_sentences=3):
+    """
+    LLM-free answer: the article sentences sharing the most terms with the ticket,
+    kept in article order as numbered steps.
+    """
+    topic, sep, content = doc.partition(": ")
+    if not sep:
+        topic, content = "", doc
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", content) if s.strip()]
+    if not sentences: return doc
+    query = set(tokenize(text))
+    ranked = sorted(range(len(sentences)), key=lambda i: (-len(query & set(tokenize(sentences[i]))), i))
+    steps = "\n".join(f"{n}. {sentences[i]}" for n, i in enumerate(sorted(ranked[:max_sentences]), 1))
+    return f"**{topic}**\n\n{steps}" if topic else steps
 
 class KnowledgeBaseEngine:
     def __init__(self):
         # Lazy load these to avoid startup hanging if Ollama is asleep
         self._llm = None
+        self._chain = None  # (llm, solution chain) built once per LLM instance
+        self.generation_mode = os.environ.get("SUPPORTAI_GENERATION", "llm_with_fallback")
+        if self.generation_mode not in GENERATION_MODES:
+            raise ValueError(f"Unknown generation mode '{self.generation_mode}'. Choose one of: {', '.join(GENERATION_MODES)}")
+        self.llm_timeout = float(os.environ.get("SUPPORTAI_LLM_TIMEOUT", "20"))  # seconds (first token when streaming)
+        self.llm_status = "unknown"  # "warming", "ready" or "unavailable" once the probe runs
+        self._probe = None
+        self._generation_pool = ThreadPoolExecutor(max_workers=LLM_CONCURRENCY, thread_name_prefix="llm")
+        self._retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="embed")
+        # Async API: micro-batched query embeddings, bounded LLM concurrency and queues
+        self.scheduler = Scheduler(lambda texts: self.embeddings.embed_documents(texts), self._retrieval_pool)
+        self.priority_budgets = dict(PRIORITY_BUDGETS)
         self._embeddings = None
+        self.embedder_name = DEFAULT_EMBEDDER
+        self.embedder_id = None
         self.retriever = None
+        self.vectorstore = None
+        self.index_report = None
+        self.retrieval_mode = "hybrid"  # "hybrid" (FAISS + BM25 with RRF), "vector" or "lexical"
         self.initialized = False
+        self.docs = []
+        self.lexical = BM25Index([])
+        self.kb_path = os.path.join("data", "knowledge_base.json")
         self.index_path = os.path.join("data", "faiss_index")
+        self.index_config = IndexConfig.from_env()
+        self._init_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._watcher = None
+        # Near-duplicate tickets reuse a previous generation instead of calling the LLM (opened lazily)
+        self.answer_cache_path = os.path.join("data", "answer_cache")
+        self.embedding_cache_path = os.path.join("data", "embedding_cache.sqlite")
+        self._answer_cache = None
+        # Resolved-ticket memory: append-only store + its own vector index (opened lazily)
+        self.tickets_path = os.path.join("data", "tickets.sqlite")
+        self.ticket_index_path = os.path.join("data", "ticket_index")
+        self.ticket_match_threshold = 0.95  # similarity at which a past resolution is reused as-is
+        self._tickets = None
+        self._ticket_index = None
+        self._analytics = None
+        # Content gaps from the last detect_gaps() run, read by the Analytics tab
+        self.gap_threshold = float(os.environ.get("SUPPORTAI_GAP_THRESHOLD", "0.5"))  # best-article relevance
+        self.gaps = []
+        self.gaps_updated = None
+        self._gaps_lock = threading.Lock()
 
     @property
     def llm(self):
@@ -22,173 +130,1124 @@ class KnowledgeBaseEngine:
                 # Optimize for speed: faster generation, lower context memory
                 num_predict=100,  # Reduced from 150
                 num_ctx=1024,     # Reduced from 2048
-                temperature=0.1   # Reduced for deterministic/faster output
+                temperature=0.1,  # Reduced for deterministic/faster output
+                keep_alive=KEEP_ALIVE  # stay resident between tickets: no reload on the next request
             )
         return self._llm
 
     @property
     def embeddings(self):
         if not self._embeddings:
-            self._embeddings = OllamaEmbeddings(model="llama3.2:1b")
+            self.embedder_id, self._embeddings = self._make_embeddings(self.embedder_name)
         return self._embeddings
 
+    def _make_embeddings(self, name):
+        """Returns: (embedder_id, embeddings) for an embedder name in EMBEDDERS"""
+        embedder_id, embedder = make_embedder(name)
+        # Memoized by content hash: reruns / "Re-analyze" don't re-embed the same text
+        return embedder_id, CachedEmbeddings(embedder, namespace=embedder_id, path=self.embedding_cache_path)
+
+    @property
+    def answer_cache(self):
+        if self._answer_cache is None:
+            self._answer_cache = SemanticAnswerCache(self.answer_cache_path)
+        return self._answer_cache
+
+    @property
+    def tickets(self):
+        if self._tickets is None:
+            self._tickets = TicketStore(self.tickets_path)
+        return self._tickets
+
+    @property
+    def analytics(self):
+        # Rollups live in the ticket database; tickets logged before them are backfilled in the background
+        if self._analytics is None:
+            self.tickets  # creates the tickets table the rollup triggers attach to
+            self._analytics = TicketAnalytics(self.tickets_path)
+            if self._analytics.backfilling:
+                threading.Thread(target=self._analytics.backfill, name="analytics-backfill", daemon=True).start()
+        return self._analytics
+
+    @property
+    def ticket_index(self):
+        if self._ticket_index is None:
+            config = IndexConfig(
+                index_type=os.environ.get("SUPPORTAI_TICKET_INDEX", "ivf_flat"),
+                nprobe=self.index_config.nprobe,
+                ef_search=self.index_config.ef_search,
+                mmap=False  # appended to in place
+            )
+            self._ticket_index = TicketIndex(self.ticket_index_path, self.tickets, config)
+        return self._ticket_index
+
+    def set_embedder(self, name, background=True):
+        """
+        Switches the embedder; the manifest no longer matches, so reload() re-indexes.
+        Requests keep embedding with the current model against the current index until
+        the new index is ready; then both are swapped in together.
+        """
+        make_embedder(name)  # validate before starting the re-index
+        return self.reload(background=background, embedder=name)
+
     def ensure_kb_initialized(self):
         if self.initialized: return
-        print("Initializing Knowledge Base...")
-        
-        # Load from JSON file
-        kb_path = os.path.join("data", "knowledge_base.json")
-        self.docs = []
-        
-        try:
-            if os.path.exists(kb_path):
-                with open(kb_path, "r") as f:
-                    data = json.load(f)
-                    self.docs = [{"topic": item['topic'], "content": item['content']} for item in data]
-            else:
-                print(f"Warning: {kb_path} not found. Using fallback data.")
-                self.docs = [
-                    {"topic": "Password Reset", "content": "Go to Settings > Security > Reset Password."},
-                    {"topic": "System Slow", "content": "Clear cache/cookies and restart."},
-                    {"topic": "VPN Issues", "content": "Restart Cisco AnyConnect."},
-                    {"topic": "Software Request", "content": "Submit IT ticket."},
-                    {"topic": "Wifi", "content": "Connect to CorpNet-Secure."}
-                ]
-
-            # Try to load existing vector store or create new one
+        # Double-checked lock: concurrent sessions must not build the index twice
+        with self._init_lock:
+            if self.initialized: return
+            print("Initializing Knowledge Base...")
             try:
-                if os.path.exists(self.index_path):
-                    print("Loading cached vector store...")
-                    vectorstore = FAISS.load_local(self.index_path, self.embeddings, allow_dangerous_deserialization=True)
-                    self.retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-                else:
-                    print("Creating new vector store (this may take a moment)...")
-                    texts = [f"{d['topic']}: {d['content']}" for d in self.docs]
-                    vectorstore = FAISS.from_texts(texts, self.embeddings)
-                    vectorstore.save_local(self.index_path)
-                    self.retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
+                with metrics.timer("kb_init"):
+                    # Never wait on another process's index lock here: every request waits on this init
+                    self._swap_in(*self._build_kb(wait=False))
+                self.initialized = True
+                print(f"KB Initialized with {len(self.docs)} articles.")
+                if (self.index_report or {}).get("deferred"):
+                    self.reload()  # applies the KB changes once the other writer (e.g. a bulk ingest) is done
+            except Exception as e:
+                metrics.inc("errors_total", stage="kb_init")
+                print(f"KB Init Failed: {e}")
+        self.sync_tickets()
+
+    def reload(self, background=True, embedder=None):
+        """
+        Rebuilds docs + index from the KB file and swaps them in atomically.
+        Requests keep using the old index until the new one is ready (no downtime).
+        embedder: re-index with this embedder name instead of the current one
+        """
+        def _run():
+            with self._reload_lock:
+                try:
+                    docs, lexical, vectorstore, retriever, embedding = self._build_kb(embedder)
+                    if vectorstore is None and self.vectorstore is not None:
+                        raise RuntimeError("vector store rebuild failed")
+                    self._swap_in(docs, lexical, vectorstore, retriever, embedding)
+                    self.initialized = True
+                    print(f"KB Reloaded with {len(docs)} articles.")
+                except Exception as e:
+                    metrics.inc("errors_total", stage="kb_reload")
+                    print(f"KB Reload Failed, keeping current index: {e}")
+            self.sync_tickets(background=background)
+
+        if not background:
+            return _run()
+        thread = threading.Thread(target=_run, name="kb-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def watch_kb(self, interval=5.0):
+        """Starts (once) a daemon thread that reloads the KB when the KB file changes."""
+        with self._init_lock:
+            if self._watcher: return self._watcher
+
+            def _poll():
+                last = self._kb_mtime()
+                while True:
+                    time.sleep(interval)
+                    mtime = self._kb_mtime()
+                    if mtime != last:
+                        last = mtime
+                        print("Knowledge base file changed, reloading in background...")
+                        self.reload(background=False)
+
+            self._watcher = threading.Thread(target=_poll, name="kb-watcher", daemon=True)
+            self._watcher.start()
+            return self._watcher
+
+    def set_generation_mode(self, mode):
+        if mode not in GENERATION_MODES:
+            raise ValueError(f"Unknown generation mode '{mode}'. Choose one of: {', '.join(GENERATION_MODES)}")
+        self.generation_mode = mode
+        self.start_llm_probe()
+
+    def start_llm_probe(self, interval=30.0):
+        """
+        Starts (once) a daemon thread that warms the model with one solution-prompt
+        request, which also primes the static prompt prefix, and sets llm_status.
+        While Ollama is unreachable it retries every `interval` seconds; meanwhile
+        llm_with_fallback answers extractively instead of waiting out timeouts.
+        """
+        with self._init_lock:
+            if self.generation_mode in ("off", "extractive"): return None
+            if self._probe and self._probe.is_alive(): return self._probe
+
+            def _run():
+                if self.llm_status != "unavailable":
+                    self.llm_status = "warming"
+                while True:
+                    try:
+                        self.solution_chain().invoke({"t": "Reply with OK.", "c": "Readiness check."})
+                        self.llm_status = "ready"
+                        print("LLM ready.")
+                        return
+                    except Exception as e:
+                        if self.llm_status != "unavailable":
+                            print(f"LLM unavailable, retrying every {interval:.0f}s: {e}")
+                        self.llm_status = "unavailable"
+                    time.sleep(interval)
+
+            self._probe = threading.Thread(target=_run, name="llm-probe", daemon=True)
+            self._probe.start()
+            return self._probe
+
+    def sync_tickets(self, background=True):
+        """
+        Brings the resolved-ticket index up to date with the ticket store (and the
+        current embedder). Runs in a thread by default: a rebuild over a large
+        ticket log must not hold up startup.
+        """
+        if not self.vectorstore: return  # no embedder available
+
+        def _run():
+            try:
+                added = self.ticket_index.sync(self.embeddings, self.embedder_id or self.embedder_name, blocking=False)
+                if added: print(f"Ticket index synced: {added} tickets added.")
             except Exception as e:
-                print(f"Vector store init failed, using fallback search: {e}")
-                self.retriever = None
-            
-            self.initialized = True
-            print(f"KB Initialized with {len(self.docs)} articles.")
+                print(f"Ticket index sync failed: {e}")
+
+        if not background:
+            return _run()
+        thread = threading.Thread(target=_run, name="ticket-sync", daemon=True)
+        thread.start()
+        return thread
+
+    def record_ticket(self, text, category, recs, solution, title="", priority="", owner="", latency_ms=None,
+                      best_doc=None, resolved=False):
+        """
+        Appends an analyzed ticket to the resolved-ticket store and indexes it, so
+        later near-identical tickets can reuse its resolution.
+        latency_ms: end-to-end analysis time, for the Analytics tab's latency rollup
+        best_doc: the passage the solution was generated from (default: the top recommendation)
+        resolved: the solution is a finished model answer (Deadline "resolved"); only those are reused
+        Returns: ticket id or None
+        """
+        if category == "Error" or not solution: return None
+        try:
+            self.analytics  # rollup triggers must exist before the first append
+            ticket_id = self.tickets.append(text, category, recs, solution, title=title, priority=priority,
+                                            best_doc=best_doc, owner=owner, latency_ms=latency_ms, resolved=resolved)
         except Exception as e:
-            print(f"KB Init Failed: {e}")
+            metrics.inc("errors_total", stage="ticket_store")
+            print(f"Ticket store append failed: {e}")
+            return None
+        if self.vectorstore:
+            index = self.ticket_index
+            if index.embedder != (self.embedder_id or self.embedder_name) or index.needs_rebuild():
+                self.sync_tickets()
+            else:
+                try:
+                    index.catch_up(self.embeddings)  # the query embedding is cached: no model call
+                except Exception as e:
+                    print(f"Ticket index update failed: {e}")
+        return ticket_id
+
+    def similar_tickets(self, text, k=3, query_vec=None):
+        """
+        Past tickets closest to text from the resolved-ticket index.
+        Returns: [(ticket dict, similarity)] best first
+        """
+        if not self.vectorstore or not self.ticket_index.ready: return []
+        # Right after an embedder switch the ticket index still holds the old model's vectors
+        if self.ticket_index.embedder != (self.embedder_id or self.embedder_name): return []
+        if query_vec is None:
+            query_vec = self.embeddings.embed_query(text)
+        hits = self.ticket_index.search(query_vec, k)
+        found = self.tickets.get([i for i, _ in hits])
+        return [(found[i], score) for i, score in hits if i in found]
+
+    def _kb_mtime(self):
+        try:
+            return os.path.getmtime(self.kb_path)
+        except OSError:
+            return None
+
+    def _swap_in(self, docs, lexical, vectorstore, retriever, embedding):
+        # Single assignment under the lock so readers never see a half-built state;
+        # the embedder changes with the index built from it
+        with self._state_lock:
+            self.docs, self.lexical, self.vectorstore, self.retriever = docs, lexical, vectorstore, retriever
+            self.embedder_name, self.embedder_id, self._embeddings = embedding
+
+    def _build_kb(self, embedder=None, wait=True):
+        """
+        embedder: name of the embedder to index with (default: the current one)
+        wait: wait for another process writing the index (else serve the current index, see sync_index)
+        Returns: (docs, lexical, vectorstore, retriever, (embedder_name, embedder_id, embeddings))
+        """
+        # Load from JSON file
+        docs = []
+        if os.path.exists(self.kb_path):
+            with open(self.kb_path, "r") as f:
+                data = json.load(f)
+                docs = [{"topic": item['topic'], "content": item['content']} for item in data]
+        else:
+            print(f"Warning: {self.kb_path} not found. Using fallback data.")
+            docs = [
+                {"topic": "Password Reset", "content": "Go to Settings > Security > Reset Password."},
+                {"topic": "System Slow", "content": "Clear cache/cookies and restart."},
+                {"topic": "VPN Issues", "content": "Restart Cisco AnyConnect."},
+                {"topic": "Software Request", "content": "Submit IT ticket."},
+                {"topic": "Wifi", "content": "Connect to CorpNet-Secure."}
+            ]
+
+        # Keyword fallback index, built ONCE per KB version (bulk-ingested records are vector-only, see backend.ingest)
+        lexical = BM25Index([article_text(d) for d in docs])
+
+        if embedder is None or embedder == self.embedder_name:
+            embeddings = self.embeddings
+            embedding = (self.embedder_name, self.embedder_id, embeddings)
+        else:
+            embedder_id, embeddings = self._make_embeddings(embedder)
+            embedding = (embedder, embedder_id, embeddings)
+
+        # Incrementally sync the vector store: only new/changed articles are embedded
+        try:
+            vectorstore, report = sync_index(self.index_path, docs, embeddings, embedder=embedding[1] or embedding[0],
+                                             config=self.index_config, wait=wait)
+            self.index_report = report
+            print(f"Vector store synced: {report['added']} added, {report['changed']} changed, "
+                  f"{report['removed']} removed, {report['unchanged']} unchanged.")
+            retriever = vectorstore.as_retriever(search_kwargs={"k": 3}) if vectorstore else None
+        except Exception as e:
+            print(f"Vector store init failed, using fallback search: {e}")
+            vectorstore, retriever = None, None
+        return docs, lexical, vectorstore, retriever, embedding
 
     def categorize_ticket(self, text):
         self.ensure_kb_initialized()
         try:
-            if self.retriever:
-                # FAST: Use Vector Search for categorization instead of LLM
-                docs = self.retriever.invoke(text)
-                if docs:
-                    top_match = docs[0].page_content
-                    category = top_match.split(":")[0] if ":" in top_match else "General Support"
-                    return category
-            else:
-                # Fallback: keyword match
-                query_lower = text.lower()
-                for doc in self.docs:
-                    if any(word in doc['topic'].lower() for word in query_lower.split()):
-                        return doc['topic']
-            return "General Support"
+            # FAST: Use retrieval (hybrid vector + BM25) for categorization instead of LLM
+            hits, _, _ = self._scored_search(text, k=1)
+            return self._category_for(text, hits[0][0] if hits else None)
         except Exception as e:
+            self._failed("categorize", e)
             return "General Support"
 
     def recommend_articles(self, text):
         self.ensure_kb_initialized()
         try:
-            if self.retriever:
-                return [d.page_content for d in self.retriever.invoke(text)] if self.retriever else []
-            else:
-                # Fallback: simple keyword matching
-                query_lower = text.lower()
-                matches = []
-                for doc in self.docs:
-                    if any(word in doc['topic'].lower() or word in doc['content'].lower() for word in query_lower.split()):
-                        matches.append(f"{doc['topic']}: {doc['content']}")
-                return matches[:3]  # top 3
-        except: return []
+            return self._search(text)[0]  # top 3
+        except Exception as e:
+            self._failed("recommend", e)
+            return []
 
     def generate_solution(self, text):
         self.ensure_kb_initialized()
         try:
-            title_docs = self.recommend_articles(text)
-            if not title_docs: return "I couldn't find any specific articles for this issue."
-            
-            # Use only the top 1 document for the solution
-            best_doc = title_docs[0]
-            
-            if self._llm:
-                return (ChatPromptTemplate.from_template(
-                    "Answer briefly based on:\n{c}\n"
-                    "Question: {t}"
-                ) | self.llm | StrOutputParser()).invoke({"t": text, "c": best_doc})
-            else:
-                # Fallback: return the content directly
-                return best_doc
+            recs, query_vec, passage = self._search(text)
+            if not recs: return self._no_article()
+
+            # Use only the best chunk of the top article for the solution
+            return self._generate(text, passage, query_vec)
         except Exception as e:
+            self._failed("generate", e)
             return f"Error generating solution: {e}"
 
-    def analyze_full_ticket(self, text):
+    def analyze_full_ticket(self, text, priority=None, deadline=None):
         """
         Performs retrieval ONCE and generates category, recommendations, and solution.
         Returns: (category, recommendations_list, solution_text)
         """
+        result = self.analyze_ticket(text, priority=priority, deadline=deadline)
+        return result["category"], result["recommendations"], result["solution"]
+
+    def analyze_ticket(self, text, priority=None, deadline=None):
+        """
+        analyze_full_ticket plus timing metadata. The deadline (default: the budget for
+        `priority` in PRIORITY_BUDGETS, none if unknown) bounds retrieval and generation;
+        past it the answer comes from the best retrieved article and timed_out is set.
+        Returns: {"category", "recommendations", "solution", "best_doc", "budget_s", "timed_out", "resolved",
+        "degraded", "timings"}, best_doc being the passage the solution came from (for record_ticket)
+        """
+        deadline = deadline or self.deadline_for(priority)
         self.ensure_kb_initialized()
         try:
-            # 1. Retrieval (Done ONCE)
-            docs = []
-            if self.retriever:
-                docs = self.retriever.invoke(text)
-            
-            # Fallback if no docs or no retriever
-            if not docs:
-                # Use keyword fallback logic from recommend_articles
-                query_lower = text.lower()
-                matches = []
-                for d in self.docs:
-                    if any(word in d['topic'].lower() or word in d['content'].lower() for word in query_lower.split()):
-                        matches.append(f"{d['topic']}: {d['content']}")
-                recs = matches[:3]
-                best_doc = recs[0] if recs else None
-            else:
-                recs = [d.page_content for d in docs]
-                best_doc = recs[0] if recs else None
-
-            # 2. Categorization
-            category = "General Support"
-            if best_doc:
-                category = best_doc.split(":")[0] if ":" in best_doc else "General Support"
-            elif not self.retriever: # If fallback was used
-                 for d in self.docs:
-                    if any(word in d['topic'].lower() for word in text.lower().split()):
-                        category = d['topic']
-                        break
+            # 1. Retrieval + 2. Categorization (Done ONCE)
+            with deadline.stage("retrieval"):
+                recs, query_vec, best_doc = self._search(text, deadline=deadline)
+            category = self._category_for(text, best_doc)
 
             # 3. Solution Generation
-            solution = "I couldn't find any specific articles for this issue."
-            if best_doc:
-                if self._llm:
-                    solution = (ChatPromptTemplate.from_template(
-                        "You are a helpful and professional IT Support Agent. "
-                        "Using the Reference Info below, provide a detailed and comprehensive answer to the user's question. "
-                        "Expand on the solution with standard professional troubleshooting steps if the reference is brief.\n"
-                        "Do NOT include the phrase 'Reference Info' or internal IDs (like #123) in your final response.\n\n"
-                        "Reference Info:\n{c}\n\n"
-                        "Question: {t}"
-                    ) | self.llm | StrOutputParser()).invoke({"t": text, "c": best_doc})
+            with deadline.stage("generation"):
+                solution = self._generate(text, best_doc, query_vec, deadline) if best_doc else self._no_article()
+        except Exception as e:
+            self._failed("analyze", e)
+            category, recs, solution, best_doc = "Error", [], f"Analysis failed: {e}", None
+        return {"category": category, "recommendations": recs, "solution": solution, "best_doc": best_doc,
+                **deadline.finish()}
+
+    def deadline_for(self, priority=None):
+        """A fresh Deadline with this engine's budget for the ticket priority (unlimited if unknown)."""
+        return Deadline.for_priority(priority, self.priority_budgets)
+
+    # --- Async API (HTTP service): same results as the sync methods, scheduled by self.scheduler.
+    # Each may raise QueueFullError when the scheduler is saturated.
+
+    async def acategorize(self, text):
+        await self._aensure_initialized()
+        try:
+            hits, _, _ = await self._ascored_search(text, k=1)
+            return self._category_for(text, hits[0][0] if hits else None)
+        except QueueFullError:
+            raise
+        except Exception as e:
+            self._failed("categorize", e)
+            return "General Support"
+
+    async def arecommend(self, text):
+        await self._aensure_initialized()
+        try:
+            hits, _, _ = await self._ascored_search(text)
+            return [doc for doc, _ in hits]
+        except QueueFullError:
+            raise
+        except Exception as e:
+            self._failed("recommend", e)
+            return []
+
+    async def aanalyze(self, text, priority=None, deadline=None):
+        """
+        Async analyze_ticket: the query embedding joins the current micro-batch and
+        generation waits for a free LLM slot (ainvoke), both within the deadline.
+        Returns: same dict as analyze_ticket
+        """
+        deadline = deadline or self.deadline_for(priority)
+        await self._aensure_initialized()
+        try:
+            with deadline.stage("retrieval"):
+                hits, query_vec, best_doc = await self._ascored_search(text, deadline=deadline)
+            recs = [doc for doc, _ in hits]
+            category = self._category_for(text, best_doc)
+
+            with deadline.stage("generation"):
+                solution = await self._agenerate(text, best_doc, query_vec, deadline) if best_doc else self._no_article()
+        except QueueFullError:
+            raise
+        except Exception as e:
+            self._failed("analyze", e)
+            category, recs, solution, best_doc = "Error", [], f"Analysis failed: {e}", None
+        return {"category": category, "recommendations": recs, "solution": solution, "best_doc": best_doc,
+                **deadline.finish()}
+
+    async def aretrieve_context(self, text, deadline=None):
+        """
+        Async retrieve_context, plus the query embedding for astream_solution's answer cache lookup.
+        Returns: (category, recommendations_list, best_doc or None, query_vector or None)
+        """
+        deadline = deadline or Deadline()
+        await self._aensure_initialized()
+        with deadline.stage("retrieval"):
+            hits, query_vec, best_doc = await self._ascored_search(text, deadline=deadline)
+        return self._category_for(text, best_doc), [doc for doc, _ in hits], best_doc, query_vec
+
+    async def _aensure_initialized(self):
+        if not self.initialized:
+            await asyncio.get_running_loop().run_in_executor(None, self.ensure_kb_initialized)
+
+    async def _ascored_search(self, text, k=3, deadline=None):
+        mode = self.retrieval_mode
+        query_vec = None
+        if mode != "lexical" and self.vectorstore:
+            budget = deadline.remaining(RETRIEVAL_SHARE) if deadline else None
+            try:
+                query_vec = await asyncio.wait_for(self.scheduler.embed(text), budget)
+            except asyncio.TimeoutError:
+                self._retrieval_degraded(deadline)
+        # FAISS + docstore + BM25 stay off the event loop
+        hits, passage = await asyncio.get_running_loop().run_in_executor(None, self._fused_hits, text, query_vec, k, mode)
+        return hits, query_vec, passage
+
+    async def _agenerate(self, text, best_doc, query_vec, deadline):
+        """Async _generate: the whole answer via ainvoke in a scheduler slot."""
+        if not self._use_llm():
+            return self._fallback_answer(text, best_doc)
+        cached = self._cached_solution(query_vec, best_doc)
+        if cached is not None:
+            deadline.completed = True
+            return cached
+        if deadline.expired():
+            self._timed_out(deadline)
+            return self._timeout_answer(text, best_doc)
+        try:
+            async with self.scheduler.generation_slot(deadline.remaining()):
+                started = time.perf_counter()
+                solution = await asyncio.wait_for(self.solution_chain().ainvoke({"t": text, "c": best_doc}),
+                                                  self._wait_budget(deadline, started=False))
+                metrics.observe("llm", time.perf_counter() - started)
+        except asyncio.TimeoutError:
+            self._timed_out(deadline)
+            return self._timeout_answer(text, best_doc)
+        except QueueFullError:
+            raise
+        except Exception as e:
+            if self.generation_mode == "llm": raise
+            self._llm_failed(e)
+            return extractive_answer(text, best_doc)
+        deadline.completed = True
+        self._remember_solution(query_vec, best_doc, solution)
+        return solution
+
+    def stream_solution(self, text, best_doc=None, deadline=None):
+        """
+        Generator version of the solution step: yields tokens as the LLM produces them.
+        Pass best_doc from retrieve_context() to skip a second retrieval, so the caller
+        can show category and recommendations before generation starts.
+        Pass the same deadline to both to bound the whole request and read its timings.
+        """
+        deadline = deadline or Deadline()
+        try:
+            if best_doc is None:
+                _, _, best_doc = self.retrieve_context(text, deadline)
+        except Exception as e:
+            self._failed("retrieval", e)
+            yield f"Analysis failed: {e}"
+            return
+        if not best_doc:
+            yield self._no_article()
+            return
+        if not self._use_llm():
+            yield self._fallback_answer(text, best_doc)
+            return
+        with deadline.stage("generation"):
+            try:
+                query_vec = self.embeddings.embed_query(text) if self.vectorstore else None
+                cached = self._cached_solution(query_vec, best_doc)
+                if cached is not None:
+                    deadline.completed = True
+                    yield cached
+                    return
+            except Exception as e:
+                self._failed("generate", e)
+                yield f"\n\nError generating solution: {e}"
+                return
+
+            started = False
+            for kind, value in self._generation_events(text, best_doc, query_vec, deadline):
+                if kind == "token":
+                    started = True
+                    yield value
+                elif kind == "done":
+                    deadline.completed = True
+                elif kind == "timeout":
+                    # Already-shown text stays; otherwise answer from the article instead
+                    yield TRUNCATED_NOTE if started else self._timeout_answer(text, best_doc)
+                elif not started and self.generation_mode == "llm_with_fallback":
+                    self._llm_failed(value)
+                    yield extractive_answer(text, best_doc)
                 else:
-                    solution = best_doc
+                    self._failed("generate", value)
+                    yield f"\n\nError generating solution: {value}"
 
-            return category, recs, solution
+    async def astream_solution(self, text, best_doc, deadline=None, query_vec=None):
+        """
+        Async counterpart of stream_solution for the HTTP service. A missed budget
+        cancels the pending read, which aborts the request to Ollama.
+        Pass query_vec from aretrieve_context() so cached answers skip the model.
+        """
+        deadline = deadline or Deadline()
+        if not best_doc:
+            yield self._no_article()
+            return
+        if not self._use_llm():
+            yield self._fallback_answer(text, best_doc)
+            return
+        cached = self._cached_solution(query_vec, best_doc)
+        if cached is not None:
+            deadline.completed = True
+            yield cached
+            return
+        with deadline.stage("generation"):
+            try:
+                # Holds a scheduler slot for the whole stream. Raises: QueueFullError
+                async with self.scheduler.generation_slot(deadline.remaining()):
+                    async for token in self._astream_tokens(text, best_doc, query_vec, deadline):
+                        yield token
+            except asyncio.TimeoutError:  # no slot freed up within the budget
+                self._timed_out(deadline)
+                yield self._timeout_answer(text, best_doc)
 
+    async def _astream_tokens(self, text, best_doc, query_vec, deadline):
+        stream = self.solution_chain(parsed=False).astream({"t": text, "c": best_doc}).__aiter__()
+        parts = []
+        started = False
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    token = await asyncio.wait_for(stream.__anext__(), self._wait_budget(deadline, started))
+                except StopAsyncIteration:
+                    metrics.observe("llm", time.perf_counter() - start)
+                    deadline.completed = True
+                    self._remember_solution(query_vec, best_doc, "".join(parts))
+                    return
+                except asyncio.TimeoutError:
+                    self._timed_out(deadline)
+                    yield TRUNCATED_NOTE if started else self._timeout_answer(text, best_doc)
+                    return
+                except Exception as e:
+                    if started or self.generation_mode == "llm": raise
+                    self._llm_failed(e)
+                    yield extractive_answer(text, best_doc)
+                    return
+                if not started:
+                    metrics.observe("llm_first_token", time.perf_counter() - start)
+                started = True
+                parts.append(token.content)
+                yield token.content
+        finally:
+            await stream.aclose()
+
+    def retrieve_context(self, text, deadline=None):
+        """
+        Retrieval and categorization shared by the single-ticket, batch and HTTP paths.
+        Returns: (category, recommendations_list, best_doc or None)
+        """
+        deadline = deadline or Deadline()
+        self.ensure_kb_initialized()
+        with deadline.stage("retrieval"):
+            recs, _, best_doc = self._search(text, deadline=deadline)
+        return self._category_for(text, best_doc), recs, best_doc
+
+    def solution_chain(self, parsed=True):
+        """
+        The prompt | llm | parser chain, built once and rebuilt only if the LLM is replaced.
+        parsed=False returns prompt | llm (message chunks): closing that stream aborts
+        the model request at once, whereas the parser stage drains it first.
+        """
+        llm = self.llm
+        if self._chain is None or self._chain[0] is not llm:
+            self._chain = (llm, SOLUTION_PROMPT | llm | StrOutputParser(), SOLUTION_PROMPT | llm)
+        return self._chain[1] if parsed else self._chain[2]
+
+    def hybrid_search(self, text, k=3, mode=None):
+        """
+        Runs FAISS and BM25 retrieval and fuses the rankings with reciprocal rank fusion,
+        so exact terms (error codes, product names) survive a weak embedder.
+        mode: "hybrid" (default), "vector" or "lexical".
+        Returns: [(page_content, score)] best first
+        """
+        self.ensure_kb_initialized()
+        return self._scored_search(text, k, mode)[0]
+
+    def _search(self, text, k=3, deadline=None):
+        """Returns: (recommendations_list, query_vector or None, passage for the LLM or None)"""
+        hits, query_vec, passage = self._scored_search(text, k, deadline=deadline)
+        return [doc for doc, _ in hits], query_vec, passage
+
+    def _scored_search(self, text, k=3, mode=None, deadline=None):
+        """
+        Embeds the query explicitly (instead of retriever.invoke) so the vector can be
+        reused by the answer cache. Returns: (hits, query_vector or None, passage or None)
+        """
+        mode = mode or self.retrieval_mode
+        query_vec = None
+        if mode != "lexical" and self.vectorstore:
+            query_vec = self._embed_query(text, deadline)
+        hits, passage = self._fused_hits(text, query_vec, k, mode)
+        return hits, query_vec, passage
+
+    def _fused_hits(self, text, query_vec, k, mode):
+        """
+        Vector hits for query_vec (if any) fused with BM25 per `mode`, one entry per article.
+        Returns: ([(article_text, score)], the top article's best chunk for the LLM or None)
+        """
+        fetch_k = k if mode != "hybrid" else max(k * 4, 10)
+        vector_hits, chunks = [], {}
+        if query_vec is not None and mode != "lexical" and self.vectorstore:
+            # Several chunks may belong to one article: fetch extra so k articles survive the collapse
+            row = self._vector_hits(np.asarray([query_vec], dtype=np.float32), max(k * 4, 10))[0]
+            vector_hits = [(doc, score) for doc, score, _ in row][:fetch_k]
+            chunks = {doc: chunk for doc, _, chunk in row}
+
+        # Lexical stage (also the fallback if no docs or no vector store)
+        lexical_hits = []
+        if mode != "vector" or not vector_hits:
+            lexical_hits = self._keyword_hits(text, fetch_k)
+
+        if vector_hits and lexical_hits:
+            hits = reciprocal_rank_fusion([vector_hits, lexical_hits])[:k]
+        else:
+            hits = (vector_hits or lexical_hits)[:k]
+        return hits, self._passage(text, hits[0][0], chunks) if hits else None
+
+    def _passage(self, text, article, chunks=None):
+        """
+        The part of an article passed to the LLM: its best vector-matched chunk, or for
+        a keyword-only hit the chunk sharing the most terms with the ticket.
+        """
+        if chunks and article in chunks: return chunks[article]
+        topic, _, content = article.partition(": ")
+        pieces = chunk_text(content, self.index_config.chunk_size, self.index_config.chunk_overlap)
+        if len(pieces) <= 1: return article
+        terms = set(tokenize(text))
+        best = max(pieces, key=lambda piece: len(terms.intersection(tokenize(piece))))
+        return article_text({"topic": topic, "content": best})
+
+    def _vector_hits(self, matrix, k):
+        """
+        One FAISS search over article chunks for a matrix of query vectors.
+        Returns: per row [(article_text, relevance, best chunk)], one entry per article, best first
+        """
+        vs = self.vectorstore
+        if matrix.shape[1] != vs.index.d:
+            # Embedded just before an embedder switch swapped in the new index: keyword results only
+            return [[] for _ in matrix]
+        if vs._normalize_L2:
+            import faiss
+            matrix = matrix.copy()
+            faiss.normalize_L2(matrix)
+        with metrics.timer("vector_search"):
+            distances, indices = vs.index.search(matrix, k)
+            relevance = vs._select_relevance_score_fn()
+
+            rows = []
+            for dist_row, idx_row in zip(distances, indices):
+                hits, seen = [], set()
+                for dist, idx in zip(dist_row, idx_row):
+                    if idx == -1: continue  # fewer than k docs in the index
+                    doc = vs.docstore.search(vs.index_to_docstore_id[idx])
+                    parent_id = doc.metadata.get("parent_id")
+                    if parent_id in seen: continue  # a better chunk of this article ranked higher
+                    article = None
+                    if parent_id:
+                        seen.add(parent_id)
+                        article = vs.docstore.parent(parent_id)
+                    hits.append((article or doc.page_content, float(relevance(dist)), doc.page_content))
+                rows.append(hits)
+        return rows
+
+    def _embed_query(self, text, deadline=None):
+        """Query embedding, or None if the embedder misses the retrieval share of the deadline."""
+        if deadline is None or not deadline.limited:
+            return self._timed_embed(text)
+        future = self._retrieval_pool.submit(self._timed_embed, text)
+        try:
+            return future.result(timeout=deadline.remaining(RETRIEVAL_SHARE))
+        except FutureTimeout:
+            self._retrieval_degraded(deadline)
+            return None
+
+    def _timed_embed(self, text):
+        with metrics.timer("embed"):
+            return self.embeddings.embed_query(text)
+
+    def _retrieval_degraded(self, deadline):
+        print("Embedding missed the retrieval budget, using keyword search only.")
+        metrics.inc("fallbacks_total", reason="retrieval_timeout")
+        deadline.degraded.append("retrieval")
+
+    def _keyword_hits(self, text, k):
+        with self._state_lock:
+            docs, lexical = self.docs, self.lexical
+        with metrics.timer("lexical_search"):
+            return [(article_text(docs[idx]), score) for idx, score in lexical.search(text, k=k)]
+
+    def _use_llm(self):
+        if self.generation_mode == "llm": return True
+        return self.generation_mode == "llm_with_fallback" and self.llm_status != "unavailable"
+
+    def _wait_budget(self, deadline, started):
+        """Seconds to wait for the next token (None = no limit): the deadline, and llm_timeout for the first token."""
+        wait = deadline.remaining()
+        if not started and self.generation_mode == "llm_with_fallback":
+            wait = self.llm_timeout if wait is None else min(wait, self.llm_timeout)
+        return wait
+
+    def _timed_out(self, deadline):
+        deadline.timed_out = True
+        metrics.inc("fallbacks_total", reason="llm_timeout")
+        print("LLM missed its time budget, answering from the best article.")
+
+    def _timeout_answer(self, text, best_doc):
+        return extractive_answer(text, best_doc) if self.generation_mode == "llm_with_fallback" else best_doc
+
+    def _fallback_answer(self, text, best_doc):
+        # Counted by why the LLM was skipped: the configured mode, or the probe marked it down
+        metrics.inc("fallbacks_total", reason="llm_unavailable" if self.generation_mode.startswith("llm") else self.generation_mode)
+        return best_doc if self.generation_mode == "off" else extractive_answer(text, best_doc)
+
+    def _no_article(self):
+        metrics.inc("fallbacks_total", reason="no_article")
+        return NO_ARTICLE
+
+    def _failed(self, stage, error):
+        # Failures the caller turns into a default answer still get logged and counted
+        metrics.inc("errors_total", stage=stage)
+        print(f"{stage.capitalize()} failed: {error}")
+
+    def _llm_failed(self, error):
+        print(f"LLM call failed, answering extractively: {error}")
+        metrics.inc("errors_total", stage="llm")
+        metrics.inc("fallbacks_total", reason="llm_error")
+        self.llm_status = "unavailable"
+        self.start_llm_probe()  # flips back to "ready" once the model answers again
+
+    def _generate(self, text, best_doc, query_vec=None, deadline=None):
+        """Solution for best_doc per generation_mode: answer cache, then the LLM within budget, else fallback."""
+        deadline = deadline or Deadline()
+        if not self._use_llm():
+            return self._fallback_answer(text, best_doc)
+        cached = self._cached_solution(query_vec, best_doc)
+        if cached is not None:
+            deadline.completed = True
+            return cached
+        if deadline.expired():  # retrieval used up the budget
+            self._timed_out(deadline)
+            return self._timeout_answer(text, best_doc)
+
+        parts = []
+        for kind, value in self._generation_events(text, best_doc, query_vec, deadline):
+            if kind == "token":
+                parts.append(value)
+            elif kind == "done":
+                deadline.completed = True
+            elif kind == "timeout":
+                return self._timeout_answer(text, best_doc)
+            elif self.generation_mode == "llm":
+                raise value
+            else:
+                self._llm_failed(value)
+                return extractive_answer(text, best_doc)
+        return "".join(parts)
+
+    def _generation_events(self, text, best_doc, query_vec, deadline):
+        """
+        Streams the chain in a producer thread and yields ("token", str) events, then
+        ("done", None) when the model finished, or ends early with ("timeout", None)
+        or ("error", exception). On timeout the
+        producer is cancelled: it closes the model stream at its next chunk, which
+        drops the request to Ollama. Completed answers go to the answer cache.
+        """
+        events = queue.Queue()
+        cancel = threading.Event()
+
+        def _produce():
+            parts = []
+            stream = self.solution_chain(parsed=False).stream({"t": text, "c": best_doc})
+            try:
+                for chunk in stream:
+                    if cancel.is_set(): return
+                    parts.append(chunk.content)
+                    events.put(("token", chunk.content))
+                events.put(("done", None))
+                self._remember_solution(query_vec, best_doc, "".join(parts))
+            except Exception as e:
+                events.put(("error", e))
+            finally:
+                stream.close()
+
+        threading.Thread(target=_produce, name="llm-stream", daemon=True).start()
+        started = False
+        start = time.perf_counter()
+        while True:
+            try:
+                kind, value = events.get(timeout=self._wait_budget(deadline, started))
+            except queue.Empty:
+                cancel.set()
+                self._timed_out(deadline)
+                yield "timeout", None
+                return
+            if kind == "done":
+                metrics.observe("llm", time.perf_counter() - start)
+                yield kind, value
+                return
+            if not started and kind == "token":
+                metrics.observe("llm_first_token", time.perf_counter() - start)
+            yield kind, value
+            if kind == "error": return
+            started = True
+
+    def _cached_solution(self, query_vec, best_doc):
+        if query_vec is None: return None
+        cached = self.answer_cache.get(query_vec, best_doc)
+        if cached is not None:
+            metrics.inc("cache_hits_total", cache="answer")
+            return cached
+        cached = self._past_resolution(query_vec, best_doc)
+        if cached is not None:
+            metrics.inc("cache_hits_total", cache="ticket")
+        else:
+            metrics.inc("cache_misses_total")
+        return cached
+
+    def _past_resolution(self, query_vec, best_doc):
+        """
+        A past ticket counts as a confirmed match when it is within
+        ticket_match_threshold, used the same passage and was resolved by the model.
+        """
+        try:
+            for ticket, score in self.similar_tickets(None, k=1, query_vec=query_vec):
+                if score < self.ticket_match_threshold or ticket["best_doc"] != best_doc: continue
+                # Only answers the model finished: not errors, fallbacks or time-limited partials
+                if not ticket["resolved"]: continue
+                return ticket["solution"]
         except Exception as e:
-            return "Error", [], f"Analysis failed: {e}"
+            metrics.inc("errors_total", stage="ticket_memory")
+            print(f"Ticket memory lookup failed: {e}")
+        return None
+
+    def _remember_solution(self, query_vec, best_doc, solution):
+        if query_vec is None or not solution: return
+        self.answer_cache.put(query_vec, best_doc, solution)
+
+    def _category_for(self, text, best_doc):
+        # best_doc already comes from the BM25 fallback when vector search is unavailable
+        if best_doc:
+            return best_doc.split(":")[0] if ":" in best_doc else "General Support"
+        return "General Support"
+
+    def analyze_tickets(self, texts, max_concurrency=4, deadline=None):
+        """
+        Batch version of analyze_full_ticket for bulk triage.
+        Embeds all queries in ONE embed_documents call, searches FAISS ONCE with the
+        query matrix and generates solutions with bounded concurrency (at most the
+        scheduler's llm_concurrency). An optional Deadline bounds the whole batch.
+        Returns: list of (category, recommendations_list, solution_text) in input order
+        """
+        return [(r["category"], r["recommendations"], r["solution"])
+                for r in self.analyze_ticket_batch(texts, max_concurrency, deadline)]
+
+    def analyze_ticket_batch(self, texts, max_concurrency=4, deadline=None):
+        """
+        analyze_tickets with the per-ticket fields record_ticket needs.
+        Returns: list of {"category", "recommendations", "solution", "best_doc", "timed_out", "resolved"}
+        in input order, best_doc being the passage the solution came from
+        """
+        deadline = deadline or Deadline()
+        self.ensure_kb_initialized()
+        results, pending, query_matrix = self._batch_prepare(list(texts))
+        if not pending: return results
+
+        # 3. Solution Generation (bounded concurrency; each stream is cancelled at the deadline)
+        slots = threading.BoundedSemaphore(self._batch_concurrency(max_concurrency))
+        futures = [self._generation_pool.submit(self._batch_generate, text, best_doc, deadline, slots)
+                   for _, text, best_doc in pending]
+        start = time.perf_counter()
+        outputs = [future.result() for future in futures]
+        metrics.observe("llm_batch", time.perf_counter() - start)
+        return self._batch_finish(results, pending, outputs, query_matrix, deadline)
+
+    def _batch_generate(self, text, best_doc, deadline, slots):
+        """
+        One analyze_ticket_batch generation, streamed through _generation_events like the
+        single-ticket path, so a missed budget stops the model instead of waiting it out.
+        Returns: the answer, or the exception it failed with (TimeoutError past the deadline)
+        """
+        if not slots.acquire(timeout=deadline.remaining()):
+            return TimeoutError("LLM budget exceeded")
+        try:
+            if deadline.expired():
+                return TimeoutError("LLM budget exceeded")
+            parts = []
+            # No query vector: _batch_finish caches the answers
+            for kind, value in self._generation_events(text, best_doc, None, deadline):
+                if kind == "token":
+                    parts.append(value)
+                elif kind == "done":
+                    return "".join(parts)
+                elif kind == "timeout":
+                    return TimeoutError("LLM budget exceeded")
+                else:
+                    return value
+            return "".join(parts)
+        finally:
+            slots.release()
+
+    async def aanalyze_tickets(self, texts, max_concurrency=LLM_CONCURRENCY, deadline=None):
+        """
+        Async analyze_tickets for the HTTP service: batch retrieval in a worker thread,
+        then each generation in a scheduler slot (as aanalyze), at most max_concurrency
+        at once. A generation still running at the deadline is cancelled.
+        Raises: QueueFullError when the scheduler is saturated
+        Returns: same list of dicts as analyze_ticket_batch
+        """
+        deadline = deadline or Deadline()
+        await self._aensure_initialized()
+        loop = asyncio.get_running_loop()
+        results, pending, query_matrix = await loop.run_in_executor(self._retrieval_pool, self._batch_prepare,
+                                                                    list(texts))
+        if not pending: return results
+        wave = asyncio.Semaphore(self._batch_concurrency(max_concurrency))
+
+        async def _one(text, best_doc):
+            async with wave:
+                async with self.scheduler.generation_slot(deadline.remaining()):
+                    return await asyncio.wait_for(self.solution_chain().ainvoke({"t": text, "c": best_doc}),
+                                                  self._wait_budget(deadline, started=False))
+
+        start = time.perf_counter()
+        outputs = await asyncio.gather(*(_one(text, best_doc) for _, text, best_doc in pending),
+                                       return_exceptions=True)
+        metrics.observe("llm_batch", time.perf_counter() - start)
+        for out in outputs:
+            if isinstance(out, QueueFullError): raise out
+        outputs = [TimeoutError("LLM budget exceeded") if isinstance(out, asyncio.TimeoutError) else out
+                   for out in outputs]
+        return self._batch_finish(results, pending, outputs, query_matrix, deadline)
+
+    def _batch_concurrency(self, max_concurrency):
+        # Never more parallel generations than the scheduler allows Ollama
+        return max(1, min(int(max_concurrency), self.scheduler.llm_concurrency))
+
+    def _batch_prepare(self, texts):
+        """
+        Retrieval and categorization for analyze_tickets, with cached answers filled in.
+        Returns: (results, pending [(position, text, best_doc)] still to generate, query_matrix)
+        """
+        if not texts: return [], [], None
+
+        # 1. Retrieval (one embedding call + one FAISS search for the whole batch)
+        try:
+            recs_per_ticket, chunks_per_ticket, query_matrix = self._batch_retrieve(texts, k=3)
+        except Exception as e:
+            metrics.inc("errors_total", stage="retrieval")
+            print(f"Batch retrieval failed, using keyword fallback: {e}")
+            recs_per_ticket, chunks_per_ticket, query_matrix = [[] for _ in texts], [{} for _ in texts], None
+
+        results = []
+        pending = []  # (position, text, best_doc) waiting for generation
+        for i, (text, recs, chunks) in enumerate(zip(texts, recs_per_ticket, chunks_per_ticket)):
+            if not recs:
+                recs = self._keyword_matches(text)
+            best_doc = self._passage(text, recs[0], chunks) if recs else None
+
+            # 2. Categorization (same rules as analyze_full_ticket)
+            category = self._category_for(text, best_doc)
+
+            resolved = False
+            if not best_doc:
+                solution = self._no_article()
+            elif not self._use_llm():
+                solution = self._fallback_answer(text, best_doc)
+            else:
+                solution = extractive_answer(text, best_doc)  # kept if generation fails (llm_with_fallback)
+                query_vec = query_matrix[i] if query_matrix is not None else None
+                cached = self._cached_solution(query_vec, best_doc)
+                if cached is not None:
+                    solution, resolved = cached, True
+                else:
+                    pending.append((i, text, best_doc))
+            results.append({"category": category, "recommendations": recs, "solution": solution, "best_doc": best_doc,
+                            "timed_out": False, "resolved": resolved})
+        return results, pending, query_matrix
+
+    def _batch_finish(self, results, pending, outputs, query_matrix, deadline):
+        """Merges generation outputs (answers or exceptions) into results. Returns: results"""
+        if any(isinstance(out, TimeoutError) for out in outputs) and not deadline.timed_out:
+            self._timed_out(deadline)  # the sync path's streams already reported it
+        errors = [out for out in outputs if isinstance(out, Exception)]
+        if errors and len(errors) == len(outputs) and self.generation_mode == "llm_with_fallback" \
+                and not isinstance(errors[0], TimeoutError):
+            self._llm_failed(errors[0])
+        for (i, text, best_doc), out in zip(pending, outputs):
+            result = results[i]
+            if isinstance(out, TimeoutError):
+                result.update(solution=self._timeout_answer(text, best_doc), timed_out=True)
+            elif isinstance(out, Exception):
+                if self.generation_mode == "llm":
+                    result.update(category="Error", recommendations=[], solution=f"Analysis failed: {out}",
+                                  best_doc=None)
+                # llm_with_fallback keeps the extractive answer already in place
+            else:
+                result.update(solution=out, resolved=True)
+                if query_matrix is not None:
+                    self._remember_solution(query_matrix[i], best_doc, out)
+        return results
+
+    def _batch_retrieve(self, texts, k=3):
+        """
+        Top-k articles for every text using a single embedding call and FAISS search,
+        fused per ticket with BM25 in hybrid mode.
+        Returns: (recs_per_ticket, chunks_per_ticket as {article: best chunk}, query_matrix or None)
+        """
+        if not self.vectorstore or self.retrieval_mode == "lexical": return [[] for _ in texts], [{} for _ in texts], None
+        hybrid = self.retrieval_mode == "hybrid"
+        with metrics.timer("embed"):
+            matrix = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        vector_rows = self._vector_hits(matrix, max(k * 4, 10))
+
+        recs_per_ticket, chunks_per_ticket = [], []
+        for text, row in zip(texts, vector_rows):
+            hits = [(doc, score) for doc, score, _ in row]
+            if hybrid:
+                lexical_hits = self._keyword_hits(text, max(k * 4, 10))
+                if lexical_hits and hits:
+                    hits = reciprocal_rank_fusion([hits, lexical_hits])
+            recs_per_ticket.append([doc for doc, _ in hits[:k]])
+            chunks_per_ticket.append({doc: chunk for doc, _, chunk in row})
+        return recs_per_ticket, chunks_per_ticket, matrix
+
+    def _keyword_matches(self, text, limit=3):
+        """Ranked top-k keyword fallback (BM25 over topic + content)."""
+        return [doc for doc, _ in self._keyword_hits(text, limit)]
+
+    def detect_gaps(self, queries=None, limit=10000, batch_size=512):
+        """
+        Batch content-gap job: embeds the queries (default: the newest `limit` logged
+        tickets), scores each against its best KB article with one FAISS search per
+        batch, and clusters those under gap_threshold (see backend.gaps).
+        The result is kept in self.gaps for the Analytics tab; gaps_updated is set by
+        every run, empty or failed ones included, so the tab doesn't re-run it on each render.
+        Returns: gaps ranked by ticket volume
+        """
+        try:
+            self.gaps = self._find_gaps(queries, limit, batch_size)
+            return self.gaps
+        finally:
+            self.gaps_updated = time.time()
+
+    def _find_gaps(self, queries, limit, batch_size):
+        self.ensure_kb_initialized()
+        if queries is None:
+            queries = [text for _, text in self.tickets.recent(limit)]
+        if not queries or not self.vectorstore: return []
+
+        # Embed each distinct text once; duplicates still count towards a gap's volume
+        distinct, inverse = np.unique(np.asarray(queries, dtype=object), return_inverse=True)
+        vectors, coverage = [], []
+        for start in range(0, len(distinct), batch_size):
+            batch = list(distinct[start:start + batch_size])
+            with metrics.timer("embed"):
+                matrix = np.asarray(self.embeddings.embed_documents(batch), dtype=np.float32)
+            vectors.append(matrix)
+            coverage.append(self._kb_coverage(matrix))
+        vectors, coverage = np.vstack(vectors)[inverse], np.concatenate(coverage)[inverse]
+
+        return find_gaps(list(queries), vectors, coverage, threshold=self.gap_threshold)
+
+    def refresh_gaps(self, background=True):
+        """Runs detect_gaps() over recent tickets, in a thread by default; skipped if a run is in progress."""
+        def _run():
+            if not self._gaps_lock.acquire(blocking=False): return
+            try:
+                gaps = self.detect_gaps()
+                print(f"Gap detection: {len(gaps)} gaps found.")
+            except Exception as e:
+                print(f"Gap detection failed: {e}")
+            finally:
+                self._gaps_lock.release()
+
+        if not background:
+            return _run()
+        thread = threading.Thread(target=_run, name="gap-detection", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def gaps_running(self):
+        return self._gaps_lock.locked()
 
-    def detect_gaps(self, queries):
-        topics = ["password", "billing", "vpn", "software", "meeting", "slack"]
-        return list({q for q in queries if not any(t in q.lower() for t in topics)})
+    def _kb_coverage(self, matrix):
+        """Relevance of each row's best KB article (same scale as retrieval scores)."""
+        vs = self.vectorstore
+        if vs._normalize_L2:
+            import faiss
+            matrix = matrix.copy()
+            faiss.normalize_L2(matrix)
+        with metrics.timer("vector_search"):
+            distances, indices = vs.index.search(matrix, 1)
+        relevance = vs._select_relevance_score_fn()
+        return np.fromiter((relevance(d) if i != -1 else 0.0 for d, i in zip(distances[:, 0], indices[:, 0])),
+                           dtype=np.float32, count=len(matrix))
 
 kb_engine = KnowledgeBaseEngine()
@@ -0,0 +1,116 @@
+"""
+Request scheduler for the engine's async API.
+
+Concurrent query embeddings that arrive within a few milliseconds of each other
+are sent to the embedder as ONE embed_documents call (micro-batching), LLM
+generations are limited to what the local Ollama can serve at once, and both
+queues are bounded: past `max_queue` waiting requests new ones fail fast with
+QueueFullError instead of piling up latency.
+"""
+import asyncio
+import os
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from backend.metrics import metrics
+
+BATCH_WINDOW_MS = float(os.environ.get("SUPPORTAI_BATCH_WINDOW_MS", "5"))
+LLM_CONCURRENCY = int(os.environ.get("SUPPORTAI_LLM_CONCURRENCY", "4"))
+MAX_QUEUE = int(os.environ.get("SUPPORTAI_MAX_QUEUE", "64"))
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the scheduler is saturated; callers should retry later (HTTP 503)."""
+
+
+class _LoopState:
+    # asyncio primitives belong to one event loop, so each loop gets its own set
+    def __init__(self, llm_slots):
+        self.batch = []  # [(text, future)] collected during the current window
+        self.timer = None
+        self.embeds_waiting = 0
+        self.slots = asyncio.Semaphore(llm_slots)
+        self.generations_waiting = 0
+
+
+class Scheduler:
+    def __init__(self, embed_documents, executor=None, window_ms=BATCH_WINDOW_MS, max_batch=32,
+                 llm_concurrency=LLM_CONCURRENCY, max_queue=MAX_QUEUE):
+        self.embed_documents = embed_documents  # called in `executor` with a list of texts
+        self.executor = executor
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.llm_concurrency = llm_concurrency
+        self.max_queue = max_queue
+        self.batches = 0  # embed_documents calls made (for benchmarks)
+        self._states = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState(self.llm_concurrency)
+        return state
+
+    async def embed(self, text):
+        """Query embedding through the current micro-batch. Raises: QueueFullError"""
+        state = self._state()
+        if state.embeds_waiting >= self.max_queue:
+            metrics.inc("queue_full_total", queue="embed")
+            raise QueueFullError(f"{state.embeds_waiting} embeddings already queued")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        state.batch.append((text, future))
+        state.embeds_waiting += 1
+        if len(state.batch) >= self.max_batch:
+            self._flush(state)
+        elif state.timer is None:
+            state.timer = loop.call_later(self.window, self._flush, state)
+        try:
+            return await future
+        finally:
+            state.embeds_waiting -= 1
+
+    def _flush(self, state):
+        if state.timer is not None:
+            state.timer.cancel()
+            state.timer = None
+        batch, state.batch = state.batch, []
+        if batch:
+            asyncio.get_running_loop().create_task(self._run_batch(batch))
+
+    async def _run_batch(self, batch):
+        texts = [text for text, _ in batch]
+        self.batches += 1
+        start = time.perf_counter()
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(self.executor, self.embed_documents, texts)
+            metrics.observe("embed", time.perf_counter() - start)
+        except Exception as e:
+            metrics.inc("errors_total", stage="embed")
+            for _, future in batch:
+                if not future.done(): future.set_exception(e)
+            return
+        for (_, future), vector in zip(batch, vectors):
+            if not future.done(): future.set_result(vector)  # the waiter may have timed out
+
+    @asynccontextmanager
+    async def generation_slot(self, timeout=None):
+        """
+        Holds one of the `llm_concurrency` generation slots for the block.
+        Raises: QueueFullError if too many are waiting, asyncio.TimeoutError after `timeout` seconds
+        """
+        state = self._state()
+        if state.slots.locked() and state.generations_waiting >= self.max_queue:
+            metrics.inc("queue_full_total", queue="generation")
+            raise QueueFullError(f"{state.generations_waiting} generations already queued")
+        state.generations_waiting += 1
+        try:
+            await asyncio.wait_for(state.slots.acquire(), timeout)
+        finally:
+            state.generations_waiting -= 1
+        try:
+            yield
+        finally:
+            state.slots.release()
@@ -0,0 +1,319 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from backend.indexer import IndexConfig, build_index
+
+INDEX_FILE = "tickets.faiss"
+META_FILE = "meta.json"
+COLUMNS = "id, created, title, text, category, best_doc, recs, solution, priority, owner, latency_ms, resolved"
+
+# Roles that see every user's tickets in the history; everyone else sees their own
+SHARED_HISTORY_ROLES = {"Support Agent", "Manager", "Administrator"}
+
+
+def visible_owner(username, role):
+    """Returns: the owner filter for a user's history view (None = all tickets)"""
+    return None if role in SHARED_HISTORY_ROLES else username
+
+
+def _fts_query(search):
+    # Quote every term so user input can't inject FTS5 syntax; prefix-match the last one
+    terms = ['"' + t.replace('"', '""') + '"' for t in search.split()]
+    return " ".join(terms) + "*"
+
+
+class TicketStore:
+    """
+    Append-only SQLite log of analyzed tickets (text, category, recommendations,
+    solution). Rows are never updated, so the row id doubles as the FAISS label
+    and as a high-water mark for incremental indexing.
+    Also backs the History tab: an FTS5 table over title/text/solution plus
+    (owner|category|priority, id) indexes serve filtered, cursor-paginated pages.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL, title TEXT, text TEXT NOT NULL, "
+            "category TEXT, best_doc TEXT, recs TEXT, solution TEXT, priority TEXT, owner TEXT, latency_ms REAL, "
+            "resolved INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(tickets)")}
+        # Rows logged before `resolved` existed can't prove a clean answer: they default to 0
+        for column, kind in (("owner", "TEXT"), ("latency_ms", "REAL"), ("resolved", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE tickets ADD COLUMN {column} {kind}")
+        for column in ("owner", "category", "priority"):
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS tickets_{column} ON tickets ({column}, id)")
+        self.fts = self._create_fts()
+        self._db.commit()
+
+    def _create_fts(self):
+        try:
+            existed = self._db.execute("SELECT 1 FROM sqlite_master WHERE name = 'tickets_fts'").fetchone()
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts "
+                "USING fts5(title, text, solution, content='tickets', content_rowid='id')"
+            )
+            # Append-only table, so an insert trigger keeps the index complete
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS tickets_fts_insert AFTER INSERT ON tickets BEGIN "
+                "INSERT INTO tickets_fts (rowid, title, text, solution) VALUES (new.id, new.title, new.text, new.solution); "
+                "END"
+            )
+            if not existed:
+                self._db.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            print(f"SQLite FTS5 unavailable, history search falls back to LIKE: {e}")
+            return False
+
+    def append(self, text, category, recs, solution, title="", priority="", best_doc=None, owner="", latency_ms=None,
+               resolved=False):
+        """
+        latency_ms: time taken to analyze the ticket (None if unknown)
+        resolved: the solution is a finished model answer, safe to reuse
+        Returns: the new ticket id
+        """
+        if best_doc is None and recs:
+            best_doc = recs[0]
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO tickets (created, title, text, category, best_doc, recs, solution, priority, owner, "
+                "latency_ms, resolved) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), title, text, category, best_doc, json.dumps(list(recs or [])), solution, priority, owner,
+                 latency_ms, int(bool(resolved)))
+            )
+            self._db.commit()
+            return cur.lastrowid
+
+    def get(self, ids):
+        """Returns: {id: ticket dict} for the ids that exist"""
+        ids = [int(i) for i in ids]
+        if not ids: return {}
+        marks = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._db.execute(f"SELECT {COLUMNS} FROM tickets WHERE id IN ({marks})", ids).fetchall()
+        return {row[0]: self._to_dict(row) for row in rows}
+
+    def page(self, owner=None, category=None, priority=None, search=None, before=None, limit=20):
+        """
+        One page of history, newest first. `before` is the cursor returned with the
+        previous page (a ticket id), so every page is an index range scan however
+        deep it is. owner=None includes every user's tickets.
+        Returns: (tickets, next_cursor or None)
+        """
+        tables, where, args = "tickets t", [], []
+        if search and search.strip():
+            if self.fts:
+                tables += " JOIN tickets_fts f ON f.rowid = t.id"
+                where.append("tickets_fts MATCH ?")
+                args.append(_fts_query(search))
+            else:
+                where.append("(t.title LIKE ? OR t.text LIKE ?)")
+                args += [f"%{search.strip()}%"] * 2
+        for column, value in (("owner", owner), ("category", category), ("priority", priority)):
+            if value is not None:
+                where.append(f"t.{column} = ?")
+                args.append(value)
+        if before is not None:
+            where.append("t.id < ?")
+            args.append(before)
+
+        columns = ", ".join(f"t.{c.strip()}" for c in COLUMNS.split(","))
+        sql = f"SELECT {columns} FROM {tables}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY t.id DESC LIMIT ?", args + [limit + 1]).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [self._to_dict(row) for row in rows[:limit]], next_cursor
+
+    def texts_after(self, after_id, limit=1000, upto=None):
+        """Returns: [(id, text)] in id order, at most `limit` rows"""
+        query = "SELECT id, text FROM tickets WHERE id > ?"
+        args = [after_id]
+        if upto is not None:
+            query += " AND id <= ?"
+            args.append(upto)
+        with self._lock:
+            return self._db.execute(query + " ORDER BY id LIMIT ?", args + [limit]).fetchall()
+
+    def recent(self, limit=10000):
+        """Returns: [(id, text)] of the newest `limit` tickets, newest first"""
+        with self._lock:
+            return self._db.execute("SELECT id, text FROM tickets ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+
+    def last_id(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(MAX(id), 0) FROM tickets").fetchone()[0]
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            "id": row[0], "created": row[1], "title": row[2], "text": row[3], "category": row[4],
+            "best_doc": row[5], "recs": json.loads(row[6] or "[]"), "solution": row[7], "priority": row[8],
+            "owner": row[9], "latency_ms": row[10], "resolved": bool(row[11]),
+        }
+
+
+class TicketIndex:
+    """
+    Vector index over a TicketStore, labelled by ticket id.
+    Catch-up only embeds rows past the indexed high-water mark; a full rebuild
+    (off the lock, then swapped in) happens when the embedder changes, the
+    effective index type changes, or an IVF index has grown 4x past the data it
+    was trained on, so coarse centroids keep up with millions of rows.
+    Vectors are L2-normalized: similarity = 1 - distance / 2.
+    Rows are never deleted, so the store's last id is its row count: sizing
+    decisions never scan the table.
+    """
+
+    def __init__(self, path, store, config=None, save_every=100):
+        self.path = path
+        self.store = store
+        self.config = config or IndexConfig(index_type="ivf_flat")
+        self.save_every = save_every
+        self.embedder = None
+        self._index = None
+        self._meta = {}
+        self._dirty = 0
+        self._lock = threading.Lock()       # guards _index / _meta
+        self._sync_lock = threading.Lock()  # one rebuild at a time
+        self._catch_up_lock = threading.Lock()  # one catch-up at a time (embeds outside _lock)
+        atexit.register(self.flush)
+
+    @property
+    def ready(self):
+        return self._index is not None
+
+    @property
+    def size(self):
+        return self._index.ntotal if self._index is not None else 0
+
+    def sync(self, embeddings, embedder, batch_size=512, blocking=True):
+        """
+        Loads or rebuilds the index for this embedder, then indexes any new tickets.
+        With blocking=False, returns immediately if another sync is already running.
+        Returns: rows added by catch-up
+        """
+        if not self._sync_lock.acquire(blocking=blocking): return 0
+        try:
+            if self.embedder != embedder or self._index is None:
+                self._load(embedder)
+            n = self.store.last_id()
+            if self._needs_rebuild(n, embedder):
+                print(f"Rebuilding ticket index over {n} tickets...")
+                index = self._rebuild(embeddings, n, batch_size)
+                meta = {"embedder": embedder, "index_type": self.config.effective_type(n),
+                        "indexed_upto": n, "trained_on": n}
+                with self._lock:
+                    self._index, self._meta, self.embedder = index, meta, embedder
+                    self._dirty += 1
+            added = self.catch_up(embeddings, batch_size)
+            self.flush()
+            return added
+        finally:
+            self._sync_lock.release()
+
+    def catch_up(self, embeddings, batch_size=512):
+        """
+        Embeds and adds tickets appended since the last call. The embedder runs outside
+        _lock, so searches only wait for the add itself.
+        Returns: rows added
+        """
+        added = 0
+        with self._catch_up_lock:
+            while True:
+                with self._lock:
+                    index, upto = self._index, self._meta.get("indexed_upto")
+                if index is None: return added
+                rows = self.store.texts_after(upto, batch_size)
+                if not rows: break
+                vectors = self._embed(embeddings, [t for _, t in rows])
+                with self._lock:
+                    if self._index is not index or self._meta["indexed_upto"] != upto:
+                        continue  # a rebuild was swapped in meanwhile: start from its high-water mark
+                    index.add_with_ids(vectors, np.asarray([i for i, _ in rows], dtype=np.int64))
+                    self._meta["indexed_upto"] = rows[-1][0]
+                    self._dirty += len(rows)
+                added += len(rows)
+        with self._lock:
+            should_save = self._dirty >= self.save_every
+        if should_save:
+            self.flush()
+        return added
+
+    def search(self, query_vec, k=3):
+        """Returns: [(ticket_id, similarity)] best first"""
+        q = np.asarray([query_vec], dtype=np.float32)
+        faiss.normalize_L2(q)
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0: return []
+            distances, labels = self._index.search(q, k)
+        return [(int(i), 1.0 - float(d) / 2) for d, i in zip(distances[0], labels[0]) if i != -1]
+
+    def needs_rebuild(self):
+        return self._needs_rebuild(self.store.last_id(), self.embedder)
+
+    def _needs_rebuild(self, n, embedder):
+        if n == 0: return False
+        if self._index is None or self._meta.get("embedder") != embedder: return True
+        if self._meta.get("index_type") != self.config.effective_type(n): return True
+        return self._meta["index_type"].startswith("ivf") and n > 4 * self._meta.get("trained_on", 0)
+
+    def _rebuild(self, embeddings, upto, batch_size):
+        ids, chunks, last = [], [], 0
+        while True:
+            rows = self.store.texts_after(last, batch_size, upto=upto)
+            if not rows: break
+            chunks.append(self._embed(embeddings, [t for _, t in rows]))
+            ids.extend(i for i, _ in rows)
+            last = rows[-1][0]
+        return build_index(np.vstack(chunks), self.config, ids)
+
+    @staticmethod
+    def _embed(embeddings, texts):
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _load(self, embedder):
+        meta_path = os.path.join(self.path, META_FILE)
+        index, meta = None, {}
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+            if meta.get("embedder") == embedder:
+                index = self.config.tune(faiss.read_index(os.path.join(self.path, INDEX_FILE)))
+        except (OSError, ValueError, RuntimeError):
+            index, meta = None, {}
+        if index is None:
+            # Nothing usable on disk: start empty and let catch-up index everything
+            meta = {"embedder": embedder, "index_type": None, "indexed_upto": 0, "trained_on": 0}
+        with self._lock:
+            self._index, self._meta, self.embedder = index, meta, embedder
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty or self._index is None: return
+            os.makedirs(self.path, exist_ok=True)
+            tmp = os.path.join(self.path, INDEX_FILE + ".tmp")
+            faiss.write_index(self._index, tmp)
+            os.replace(tmp, os.path.join(self.path, INDEX_FILE))
+            with open(os.path.join(self.path, META_FILE + ".tmp"), "w") as f:
+                json.dump(self._meta, f)
+            os.replace(os.path.join(self.path, META_FILE + ".tmp"), os.path.join(self.path, META_FILE))
+            self._dirty = 0
@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+FIELDS = ("username", "password", "name", "email", "department", "role", "created_at")
+
+
+class UserExistsError(ValueError):
+    pass
+
+
+class UserRepository:
+    """
+    User accounts in SQLite with unique (indexed) username and email.
+    Signups are a single INSERT, so concurrent registrations can't overwrite each
+    other and duplicates are rejected by the constraints. Lookups go through an
+    in-process cache that is dropped whenever the database changes, including
+    writes from other processes (PRAGMA data_version).
+    """
+
+    def __init__(self, path, legacy_json=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache = {}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS users ("
+            "username TEXT PRIMARY KEY, password TEXT NOT NULL, name TEXT, "
+            "email TEXT UNIQUE COLLATE NOCASE, department TEXT, role TEXT, created_at TEXT)"
+        )
+        self._db.commit()
+        if legacy_json:
+            self._import_json(legacy_json)
+        self._version = self._data_version()
+
+    def _import_json(self, path):
+        # One-time migration from the old whole-file users.json
+        if not os.path.exists(path) or self.count(): return
+        try:
+            with open(path, "r") as f:
+                users = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"User import from {path} failed: {e}")
+            return
+        self.add_many(users)
+        print(f"Imported {len(users)} users from {path}.")
+
+    def _data_version(self):
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _row_to_user(self, row):
+        return {k: v for k, v in zip(FIELDS, row) if v is not None}
+
+    def get(self, username):
+        """Returns: user dict or None"""
+        with self._lock:
+            version = self._data_version()
+            if version != self._version:
+                self._cache.clear()  # another connection/process wrote to the table
+                self._version = version
+            if username in self._cache:
+                return self._cache[username]
+            row = self._db.execute(f"SELECT {', '.join(FIELDS)} FROM users WHERE username = ?", (username,)).fetchone()
+            user = self._row_to_user(row) if row else None
+            if user:
+                self._cache[username] = user
+            return user
+
+    def get_by_email(self, email):
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(FIELDS)} FROM users WHERE email = ?", (email,)).fetchone()
+        return self._row_to_user(row) if row else None
+
+    def add(self, user):
+        """Inserts one user atomically. Raises: UserExistsError naming the duplicate field"""
+        user = dict(user)
+        user.setdefault("created_at", time.strftime("%Y-%m-%d %H:%M:%S"))
+        with self._lock:
+            try:
+                self._db.execute(
+                    f"INSERT INTO users ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                    [user.get(k) for k in FIELDS]
+                )
+                self._db.commit()
+            except sqlite3.IntegrityError as e:
+                self._db.rollback()  # release the write lock held by the failed INSERT
+                raise UserExistsError("email" if "email" in str(e) else "username") from e
+            self._invalidate(user["username"])
+
+    def add_many(self, users):
+        """Bulk insert (migration/benchmarks); existing usernames are skipped."""
+        rows = [[u.get(k) for k in FIELDS] for u in users]
+        with self._lock:
+            self._db.executemany(
+                f"INSERT OR IGNORE INTO users ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})", rows
+            )
+            self._db.commit()
+            self._cache.clear()
+            self._version = self._data_version()
+
+    def update(self, username, **fields):
+        fields = {k: v for k, v in fields.items() if k in FIELDS and k != "username"}
+        if not fields: return
+        with self._lock:
+            self._db.execute(
+                f"UPDATE users SET {', '.join(f'{k} = ?' for k in fields)} WHERE username = ?",
+                list(fields.values()) + [username]
+            )
+            self._db.commit()
+            self._invalidate(username)
+
+    def _invalidate(self, username):
+        # Our own write bumps nothing in data_version, so drop the entry explicitly
+        self._cache.pop(username, None)
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM users").fetchone()[0]
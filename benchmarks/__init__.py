@@ -0,0 +1 @@
+# Offline benchmarks for the Knowledge Base Engine (run from the repo root)
@@ -0,0 +1,43 @@
+"""
+Compares KnowledgeBaseEngine.analyze_tickets against calling analyze_full_ticket in a loop.
+
+Usage: python -m benchmarks.bench_batch_analyze [--tickets 200]
+"""
+import argparse
+import time
+
+from benchmarks.stubs import SAMPLE_TICKETS, StubEmbeddings, make_engine
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=200)
+    args = parser.parse_args()
+
+    embeddings = StubEmbeddings()
+    engine = make_engine(embeddings)
+    tickets = [SAMPLE_TICKETS[i % len(SAMPLE_TICKETS)] + f" (#{i})" for i in range(args.tickets)]
+
+    embeddings.calls = 0
+    start = time.perf_counter()
+    loop_results = [engine.analyze_full_ticket(t) for t in tickets]
+    loop_time = time.perf_counter() - start
+    loop_calls = embeddings.calls
+
+    embeddings.calls = 0
+    start = time.perf_counter()
+    batch_results = engine.analyze_tickets(tickets)
+    batch_time = time.perf_counter() - start
+    batch_calls = embeddings.calls
+
+    assert [r[0] for r in loop_results] == [r[0] for r in batch_results], "category mismatch"
+    assert [r[1] for r in loop_results] == [r[1] for r in batch_results], "recommendation mismatch"
+
+    print(f"tickets:                 {len(tickets)}")
+    print(f"loop (single path):      {loop_time:.3f}s  {loop_calls} embedding calls")
+    print(f"batch (analyze_tickets): {batch_time:.3f}s  {batch_calls} embedding calls")
+    print(f"speedup:                 {loop_time / batch_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+scrypt cost calibration: time per verification for a range of N, and login
+throughput through the KDF thread pool.
+
+Usage: python -m benchmarks.bench_credentials [--logins 32]
+Pick SUPPORTAI_SCRYPT_N so one verification stays well under VERIFY_TIMEOUT
+on the deployment hardware (OWASP suggests N=2**17, r=8, p=1 where memory allows).
+"""
+import argparse
+import time
+
+from backend.credentials import SCRYPT_N, check_password_async, hash_password, verify_password
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=32)
+    args = parser.parse_args()
+
+    print(f"{'N':>8}{'hash ms':>10}{'verify ms':>11}{'memory MiB':>12}")
+    for log_n in range(12, 18):
+        n = 2 ** log_n
+        start = time.perf_counter()
+        stored = hash_password("correct horse", n=n)
+        hashed = time.perf_counter() - start
+        start = time.perf_counter()
+        verify_password("correct horse", stored)
+        verified = time.perf_counter() - start
+        print(f"{n:>8}{hashed * 1000:>10.1f}{verified * 1000:>11.1f}{128 * n * 8 / 2 ** 20:>12.0f}")
+
+    stored = hash_password("correct horse")
+    start = time.perf_counter()
+    futures = [check_password_async(f"guess {i}", stored) for i in range(args.logins)]
+    for f in futures:
+        f.result()
+    elapsed = time.perf_counter() - start
+    print(f"\npool (N={SCRYPT_N}): {args.logins} failed logins in {elapsed:.2f}s = {args.logins / elapsed:.1f} logins/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compares embedders: embed latency, vector size, index size on disk and retrieval quality.
+
+Usage: python -m benchmarks.bench_embedders [--embedders ollama minilm]
+Embedders whose backend is unavailable (Ollama not running, sentence-transformers
+not installed) are reported and skipped.
+"""
+import argparse
+import os
+import time
+
+from backend.embedders import EMBEDDERS
+from benchmarks.eval_retrieval import build_eval_engine, evaluate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embedders", nargs="+", default=list(EMBEDDERS))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3])
+    args = parser.parse_args()
+
+    header = f"{'embedder':<10}{'dim':>6}{'index KB':>10}{'build s':>9}{'query ms':>10}"
+    print(header + "".join(f"{'R@' + str(k):>7}" for k in args.k))
+    for name in args.embedders:
+        try:
+            start = time.perf_counter()
+            engine, pairs = build_eval_engine(name)
+            build = time.perf_counter() - start
+            if engine.vectorstore is None:
+                raise RuntimeError("index build failed")
+        except Exception as e:
+            print(f"{name:<10} unavailable: {e}")
+            continue
+
+        # Raw embedder latency (bypassing the memoization layer)
+        raw = engine.embeddings.underlying
+        questions = [q for q, _ in pairs]
+        start = time.perf_counter()
+        for q in questions:
+            raw.embed_query(q)
+        query_ms = (time.perf_counter() - start) / len(questions) * 1000
+
+        size_kb = os.path.getsize(os.path.join(engine.index_path, "index.faiss")) / 1024
+        recall, _ = evaluate(engine, pairs, args.k, mode="vector")
+        print(f"{name:<10}{engine.vectorstore.index.d:>6}{size_kb:>10.1f}{build:>9.2f}{query_ms:>10.2f}"
+              + "".join(f"{recall[k]:>7.2f}" for k in args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Content gap clustering at scale: synthetic ticket embeddings drawn around a few
+"missing article" topics plus noise, scored and clustered by backend.gaps.
+
+Usage: python -m benchmarks.bench_gaps [--queries 100000] [--dim 384] [--topics 12]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from backend.gaps import find_gaps, normalize_rows
+from benchmarks.stubs import SAMPLE_TICKETS
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=12)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centres = normalize_rows(rng.standard_normal((args.topics, args.dim)))
+    # Zipf-like topic volumes, so ranking by volume has something to rank
+    weights = 1.0 / np.arange(1, args.topics + 1)
+    topic = rng.choice(args.topics, args.queries, p=weights / weights.sum())
+    vectors = normalize_rows(centres[topic] + 0.05 * rng.standard_normal((args.queries, args.dim)))
+    coverage = rng.uniform(0.0, 1.0, args.queries).astype(np.float32)
+    texts = [f"{SAMPLE_TICKETS[t % len(SAMPLE_TICKETS)]} #{t}" for t in topic]
+
+    start = time.perf_counter()
+    gaps = find_gaps(texts, vectors, coverage, threshold=0.5)
+    elapsed = time.perf_counter() - start
+
+    poor = np.flatnonzero(coverage < 0.5)
+    print(f"queries:       {args.queries} ({len(poor)} under the coverage threshold)")
+    print(f"find_gaps:     {elapsed:.2f}s")
+    print(f"gaps found:    {len(gaps)} (true topics: {args.topics})")
+    for gap in gaps[:5]:
+        print(f"  {gap['count']:>6}  {gap['label']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Recall vs. latency for the FAISS index types (Flat, IVF-Flat, HNSW, IVF-PQ),
+sweeping nprobe / efSearch, plus on-disk size and memory-mapped load time.
+
+Uses synthetic clustered vectors, so no embedder is needed. IVF-PQ training dominates
+build time, especially on machines with few cores.
+Usage: python -m benchmarks.bench_index_types [--n 50000] [--dim 384] [--queries 300]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from backend.indexer import IndexConfig, build_index
+
+SWEEPS = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 64, 256)],
+    "ivf_pq": [{"nprobe": p} for p in (1, 4, 16, 64)],
+}
+
+
+def synthetic(n, dim, n_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(16, n // 500), dim)).astype(np.float32)
+    data = centers[rng.integers(len(centers), size=n)] + 0.3 * rng.normal(size=(n, dim)).astype(np.float32)
+    queries = data[rng.integers(n, size=n_queries)] + 0.1 * rng.normal(size=(n_queries, dim)).astype(np.float32)
+    return data.astype(np.float32), queries.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    data, queries = synthetic(args.n, args.dim, args.queries)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(data)
+    _, truth = exact.search(queries, args.k)
+    workdir = tempfile.mkdtemp()
+
+    print(f"n={args.n} dim={args.dim} queries={args.queries} recall@{args.k} vs exact search")
+    print(f"{'index':<10}{'params':<14}{'build s':>8}{'size MB':>9}{'mmap load ms':>14}{'ms/query':>10}{'recall':>8}")
+    for kind, sweep in SWEEPS.items():
+        start = time.perf_counter()
+        index = build_index(data, IndexConfig(kind))
+        build = time.perf_counter() - start
+        path = os.path.join(workdir, f"{kind}.faiss")
+        faiss.write_index(index, path)
+        size_mb = os.path.getsize(path) / 1e6
+
+        mmap_flag = faiss.IO_FLAG_MMAP if kind.startswith("ivf") else getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        start = time.perf_counter()
+        loaded = faiss.read_index(path, mmap_flag | faiss.IO_FLAG_READ_ONLY)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        for params in sweep:
+            IndexConfig(kind, **params).tune(loaded)
+            start = time.perf_counter()
+            for q in queries:
+                _, found = loaded.search(q[None, :], args.k)  # one query at a time, like the engine
+            per_query = (time.perf_counter() - start) / len(queries) * 1000
+            _, found = loaded.search(queries, args.k)
+            recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+            label = ",".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(f"{kind:<10}{label:<14}{build:>8.2f}{size_mb:>9.1f}{load_ms:>14.1f}{per_query:>10.3f}{recall:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
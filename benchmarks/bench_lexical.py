@@ -0,0 +1,67 @@
+"""
+Keyword fallback: BM25 inverted index vs. the previous per-call substring scan.
+
+Usage: python -m benchmarks.bench_lexical [--articles 50000] [--queries 200]
+"""
+import argparse
+import random
+import time
+
+from backend.lexical import BM25Index
+from benchmarks.stubs import SAMPLE_TICKETS
+
+VOCAB = ("account access adapter application backup battery browser cache calendar certificate "
+         "client cloud connection console credential database desktop device disk display docker "
+         "domain driver email encryption error firewall folder hardware install keyboard laptop "
+         "license login mailbox memory monitor mouse network outlook password permission phone "
+         "portal printer profile proxy router security server share software storage sync teams "
+         "timeout token update upgrade usb user vpn webcam wifi windows").split()
+
+
+def linear_scan(docs, text, limit=3):
+    # The pre-index fallback: every word tested against every lowercased doc
+    query_lower = text.lower()
+    matches = []
+    for d in docs:
+        if any(word in d['topic'].lower() or word in d['content'].lower() for word in query_lower.split()):
+            matches.append(f"{d['topic']}: {d['content']}")
+    return matches[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--articles", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    # Zipf-like vocabulary: a few very common IT terms plus a long tail of rare ones (error codes, hosts)
+    vocab = VOCAB + [f"term{i}" for i in range(20000)]
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    docs = [{"topic": " ".join(rng.sample(VOCAB, 2)).title(),
+             "content": " ".join(rng.choices(vocab, weights, k=40))} for _ in range(args.articles)]
+    queries = [SAMPLE_TICKETS[i % len(SAMPLE_TICKETS)] for i in range(args.queries)]
+
+    start = time.perf_counter()
+    index = BM25Index([f"{d['topic']}: {d['content']}" for d in docs])
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for q in queries:
+        index.search(q, k=3)
+    bm25 = (time.perf_counter() - start) / len(queries)
+
+    n_scan = min(len(queries), 20)
+    start = time.perf_counter()
+    for q in queries[:n_scan]:
+        linear_scan(docs, q)
+    scan = (time.perf_counter() - start) / n_scan
+
+    print(f"articles:          {len(docs)}")
+    print(f"BM25 build (once): {build:.2f}s")
+    print(f"BM25 search:       {bm25 * 1000:.3f} ms/query (ranked top-3)")
+    print(f"linear scan:       {scan * 1000:.3f} ms/query (file order)")
+
+
+if __name__ == "__main__":
+    main()
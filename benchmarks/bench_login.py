@@ -0,0 +1,66 @@
+"""
+Login lookup latency: whole-file users.json parse + linear scan vs. the SQLite
+UserRepository (cold = cache miss, warm = cached).
+
+Usage: python -m benchmarks.bench_login [--users 100000] [--logins 2000]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from backend.users import UserRepository
+
+
+def legacy_login(path, username, password):
+    # The previous path: parse every account, then a linear next(...) scan
+    with open(path, "r") as f:
+        users = json.load(f)
+    return next((u for u in users if u.get('username') == username and u.get('password') == password), None)
+
+
+def measure(fn, names):
+    samples = []
+    for name in names:
+        start = time.perf_counter()
+        fn(name)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--logins", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    users = [{"username": f"user{i}", "password": f"pw{i}", "name": f"User {i}",
+              "email": f"user{i}@company.com", "role": "User"} for i in range(args.users)]
+    json_path = os.path.join(workdir, "users.json")
+    with open(json_path, "w") as f:
+        json.dump(users, f, indent=4)
+    repo = UserRepository(os.path.join(workdir, "users.sqlite"))
+    repo.add_many(users)
+
+    rng = random.Random(0)
+    names = [f"user{rng.randrange(args.users)}" for _ in range(args.logins)]
+
+    legacy = measure(lambda n: legacy_login(json_path, n, "pw"), names[:max(1, args.logins // 100)])
+    cold = measure(lambda n: (repo._cache.clear(), repo.get(n)), names)
+    for n in names:
+        repo.get(n)
+    warm = measure(repo.get, names)
+
+    print(f"users: {args.users}")
+    print(f"{'':<22}{'p50 ms':>10}{'p99 ms':>10}")
+    for label, (p50, p99) in (("json + linear scan", legacy), ("sqlite (cache miss)", cold), ("sqlite (cached)", warm)):
+        print(f"{label:<22}{p50:>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
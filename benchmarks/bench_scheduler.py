@@ -0,0 +1,75 @@
+"""
+Concurrent single-ticket retrieval: the sync engine called from a thread pool (one
+embedding request per ticket) vs. the async API, whose scheduler merges the
+queries arriving within its window into one embed_documents call.
+
+The stub embedder serves one request at a time like a single Ollama runner, so
+per-call overhead queues up on the sync path. Unique ticket texts keep the
+embedding cache out of the measurement.
+
+Usage: python -m benchmarks.bench_scheduler [--tickets 400] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.cache import CachedEmbeddings
+from benchmarks.stubs import SAMPLE_TICKETS, StubEmbeddings, make_engine
+
+
+def summarize(samples, elapsed):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1], len(samples) / elapsed
+
+
+def run_sync(engine, tickets, concurrency):
+    def one(text):
+        start = time.perf_counter()
+        engine.recommend_articles(text)
+        return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, tickets))
+    return summarize(samples, time.perf_counter() - start)
+
+
+async def run_async(engine, tickets, concurrency):
+    gate = asyncio.Semaphore(concurrency)  # same number of in-flight requests as the thread pool
+
+    async def one(text):
+        async with gate:
+            start = time.perf_counter()
+            await engine.arecommend(text)
+            return (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    samples = await asyncio.gather(*(one(t) for t in tickets))
+    return summarize(samples, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tickets", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    stub = StubEmbeddings(call_latency=0.01, text_latency=0.0005, serial=True)
+    engine = make_engine(CachedEmbeddings(stub, namespace="stub"))
+    results = []
+    for label, run in (("sync (thread pool)", lambda t: run_sync(engine, t, args.concurrency)),
+                       ("async (micro-batched)", lambda t: asyncio.run(run_async(engine, t, args.concurrency)))):
+        tickets = [f"{SAMPLE_TICKETS[i % len(SAMPLE_TICKETS)]} ({label} #{i})" for i in range(args.tickets)]
+        stub.calls = 0
+        results.append((label, run(tickets), stub.calls))
+
+    print(f"tickets: {args.tickets}, concurrency {args.concurrency}")
+    print(f"{'':<24}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'embed calls':>13}")
+    for label, (p50, p99, rate), calls in results:
+        print(f"{label:<24}{p50:>10.1f}{p99:>10.1f}{rate:>10.1f}{calls:>13}")
+
+
+if __name__ == "__main__":
+    main()
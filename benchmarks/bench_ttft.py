@@ -0,0 +1,95 @@
+"""
+Time-to-first-token for solution generation against a local stub Ollama server
+(benchmarks.stubs.StubOllamaServer), before and after building the chain once,
+splitting the prompt into a static system prefix and setting keep_alive.
+
+Tickets arrive with idle gaps longer than the stub's default keep-alive, as in
+sparse helpdesk traffic, so an unpinned model is unloaded between requests.
+
+With --gap 0 the model never unloads and both variants reuse the same prefix, so
+the difference isolates chain construction (microseconds); with idle gaps it
+shows the reload + cold prefill that keep_alive avoids.
+
+Usage: python -m benchmarks.bench_ttft [--rounds 3] [--gap 0.4]
+"""
+import argparse
+import os
+import statistics
+import time
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_ollama import ChatOllama
+
+from benchmarks.stubs import SAMPLE_TICKETS, StubOllamaServer, make_engine
+
+# The previous per-call prompt: one human message rebuilt from the template every time
+LEGACY_PROMPT = (
+    "You are a helpful and professional IT Support Agent. "
+    "Using the Reference Info below, provide a detailed and comprehensive answer to the user's question. "
+    "Expand on the solution with standard professional troubleshooting steps if the reference is brief.\n"
+    "Do NOT include the phrase 'Reference Info' or internal IDs (like #123) in your final response.\n\n"
+    "Reference Info:\n{c}\n\n"
+    "Question: {t}"
+)
+
+
+_legacy_llm = {}
+
+
+def legacy_chain():
+    # Same client for every call (as the engine's lazy llm property), no keep_alive
+    host = os.environ["OLLAMA_HOST"]
+    if host not in _legacy_llm:
+        _legacy_llm[host] = ChatOllama(model="llama3.2:1b", num_predict=100, num_ctx=1024, temperature=0.1)
+    return ChatPromptTemplate.from_template(LEGACY_PROMPT) | _legacy_llm[host] | StrOutputParser()
+
+
+def run(make_chain, requests, gap):
+    server = StubOllamaServer()
+    os.environ["OLLAMA_HOST"] = server.start()
+    samples = []
+    try:
+        for text, best_doc in requests:
+            time.sleep(gap)
+            start = time.perf_counter()
+            stream = make_chain().stream({"t": text, "c": best_doc})
+            next(stream)
+            samples.append((time.perf_counter() - start) * 1000)
+            for _ in stream:
+                pass
+    finally:
+        server.stop()
+    samples.sort()
+    return {
+        "p50": statistics.median(samples),
+        "p95": samples[max(0, int(len(samples) * 0.95) - 1)],
+        "loads": server.loads,
+        "cached": server.cached_tokens / server.prompt_tokens if server.prompt_tokens else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--gap", type=float, default=0.4, help="idle seconds before each ticket")
+    args = parser.parse_args()
+
+    engine = make_engine()
+    requests = []
+    for text in SAMPLE_TICKETS * args.rounds:
+        _, _, best_doc = engine.retrieve_context(text)
+        requests.append((text, best_doc))
+
+    results = [("before (per-call chain)", run(legacy_chain, requests, args.gap))]
+    engine._llm = None  # rebuilt against the stub server's OLLAMA_HOST
+    results.append(("after (prebuilt + keep_alive)", run(engine.solution_chain, requests, args.gap)))
+
+    print(f"requests: {len(requests)}, idle gap {args.gap}s")
+    print(f"{'':<32}{'TTFT p50 ms':>12}{'p95 ms':>10}{'loads':>7}{'prefix reuse':>14}")
+    for label, r in results:
+        print(f"{label:<32}{r['p50']:>12.1f}{r['p95']:>10.1f}{r['loads']:>7}{r['cached']:>14.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Offline retrieval evaluation: recall@k and latency for vector, lexical and hybrid modes.
+
+The labeled set comes from data/knowledge.csv: every question is a query whose single
+relevant document is its own answer. Answers are indexed together with the
+knowledge_base.json articles, which act as distractors.
+
+Usage: python -m benchmarks.eval_retrieval [--embedder stub|ollama|minilm] [--k 1 3 5]
+  --embedder  "stub" (default) is an offline hashed bag-of-words embedder
+"""
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+from backend.embedders import EMBEDDERS
+from backend.indexer import article_text
+from backend.rag import KnowledgeBaseEngine
+from benchmarks.stubs import StubEmbeddings
+
+
+def load_labeled_set(csv_path=os.path.join("data", "knowledge.csv")):
+    pairs = []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            q, a = (row.get("question") or "").strip(), (row.get("answer") or "").strip()
+            if not q or not a or q == "question": continue  # blank lines / repeated header
+            pairs.append((q, {"topic": "FAQ", "content": a}))
+    return pairs
+
+
+def build_eval_engine(embedder="stub"):
+    """Indexes KB articles + knowledge.csv answers in a throwaway directory. Returns: (engine, pairs)"""
+    pairs = load_labeled_set()
+    with open(os.path.join("data", "knowledge_base.json"), "r") as f:
+        corpus = [{"topic": d["topic"], "content": d["content"]} for d in json.load(f)]
+    corpus += [doc for _, doc in pairs]
+
+    workdir = tempfile.mkdtemp()
+    engine = KnowledgeBaseEngine()
+    engine.kb_path = os.path.join(workdir, "kb.json")
+    engine.index_path = os.path.join(workdir, "faiss_index")
+    engine.tickets_path = os.path.join(workdir, "tickets.sqlite")
+    engine.ticket_index_path = os.path.join(workdir, "ticket_index")
+    engine.answer_cache_path = os.path.join(workdir, "answer_cache")
+    engine.embedding_cache_path = os.path.join(workdir, "embedding_cache.sqlite")
+    with open(engine.kb_path, "w") as f:
+        json.dump(corpus, f)
+    if embedder == "stub":
+        engine._embeddings = StubEmbeddings(call_latency=0, text_latency=0)
+    else:
+        engine.embedder_name = embedder
+    engine.ensure_kb_initialized()
+    return engine, pairs
+
+
+def evaluate(engine, pairs, ks, mode):
+    """Returns: ({k: recall@k}, mean seconds per query)"""
+    found = {k: 0 for k in ks}
+    elapsed = 0.0
+    for question, doc in pairs:
+        start = time.perf_counter()
+        hits = engine.hybrid_search(question, k=max(ks), mode=mode)
+        elapsed += time.perf_counter() - start
+        ranked = [text for text, _ in hits]
+        for k in ks:
+            found[k] += article_text(doc) in ranked[:k]
+    return {k: found[k] / len(pairs) for k in ks}, elapsed / len(pairs)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embedder", default="stub", choices=["stub"] + list(EMBEDDERS))
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    args = parser.parse_args()
+
+    engine, pairs = build_eval_engine(args.embedder)
+    print(f"queries: {len(pairs)}  corpus: {len(engine.docs)} docs  embedder: {args.embedder}")
+    print(f"{'mode':<8} " + "".join(f"{'recall@' + str(k):<11}" for k in args.k) + "latency")
+    for mode in ["vector", "lexical", "hybrid"]:
+        recall, latency = evaluate(engine, pairs, args.k, mode)
+        print(f"{mode:<8} " + "".join(f"{recall[k]:<11.2f}" for k in args.k) + f"{latency * 1000:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Load test for the HTTP service (backend/api.py).
+
+By default it starts the service in-process on a local port with stub embeddings and a
+stub chat model (see benchmarks/stubs.py), so no Ollama server is needed.
+Pass --url to target an already running service instead.
+
+Usage: python -m benchmarks.load_test [--endpoint /analyze] [--requests 500] [--concurrency 16]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks.stubs import SAMPLE_TICKETS, StubChatModel, StubEmbeddings
+
+
+def start_local_server(port):
+    import uvicorn
+    from backend.api import app
+    from backend.rag import kb_engine
+
+    kb_engine._embeddings = StubEmbeddings(call_latency=0.005, text_latency=0.0005)
+    kb_engine._llm = StubChatModel()
+    workdir = tempfile.mkdtemp()
+    kb_engine.index_path = os.path.join(workdir, "faiss_index")
+    kb_engine.tickets_path = os.path.join(workdir, "tickets.sqlite")
+    kb_engine.ticket_index_path = os.path.join(workdir, "ticket_index")
+    kb_engine.answer_cache_path = os.path.join(workdir, "answer_cache")
+    kb_engine.embedding_cache_path = os.path.join(workdir, "embedding_cache.sqlite")
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None, help="Base URL of a running service")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--endpoint", default="/analyze",
+                        choices=["/analyze", "/analyze/batch", "/categorize", "/recommend"])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = start_local_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+
+    def one_request(i):
+        text = SAMPLE_TICKETS[i % len(SAMPLE_TICKETS)]
+        body = {"texts": [text] * 8} if args.endpoint == "/analyze/batch" else {"text": text}
+        start = time.perf_counter()
+        resp = session.post(base_url + args.endpoint, json=body, timeout=60)
+        if resp.status_code == 503:
+            return None  # shed by the scheduler (queue full)
+        resp.raise_for_status()
+        return time.perf_counter() - start
+
+    # Warm-up request so connection setup isn't measured
+    one_request(0)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one_request, range(args.requests)))
+    elapsed = time.perf_counter() - start
+    latencies = [r for r in results if r is not None]
+
+    print(f"endpoint:     {args.endpoint}")
+    print(f"requests:     {args.requests} (concurrency {args.concurrency})")
+    print(f"p50 latency:  {percentile(latencies, 50) * 1000:.1f} ms")
+    print(f"p99 latency:  {percentile(latencies, 99) * 1000:.1f} ms")
+    print(f"mean latency: {statistics.mean(latencies) * 1000:.1f} ms")
+    print(f"throughput:   {len(latencies) / elapsed:.1f} req/s")
+    print(f"rejected:     {len(results) - len(latencies)} (503 queue full)")
+    if server:
+        from backend.rag import kb_engine
+        print(f"embed calls:  {kb_engine.scheduler.batches} micro-batches")
+
+    if server:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Local stand-ins for Ollama so benchmarks run without a model server.
+Latencies are simulated with sleeps so batching/caching effects are visible.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import SimpleChatModel
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+
+from backend.rag import KnowledgeBaseEngine
+
+
+class StubEmbeddings(Embeddings):
+    """
+    Deterministic hashed bag-of-words embedder with a fixed cost per request and per text.
+    serial=True handles one request at a time, like a single Ollama model runner.
+    """
+
+    def __init__(self, dim=256, call_latency=0.02, text_latency=0.002, serial=False):
+        self.dim = dim
+        self.call_latency = call_latency
+        self.text_latency = text_latency
+        self.calls = 0
+        self._runner = threading.Lock() if serial else None
+
+    def _vector(self, text):
+        vec = [0.0] * self.dim
+        for word in re.findall(r"\w+", text.lower()):
+            h = int(hashlib.md5(word.encode()).hexdigest(), 16)
+            vec[h % self.dim] += 1.0 if (h >> 8) & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self._runner:
+            with self._runner:
+                time.sleep(self.call_latency + self.text_latency * len(texts))
+        else:
+            time.sleep(self.call_latency + self.text_latency * len(texts))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class StubChatModel(SimpleChatModel):
+    """Chat model that 'generates' a canned answer with a first-token delay and a per-token delay."""
+
+    answer: str = ("Restart the client, verify your network connection and sign in again. "
+                   "If the problem persists, reinstall the profile and contact the Help Desk.")
+    first_token_latency: float = 0.05
+    token_latency: float = 0.005
+
+    @property
+    def _llm_type(self):
+        return "stub-chat-model"
+
+    def _tokens(self):
+        return [w + " " for w in self.answer.split()]
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_latency + self.token_latency * len(self._tokens()))
+        return self.answer
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.first_token_latency)
+        for token in self._tokens():
+            time.sleep(self.token_latency)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+class StubOllamaServer:
+    """
+    Minimal HTTP stand-in for Ollama's /api/chat (streaming NDJSON), modelling
+    the two costs that dominate time-to-first-token:
+      - model load when the model was unloaded because keep_alive expired
+        (requests without keep_alive get `default_keep_alive` seconds, a scaled
+        stand-in for Ollama's 5 minutes);
+      - prompt prefill per token, except for the prefix shared with the previous
+        prompt, whose KV cache is reused (one slot, like OLLAMA_NUM_PARALLEL=1).
+    """
+
+    def __init__(self, load_latency=0.5, prefill_latency=0.002, token_latency=0.005, default_keep_alive=0.3,
+                 answer=StubChatModel.model_fields["answer"].default):
+        self.load_latency = load_latency
+        self.prefill_latency = prefill_latency
+        self.token_latency = token_latency
+        self.default_keep_alive = default_keep_alive
+        self.answer = answer
+        self.loaded_until = 0.0
+        self.loads = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._previous = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @staticmethod
+    def _seconds(keep_alive):
+        if isinstance(keep_alive, (int, float)): return float(keep_alive)
+        units = {"s": 1, "m": 60, "h": 3600}
+        return float(keep_alive[:-1]) * units[keep_alive[-1]] if keep_alive[-1] in units else float(keep_alive)
+
+    def _prefill(self, request):
+        tokens = []
+        for m in request.get("messages", []):
+            tokens += [f"<{m.get('role')}>"] + m.get("content", "").split()
+        keep_alive = request.get("keep_alive")
+        with self._lock:
+            now = time.monotonic()
+            delay = 0.0
+            if now > self.loaded_until:
+                # Unloaded: reload weights, and the KV cache is gone with them
+                delay += self.load_latency
+                self.loads += 1
+                self._previous = []
+            shared = 0
+            for a, b in zip(tokens, self._previous):
+                if a != b: break
+                shared += 1
+            delay += (len(tokens) - shared) * self.prefill_latency
+            self._previous = tokens
+            self.prompt_tokens += len(tokens)
+            self.cached_tokens += shared
+            ttl = self.default_keep_alive if keep_alive is None else self._seconds(keep_alive)
+            self.loaded_until = now + delay + ttl
+        time.sleep(delay)
+        return len(tokens) - shared
+
+    def start(self, port=0):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                evaluated = stub._prefill(request)
+                model = request.get("model", "stub")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                words = [w + " " for w in stub.answer.split()]
+                chunks = words if request.get("stream", True) else ["".join(words)]
+                for word in chunks:
+                    time.sleep(stub.token_latency)
+                    self.wfile.write((json.dumps({"model": model, "created_at": "2024-01-01T00:00:00Z",
+                                                  "message": {"role": "assistant", "content": word},
+                                                  "done": False}) + "\n").encode())
+                    self.wfile.flush()
+                self.wfile.write((json.dumps({"model": model, "created_at": "2024-01-01T00:00:00Z",
+                                              "message": {"role": "assistant", "content": ""}, "done": True,
+                                              "done_reason": "stop", "prompt_eval_count": evaluated,
+                                              "eval_count": len(words)}) + "\n").encode())
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+
+def make_engine(embeddings=None, index_dir=None):
+    """Builds a KnowledgeBaseEngine over data/knowledge_base.json with a throwaway directory for its index and caches."""
+    engine = KnowledgeBaseEngine()
+    engine._embeddings = embeddings or StubEmbeddings()
+    index_dir = index_dir or tempfile.mkdtemp()
+    engine.index_path = os.path.join(index_dir, "faiss_index")
+    engine.tickets_path = os.path.join(index_dir, "tickets.sqlite")
+    engine.ticket_index_path = os.path.join(index_dir, "ticket_index")
+    # Stub answers and embeddings must never reach the real caches in data/
+    engine.answer_cache_path = os.path.join(index_dir, "answer_cache")
+    engine.embedding_cache_path = os.path.join(index_dir, "embedding_cache.sqlite")
+    engine.ensure_kb_initialized()
+    return engine
+
+
+SAMPLE_TICKETS = [
+    "I forgot my password and cannot log in",
+    "VPN won't connect from home",
+    "Outlook is not syncing my email",
+    "My laptop is very slow today",
+    "How do I install Slack?",
+    "Printer shows offline",
+    "Cannot connect to the office wifi",
+    "Need access to the billing system",
+]
@@ -1,22 +1,16 @@
 import streamlit as st
-import json
-import os
 import time
+from concurrent.futures import TimeoutError as FutureTimeout
+from backend.credentials import VERIFY_TIMEOUT, check_password_async, hash_password_async
+from backend.users import UserExistsError, UserRepository
 
-DATA_FILE = "data/users.json"
+DATA_FILE = "data/users.sqlite"
+LEGACY_DATA_FILE = "data/users.json"  # imported once into the SQLite store
 
-def load_users():
-    if not os.path.exists(DATA_FILE):
-        return []
-    with open(DATA_FILE, "r") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return []
-
-def save_users(users):
-    with open(DATA_FILE, "w") as f:
-        json.dump(users, f, indent=4)
+@st.cache_resource
+def get_users():
+    # One repository per process: indexed lookups, cached until the table changes
+    return UserRepository(DATA_FILE, legacy_json=LEGACY_DATA_FILE)
 
 def login_page():
     st.markdown("""
@@ -26,6 +20,10 @@ def login_page():
     </div>
     """, unsafe_allow_html=True)
 
+    if st.session_state.pop('registered', False):
+        st.success("Account created successfully!")
+        st.info("You can now sign in with your username and password.")
+
     # Login Form
     with st.container():
         col1, col2, col3 = st.columns([1, 2, 1])
@@ -61,18 +59,30 @@ def login_page():
                         return
 
                     with st.spinner("Signing you in..."):
-                        time.sleep(1)  # Simulate processing
-
-                        users = load_users()
-                        user = next((u for u in users if u.get('username') == username and u.get('password') == password), None)
+                        users = get_users()
+                        user = users.get(username)
+                        # scrypt runs in the bounded KDF pool while this script run waits (at most
+                        # VERIFY_TIMEOUT); unknown users cost the same as real ones
+                        try:
+                            matches, needs_rehash = check_password_async(
+                                password, user.get('password') if user else None
+                            ).result(timeout=VERIFY_TIMEOUT)
+                        except FutureTimeout:
+                            st.error("Sign-in is taking longer than usual. Please try again.")
+                            return
 
-                        if user:
+                        if matches:
+                            if needs_rehash:
+                                # Legacy plaintext or outdated cost parameters: upgrade in place
+                                try:
+                                    users.update(user['username'],
+                                                 password=hash_password_async(password).result(timeout=VERIFY_TIMEOUT))
+                                except FutureTimeout:
+                                    print(f"Password rehash for {user['username']} timed out; retrying at next login.")
                             st.session_state.logged_in = True
                             st.session_state.username = user['username']
                             st.session_state.name = user.get('name', username)
                             st.session_state.user_role = user.get('role', 'User')
-                            st.success(f"Welcome back, {st.session_state.name}!")
-                            time.sleep(1)
                             st.rerun()
                         else:
                             st.error("Invalid username or password. Please try again.")
@@ -205,24 +215,26 @@ def register_page():
                             st.error(error)
                         return
 
-                    with st.spinner("Creating your account..."):
-                        time.sleep(1.5)  # Simulate processing
-
-                        users = load_users()
-
-                        # Check for duplicates
-                        if any(u.get('username') == username for u in users):
-                            st.error("Username already exists. Please choose a different one.")
-                            return
+                    # Cheap indexed lookups first, so a taken name or email costs no scrypt hash
+                    users = get_users()
+                    if users.get(username):
+                        st.error("Username already exists. Please choose a different one.")
+                        return
+                    if users.get_by_email(email):
+                        st.error("Email address is already registered.")
+                        return
 
-                        if any(u.get('email') == email for u in users):
-                            st.error("Email address is already registered.")
+                    with st.spinner("Creating your account..."):
+                        try:
+                            password_hash = hash_password_async(password).result(timeout=VERIFY_TIMEOUT)
+                        except FutureTimeout:
+                            st.error("Account creation is taking longer than usual. Please try again.")
                             return
 
-                        # Create new user
+                        # Create new user (a concurrent duplicate is still rejected atomically by the store)
                         new_user = {
                             "username": username,
-                            "password": password,
+                            "password": password_hash,
                             "name": full_name,
                             "email": email,
                             "department": department,
@@ -230,12 +242,17 @@ def register_page():
                             "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
                         }
 
-                        users.append(new_user)
-                        save_users(users)
+                        try:
+                            users.add(new_user)
+                        except UserExistsError as e:
+                            if str(e) == "email":
+                                st.error("Email address is already registered.")
+                            else:
+                                st.error("Username already exists. Please choose a different one.")
+                            return
 
-                        st.success("Account created successfully!")
-                        st.info("You can now sign in with your username and password.")
-                        time.sleep(2)
+                        # Shown by login_page after the rerun (the form is cleared by it)
+                        st.session_state.registered = True
                         st.session_state.show_login = True
                         st.rerun()
 
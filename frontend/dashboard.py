@@ -1,7 +1,25 @@
 import streamlit as st
-from backend.rag import kb_engine
+import time
+from backend.metrics import metrics
+from backend.rag import GENERATION_MODES, kb_engine
+from backend.tickets import visible_owner
+
+HISTORY_PAGE_SIZE = 20
+# Pipeline order for the latency table; unknown stages are listed after these
+STAGE_ORDER = ["request", "retrieval", "embed", "vector_search", "lexical_search",
+               "generation", "llm_first_token", "llm", "llm_batch", "kb_init"]
+
+@st.cache_resource
+def get_engine():
+    # One engine per process shared by every session: warmed once, hot-reloaded on KB file changes
+    kb_engine.ensure_kb_initialized()
+    kb_engine.watch_kb()
+    kb_engine.start_llm_probe()  # loads the model in the background; extractive answers until ready
+    return kb_engine
 
 def dashboard_ui():
+    get_engine()
+
     # Header
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -78,55 +96,27 @@ def ticket_assistant():
             st.error("Please provide a ticket title")
             return
 
-        with st.spinner("🤖 AI is analyzing your ticket..."):
-            try:
-                txt = f"{title}\n{desc}" + (f"\n[File: {file.name}]" if file else "")
-
-                # Progress indicators
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-
-                status_text.text("Analyzing ticket...")
-                progress_bar.progress(40)
-                
-                # Optimized single-pass analysis
-                cat, recs, sol = kb_engine.analyze_full_ticket(txt)
-
-                status_text.text("Finalizing...")
-
-                progress_bar.progress(100)
-                status_text.empty()
-                progress_bar.empty()
-
-                # Save to History
-                if 'history' not in st.session_state:
-                    st.session_state.history = []
-                st.session_state.history.insert(0, {
-                    "title": title,
-                    "query": desc,
-                    "category": cat,
-                    "recs": recs,
-                    "solution": sol,
-                    "timestamp": st.session_state.get('current_time', 'Now'),
-                    "priority": priority
-                })
-
-                # Results Display
-                st.success("✅ Analysis Complete!")
-
-                # Results Cards
-                col1, col2 = st.columns(2)
-
-                with col1:
-                    st.markdown("#### 🎯 Classification")
-                    st.info(f"**Category:** {cat}")
-                    st.markdown(f"**Priority:** {priority}")
-
-                with col2:
-                    st.markdown("#### 💡 AI Solution")
-                    st.success(sol)
-
-                # Source Articles
+        try:
+            txt = f"{title}\n{desc}" + (f"\n[File: {file.name}]" if file else "")
+
+            # One time budget per ticket priority, shared by retrieval and generation
+            deadline = kb_engine.deadline_for(priority)
+
+            # Retrieval first so category and articles show before generation starts
+            with st.spinner("🤖 AI is analyzing your ticket..."):
+                cat, recs, best_doc = kb_engine.retrieve_context(txt, deadline)
+
+            # Results Cards
+            col1, col2 = st.columns(2)
+            recs_area = st.container()
+
+            with col1:
+                st.markdown("#### 🎯 Classification")
+                st.info(f"**Category:** {cat}")
+                st.markdown(f"**Priority:** {priority}")
+
+            # Source Articles
+            with recs_area:
                 with st.expander("📚 Recommended Knowledge Base Articles", expanded=True):
                     if recs:
                         for i, article in enumerate(recs, 1):
@@ -135,102 +125,191 @@ def ticket_assistant():
                     else:
                         st.info("No specific articles found. General support recommended.")
 
-                # Action Buttons
-                col_a, col_b, col_c = st.columns(3)
-                with col_a:
-                    if st.button("📤 Submit Ticket", use_container_width=True, type="primary"):
-                        st.success("Ticket submitted successfully!")
-                with col_b:
-                    if st.button("🔄 Re-analyze", use_container_width=True):
-                        st.rerun()
-                with col_c:
-                    if st.button("📋 Copy Solution", use_container_width=True):
-                        st.text_area("Copy this solution:", value=sol, height=100)
-
-            except Exception as e:
-                st.error(f"Analysis failed: {str(e)}")
-                st.info("Try rephrasing your ticket description or check your internet connection.")
+            # Stream the solution token by token
+            with col2:
+                st.markdown("#### 💡 AI Solution")
+                sol = st.write_stream(kb_engine.stream_solution(txt, best_doc, deadline))
+                report = deadline.finish()
+                if report["timed_out"]:
+                    st.warning(f"⏱️ The AI model exceeded the {report['budget_s']:.0f}s budget for {priority} tickets; "
+                               "the answer above is based on the best matching article.")
+                st.caption(" · ".join(f"{k[:-3].capitalize()}: {v / 1000:.2f}s" for k, v in report["timings"].items()))
+
+            # Save to History (persistent ticket store, also the resolved-ticket memory)
+            kb_engine.record_ticket(txt, cat, recs, sol, title=title, priority=priority,
+                                    owner=st.session_state.get('username', ''),
+                                    latency_ms=report["timings"]["total_ms"], best_doc=best_doc,
+                                    resolved=report["resolved"])
+
+            st.success("✅ Analysis Complete!")
+
+            # Action Buttons
+            col_a, col_b, col_c = st.columns(3)
+            with col_a:
+                if st.button("📤 Submit Ticket", use_container_width=True, type="primary"):
+                    st.success("Ticket submitted successfully!")
+            with col_b:
+                if st.button("🔄 Re-analyze", use_container_width=True):
+                    st.rerun()
+            with col_c:
+                if st.button("📋 Copy Solution", use_container_width=True):
+                    st.text_area("Copy this solution:", value=sol, height=100)
+
+        except Exception as e:
+            st.error(f"Analysis failed: {str(e)}")
+            st.info("Try rephrasing your ticket description or check your internet connection.")
 
 def knowledge_insights():
     st.markdown("### Knowledge Base Analytics")
 
-    # Metrics Row
+    # Metrics Row (this process since start, from backend.metrics)
+    snap = metrics.snapshot()
+    request = snap["stages"].get("request")
+    analyzed = request["count"] if request else 0
+    hits = metrics.count("cache_hits_total")
+    lookups = hits + metrics.count("cache_misses_total")
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        st.metric("Total Articles", "20", "+2")
+        st.metric("Total Articles", len(kb_engine.docs))
 
     with col2:
-        st.metric("Avg Resolution Time", "4m", "-8%")
+        st.metric("Median Analysis Time", f"{request['p50_ms'] / 1000:.1f}s" if request else "—",
+                  help=f"p95 {request['p95_ms'] / 1000:.1f}s, p99 {request['p99_ms'] / 1000:.1f}s" if request else None)
 
     with col3:
-        st.metric("Coverage Rate", "88%", "+2%")
+        coverage = 1 - metrics.count("fallbacks_total", reason="no_article") / analyzed if analyzed else None
+        st.metric("Coverage Rate", f"{coverage:.0%}" if coverage is not None else "—",
+                  help="Tickets that matched a knowledge base article")
 
     with col4:
-        st.metric("Active Users", "15", "+5")
+        st.metric("Answer Cache Hits", f"{hits / lookups:.0%}" if lookups else "—",
+                  help="Answers reused from the answer cache or a resolved ticket instead of the AI model")
+
+    # Where the time goes, per pipeline stage
+    st.markdown("#### Pipeline Latency")
+    if snap["stages"]:
+        rows = [{"Stage": stage, "Calls": row["count"], "p50 (ms)": row["p50_ms"], "p95 (ms)": row["p95_ms"],
+                 "p99 (ms)": row["p99_ms"]}
+                for stage in STAGE_ORDER + sorted(set(snap["stages"]) - set(STAGE_ORDER))
+                if (row := snap["stages"].get(stage))]
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+        events = {name: n for name, n in snap["counters"].items() if not name.startswith("cache_")}
+        if events:
+            st.caption(" · ".join(f"{name}: {n}" for name, n in events.items()))
+    else:
+        st.info("No tickets analyzed since the server started.")
 
     # Charts and Insights
     col1, col2 = st.columns(2)
 
+    # Ticket log rollups (backend.analytics): precomputed, so this doesn't scan the tickets
+    analytics = kb_engine.analytics
+    if analytics.backfilling:
+        st.caption("Aggregating earlier tickets; totals below are still catching up.")
+
     with col1:
         st.markdown("#### Ticket Categories")
-        # Mock data for categories
-        categories = ["Technical", "Access", "Hardware", "Software", "Network"]
-        counts = [12, 8, 5, 7, 3]
-        st.bar_chart(dict(zip(categories, counts)))
+        by_category = analytics.counts("category")
+        if by_category:
+            st.bar_chart({category or "Uncategorized": n for category, n in by_category.items()})
+        else:
+            st.info("No tickets logged yet.")
 
     with col2:
         st.markdown("#### Resolution Trends")
-        # Mock resolution data
-        months = ["Jan", "Feb", "Mar", "Apr", "May"]
-        resolved = [45, 52, 48, 61, 55]
-        st.line_chart(dict(zip(months, resolved)))
+        st.line_chart(analytics.daily(days=30))
+        st.caption(f"Tickets per day (UTC), last 30 days · {analytics.total()} total")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("#### Tickets by Priority")
+        by_priority = analytics.counts("priority")
+        if by_priority:
+            st.bar_chart({priority or "Unset": n for priority, n in by_priority.items()})
+
+    with col2:
+        st.markdown("#### Resolution Time")
+        latency = analytics.latency()
+        if latency["count"]:
+            st.bar_chart(latency["buckets"])
+            st.caption(f"p50 ≈ {latency['p50_ms'] / 1000:.1f}s · p95 ≈ {latency['p95_ms'] / 1000:.1f}s "
+                       f"over {latency['count']} timed tickets")
 
     # Content Gaps
     st.markdown("#### Content Gap Analysis")
+    # Batch job over recent tickets (KnowledgeBaseEngine.detect_gaps); the tab only reads its last result
+    if kb_engine.gaps_updated is None and not kb_engine.gaps_running:
+        kb_engine.refresh_gaps()
     with st.expander("Identified Gaps", expanded=True):
-        gaps = [
-            "Docker container timeout issues",
-            "VPN error 404 troubleshooting",
-            "Remote desktop connection problems",
-            "Email encryption setup"
-        ]
-        for gap in gaps:
+        if kb_engine.gaps_running:
+            st.caption("Analyzing recent tickets for gaps...")
+        elif kb_engine.gaps_updated:
+            st.caption(f"Last analyzed {time.strftime('%Y-%m-%d %H:%M', time.localtime(kb_engine.gaps_updated))}")
+        if st.button("🔄 Re-run Gap Analysis", disabled=kb_engine.gaps_running):
+            kb_engine.refresh_gaps()
+            st.rerun()
+        if not kb_engine.gaps and not kb_engine.gaps_running:
+            st.info("No content gaps: recent tickets are covered by the knowledge base.")
+        for i, gap in enumerate(kb_engine.gaps):
             col_a, col_b = st.columns([3, 1])
             with col_a:
-                st.write(f"• {gap}")
+                st.write(f"• **{gap['label']}** — {gap['count']} tickets ({gap['share']:.0%}), "
+                         f"best-article relevance {gap['coverage']:.2f}")
+                for example in gap["examples"]:
+                    st.caption(f"↳ {example.splitlines()[0][:120]}")
             with col_b:
-                if st.button("Create", key=f"create_{gap}", use_container_width=True):
-                    st.success(f"Draft created for: {gap}")
+                if st.button("Create", key=f"create_gap_{i}", use_container_width=True):
+                    st.success(f"Draft created for: {gap['label']}")
 
 def ticket_history():
     st.markdown("### Ticket History")
-
-    if 'history' not in st.session_state or not st.session_state.history:
-        st.info("No tickets analyzed yet. Create your first ticket to see history here.")
-        return
+    owner = visible_owner(st.session_state.get('username', ''), st.session_state.get('user_role', 'User'))
 
     # Search and Filter
-    col1, col2 = st.columns([2, 1])
+    col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
         search = st.text_input("Search tickets...", placeholder="Enter keywords")
     with col2:
-        filter_cat = st.selectbox("Filter by category", ["All"] + list(set(h['category'] for h in st.session_state.history)))
+        # Categories are KB topics, so the options need no scan over the history
+        categories = sorted({d['topic'] for d in kb_engine.docs}) + ["General Support"]
+        filter_cat = st.selectbox("Filter by category", ["All"] + categories)
+    with col3:
+        filter_pri = st.selectbox("Filter by priority", ["All", "Low", "Medium", "High", "Urgent"])
+
+    # Cursor stack (one per page visited), reset whenever the filters change
+    filters = (search, filter_cat, filter_pri, owner)
+    if st.session_state.get('history_filters') != filters:
+        st.session_state.history_filters = filters
+        st.session_state.history_cursors = [None]
+    cursors = st.session_state.history_cursors
+
+    tickets, next_cursor = kb_engine.tickets.page(
+        owner=owner,
+        category=None if filter_cat == "All" else filter_cat,
+        priority=None if filter_pri == "All" else filter_pri,
+        search=search,
+        before=cursors[-1],
+        limit=HISTORY_PAGE_SIZE
+    )
+    if not tickets and len(cursors) == 1:
+        if search or filter_cat != "All" or filter_pri != "All":
+            st.info("No tickets match these filters.")
+        else:
+            st.info("No tickets analyzed yet. Create your first ticket to see history here.")
+        return
 
     # Display History
-    for i, ticket in enumerate(st.session_state.history):
-        if search and search.lower() not in ticket['query'].lower() and search.lower() not in ticket['title'].lower():
-            continue
-        if filter_cat != "All" and ticket['category'] != filter_cat:
-            continue
-
-        with st.expander(f"#{len(st.session_state.history)-i} - {ticket['title'][:50]}...", expanded=False):
+    for ticket in tickets:
+        with st.expander(f"#{ticket['id']} - {(ticket['title'] or '')[:50]}...", expanded=False):
             col1, col2 = st.columns([2, 1])
 
             with col1:
-                st.markdown(f"**Description:** {ticket['query']}")
+                st.markdown(f"**Description:** {ticket['text']}")
                 st.markdown(f"**Category:** {ticket['category']}")
-                st.markdown(f"**Priority:** {ticket.get('priority', 'Medium')}")
+                st.markdown(f"**Priority:** {ticket.get('priority') or 'Medium'}")
+                st.caption(f"{ticket['owner'] or 'unknown'} • {time.strftime('%Y-%m-%d %H:%M', time.localtime(ticket['created']))}")
 
             with col2:
                 st.markdown(f"**Solution:**")
@@ -241,6 +320,19 @@ def ticket_history():
                 for rec in ticket['recs'][:2]:  # Show first 2
                     st.write(f"• {rec[:100]}...")
 
+    # Pagination
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if len(cursors) > 1 and st.button("⬅️ Previous", use_container_width=True):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.markdown(f"<div style='text-align: center;'>Page {len(cursors)}</div>", unsafe_allow_html=True)
+    with col_next:
+        if next_cursor is not None and st.button("Next ➡️", use_container_width=True):
+            cursors.append(next_cursor)
+            st.rerun()
+
 def settings():
     st.markdown("### Application Settings")
 
@@ -261,6 +353,14 @@ def settings():
         theme = st.selectbox("Theme", ["Light", "Dark", "Auto"])
         language = st.selectbox("Language", ["English", "Spanish", "French"])
         auto_save = st.checkbox("Auto-save drafts", value=True)
+        if st.session_state.get('user_role') == "Administrator":
+            # Engine-wide setting: applies to every session in this process
+            modes = list(GENERATION_MODES)
+            mode = st.selectbox("Answer Generation", modes, index=modes.index(kb_engine.generation_mode),
+                                help="off: top article, extractive: key article sentences, llm: AI model, "
+                                     "llm_with_fallback: AI model with an extractive answer if it is slow or down")
+            if mode != kb_engine.generation_mode:
+                kb_engine.set_generation_mode(mode)
 
     # System Info
     st.markdown("#### System Information")
@@ -268,6 +368,12 @@ def settings():
         kb_engine.ensure_kb_initialized()  # Ensure KB is loaded
         st.write(f"**Version:** 1.2.0")
         st.write(f"**Knowledge Base:** {len(kb_engine.docs)} articles")
+        if hasattr(kb_engine.embeddings, "stats"):
+            emb = kb_engine.embeddings.stats()
+            st.write(f"**Embedding Cache:** {emb['size']} entries, {emb['hit_ratio']:.0%} hit ratio")
+        st.write(f"**AI Model:** {kb_engine.llm_status} ({kb_engine.generation_mode.replace('_', ' ')})")
+        ans = kb_engine.answer_cache.stats()
+        st.write(f"**Answer Cache:** {ans['entries']} entries, {ans['hit_ratio']:.0%} hit ratio")
         st.write(f"**Last Updated:** {st.session_state.get('current_time', 'Recently')}")
 
     # Actions
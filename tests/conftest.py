@@ -0,0 +1,25 @@
+import pytest
+
+from benchmarks.stubs import StubChatModel, StubEmbeddings, make_engine
+
+
+@pytest.fixture
+def embeddings():
+    return StubEmbeddings(dim=64, call_latency=0, text_latency=0)
+
+
+@pytest.fixture
+def engine(tmp_path, embeddings):
+    """Engine over data/knowledge_base.json with its index, tickets and caches under tmp_path and an instant stub LLM."""
+    engine = make_engine(embeddings, index_dir=str(tmp_path))
+    engine._llm = StubChatModel(first_token_latency=0, token_latency=0)
+    engine.llm_status = "ready"
+    engine.sync_tickets(background=False)
+    return engine
+
+
+@pytest.fixture
+def slow_llm(engine):
+    """Swaps in a stub LLM that streams one token every 50ms (about 1.2s per answer)."""
+    engine._llm = StubChatModel(first_token_latency=0.05, token_latency=0.05)
+    return engine._llm
@@ -0,0 +1,61 @@
+import asyncio
+
+import numpy as np
+
+from backend import cache
+from backend.cache import SemanticAnswerCache
+
+
+def _vec(seed, dim=16):
+    return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+
+
+def test_hit_needs_a_similar_query_and_the_same_article():
+    answers = SemanticAnswerCache(threshold=0.92)
+    query = _vec(0)
+    answers.put(query, "VPN: reconnect", "Restart the VPN client.")
+
+    near = query + 0.01 * _vec(1)
+    assert answers.get(near, "VPN: reconnect") == "Restart the VPN client."
+    assert answers.get(near, "Email: sync") is None  # same query, different article
+    assert answers.get(_vec(2), "VPN: reconnect") is None  # unrelated query
+    assert answers.stats()["hits"] == 1 and answers.stats()["misses"] == 2
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    answers = SemanticAnswerCache(ttl=60)
+    answers.put(_vec(0), "doc", "answer")
+
+    now[0] += 59
+    assert answers.get(_vec(0), "doc") == "answer"
+    now[0] += 2
+    assert answers.get(_vec(0), "doc") is None
+    assert answers.stats()["entries"] == 0
+
+
+def test_lru_eviction_and_persistence(tmp_path):
+    path = str(tmp_path / "answers")
+    answers = SemanticAnswerCache(path, max_entries=2)
+    for i in range(3):
+        answers.put(_vec(i), "doc", f"answer {i}")
+    assert answers.get(_vec(0), "doc") is None  # least recently used, evicted
+    answers.save()
+
+    reloaded = SemanticAnswerCache(path, max_entries=2)
+    assert reloaded.get(_vec(2), "doc") == "answer 2"
+    assert reloaded.get(_vec(1), "doc") == "answer 1"
+
+
+def test_async_stream_reads_and_fills_the_cache(engine):
+    text = "VPN won't connect from home"
+
+    async def stream():
+        _, _, best_doc, query_vec = await engine.aretrieve_context(text)
+        return "".join([t async for t in engine.astream_solution(text, best_doc, query_vec=query_vec)])
+
+    answers = [asyncio.run(stream()) for _ in range(3)]
+    assert answers[0] == answers[1] == answers[2] and answers[0].strip() == engine.llm.answer
+    assert engine.answer_cache.stats()["entries"] == 1
+    assert engine.answer_cache.stats()["hits"] == 2
@@ -0,0 +1,40 @@
+import pytest
+
+from backend.chunking import chunk_text
+
+
+def test_short_and_empty_text():
+    assert chunk_text("  Reboot the router.  ", size=100) == ["Reboot the router."]
+    assert chunk_text("   ", size=100) == []
+    assert chunk_text("x" * 100, size=100) == ["x" * 100]
+
+
+def test_chunks_break_at_sentences_and_overlap():
+    text = " ".join(f"Step {i} restarts service number {i}." for i in range(40))
+    chunks = chunk_text(text, size=200, overlap=50)
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    assert all(c.endswith(".") for c in chunks[:-1])  # cut after a sentence end
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split()[0] in previous  # the next chunk starts inside the previous one
+    assert chunks[-1].endswith("Step 39 restarts service number 39.")
+
+
+def test_long_sentence_breaks_at_whitespace():
+    text = " ".join(f"word{i}" for i in range(200))
+    chunks = chunk_text(text, size=120, overlap=20)
+    words = set(text.split())
+    assert all(len(c) <= 120 for c in chunks)
+    assert all(set(c.split()) <= words for c in chunks)  # no word split in two
+    assert set(" ".join(chunks).split()) == words
+
+
+def test_unbreakable_text_still_terminates():
+    chunks = chunk_text("x" * 1000, size=300, overlap=50)
+    assert all(len(c) <= 300 for c in chunks)
+    assert "".join(chunks).count("x") >= 1000
+
+
+def test_overlap_must_be_smaller_than_size():
+    with pytest.raises(ValueError):
+        chunk_text("a " * 200, size=100, overlap=100)
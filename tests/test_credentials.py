@@ -0,0 +1,58 @@
+import time
+
+import pytest
+
+from backend import credentials
+from backend.credentials import VerificationCache, check_password, hash_password, verify_password
+
+FAST = {"n": 2 ** 10, "r": 8, "p": 1}  # cheap cost for tests; production reads SUPPORTAI_SCRYPT_*
+
+
+@pytest.fixture(autouse=True)
+def fast_scrypt(monkeypatch):
+    monkeypatch.setattr(credentials, "SCRYPT_N", FAST["n"])
+    monkeypatch.setattr(credentials, "verification_cache", VerificationCache())
+
+
+def test_hash_is_salted_and_verifies():
+    stored = hash_password("s3cret")
+    assert stored.startswith(f"scrypt${FAST['n']}$8$1$")
+    assert stored != hash_password("s3cret")
+    assert verify_password("s3cret", stored) == (True, False)
+    assert verify_password("S3cret", stored) == (False, False)
+
+
+def test_legacy_and_outdated_records_need_rehash():
+    assert verify_password("plain", "plain") == (True, True)
+    assert verify_password("wrong", "plain") == (False, True)
+    assert verify_password("s3cret", hash_password("s3cret", n=2 ** 11)) == (True, True)
+
+
+def test_malformed_or_missing_records_never_match():
+    assert verify_password("x", None) == (False, False)
+    assert verify_password("x", "scrypt$not$a$valid$record") == (False, False)
+    assert check_password("x", None) == (False, False)  # unknown user
+
+
+def test_legacy_login_migrates_to_scrypt():
+    matches, needs_rehash = check_password("plain", "plain")
+    assert matches and needs_rehash
+    upgraded = credentials.hash_password_async("plain").result(timeout=5)
+    assert credentials.check_password_async("plain", upgraded).result(timeout=5) == (True, False)
+
+
+def test_verification_cache_skips_repeat_kdf_runs(monkeypatch):
+    stored = hash_password("s3cret")
+    assert check_password("s3cret", stored) == (True, False)
+    monkeypatch.setattr(credentials, "verify_password", lambda *a: pytest.fail("scrypt ran again"))
+    assert check_password("s3cret", stored) == (True, False)
+
+
+def test_verification_cache_expires():
+    cache = VerificationCache(ttl=0.05)
+    cache.add("pw", "stored")
+    assert cache.hit("pw", "stored") and not cache.hit("other", "stored")
+    assert not cache.hit("pw", "rehashed")  # a new stored hash invalidates the entry
+    time.sleep(0.06)
+    assert not cache.hit("pw", "stored")
+    assert not VerificationCache(ttl=0).hit("pw", "stored")
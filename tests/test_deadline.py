@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+from backend.deadline import Deadline
+from backend.rag import TRUNCATED_NOTE, extractive_answer
+from benchmarks.stubs import StubChatModel
+
+TICKET = "VPN won't connect from home"
+PRODUCED = []  # tokens CountingChatModel has streamed, across threads
+
+
+class CountingChatModel(StubChatModel):
+    def _call(self, *args, **kwargs):
+        answer = super()._call(*args, **kwargs)
+        PRODUCED.extend(self._tokens())
+        return answer
+
+    def _stream(self, *args, **kwargs):
+        for chunk in super()._stream(*args, **kwargs):
+            PRODUCED.append(chunk)
+            yield chunk
+
+
+def test_budget_accounting():
+    assert Deadline().remaining() is None and not Deadline().expired()
+    deadline = Deadline(10)
+    assert 9 < deadline.remaining() <= 10
+    assert deadline.remaining(share=0.25) == 2.5
+    assert Deadline(0).expired()
+    assert Deadline.for_priority("Urgent").seconds == 8.0
+    assert Deadline.for_priority("Unknown").seconds is None
+
+
+def test_sync_analysis_falls_back_at_the_deadline(engine, slow_llm):
+    start = time.monotonic()
+    result = engine.analyze_ticket(TICKET, deadline=Deadline(0.3))
+    assert time.monotonic() - start < 1.0  # the answer takes ~1.2s
+    assert result["timed_out"] and not result["resolved"]
+    assert result["solution"] == extractive_answer(TICKET, result["best_doc"])
+
+
+def test_stream_stops_the_model_at_the_deadline(engine):
+    engine._llm = CountingChatModel(first_token_latency=0, token_latency=0.05)
+    _, _, best_doc = engine.retrieve_context(TICKET)
+    deadline = Deadline(0.3)
+    PRODUCED.clear()
+    tokens = list(engine.stream_solution(TICKET, best_doc, deadline))
+    assert tokens[-1] == TRUNCATED_NOTE
+    assert deadline.timed_out and not deadline.report()["resolved"]
+
+    time.sleep(0.2)
+    produced = len(PRODUCED)
+    time.sleep(0.3)
+    assert len(PRODUCED) == produced < len(StubChatModel().answer.split())  # the producer was cancelled
+
+
+def test_stream_without_tokens_answers_from_the_article(engine):
+    engine._llm = StubChatModel(first_token_latency=1.0)
+    _, _, best_doc = engine.retrieve_context(TICKET)
+    deadline = Deadline(0.2)
+    assert list(engine.stream_solution(TICKET, best_doc, deadline)) == [extractive_answer(TICKET, best_doc)]
+    assert deadline.timed_out
+
+
+def test_async_paths_cancel_at_the_deadline(engine, slow_llm):
+    async def run():
+        start = time.monotonic()
+        result = await engine.aanalyze(TICKET, deadline=Deadline(0.3))
+        elapsed = time.monotonic() - start
+
+        _, _, best_doc, _ = await engine.aretrieve_context(TICKET)
+        deadline = Deadline(0.3)
+        tokens = [t async for t in engine.astream_solution(TICKET, best_doc, deadline)]
+
+        batch = await engine.aanalyze_tickets([TICKET, "Printer shows offline"], 8, Deadline(0.3))
+        return result, elapsed, tokens, deadline, batch
+
+    result, elapsed, tokens, deadline, batch = asyncio.run(run())
+    assert elapsed < 1.0
+    assert result["timed_out"] and not result["resolved"]
+    assert tokens[-1] == TRUNCATED_NOTE and deadline.timed_out
+    assert [(r["resolved"], r["timed_out"]) for r in batch] == [(False, True), (False, True)]
+
+
+
+def test_sync_batch_stops_the_model_at_the_deadline(engine):
+    engine._llm = CountingChatModel(first_token_latency=0, token_latency=0.05)
+    texts = [TICKET, "Printer shows offline", "Outlook is not syncing my email", "My laptop is very slow today"]
+    PRODUCED.clear()
+    start = time.monotonic()
+    results = engine.analyze_ticket_batch(texts, max_concurrency=4, deadline=Deadline(0.3))
+    assert time.monotonic() - start < 0.6
+    assert all(r["timed_out"] and not r["resolved"] for r in results)
+
+    time.sleep(0.1)
+    produced = len(PRODUCED)
+    time.sleep(1.3)  # long enough for an uncancelled answer to finish
+    assert len(PRODUCED) == produced  # every in-flight generation was cancelled
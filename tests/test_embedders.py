@@ -0,0 +1,43 @@
+import pytest
+
+from backend import rag
+from benchmarks.stubs import StubEmbeddings
+
+TICKET = "VPN won't connect from home"
+
+
+@pytest.fixture
+def other_embedder(monkeypatch):
+    """Registers "stub32": a 32-dim embedder (the engine fixture's is 64-dim) that takes 0.3s per call."""
+    real = rag.make_embedder
+
+    def make_embedder(name=None):
+        if name == "stub32":
+            return "stub-32", StubEmbeddings(dim=32, call_latency=0.3, text_latency=0)
+        return real(name)
+
+    monkeypatch.setattr(rag, "make_embedder", make_embedder)
+
+
+def test_switching_embedders_keeps_serving_the_old_index(engine, other_embedder, capsys):
+    topics = {doc["topic"] for doc in engine.docs}
+    reindex = engine.set_embedder("stub32")
+    old_index_served = 0
+    while reindex.is_alive():  # the re-index embeds the whole KB with the new, slower model
+        old_index_served += engine.vectorstore.index.d == 64
+        category, recs, solution = engine.analyze_full_ticket(TICKET)
+        assert category in topics and recs and not solution.startswith("Analysis failed")
+        assert engine.categorize_ticket(TICKET) in topics
+    reindex.join()
+    assert old_index_served
+    assert "failed" not in capsys.readouterr().out
+
+    assert (engine.embedder_name, engine.embedder_id) == ("stub32", "stub-32")
+    assert engine.vectorstore.index.d == 32
+    assert engine.analyze_full_ticket(TICKET)[0] in topics
+
+
+def test_unknown_embedder_is_rejected_up_front(engine):
+    with pytest.raises(ValueError):
+        engine.set_embedder("nonexistent")
+    assert engine.vectorstore.index.d == 64
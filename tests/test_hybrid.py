@@ -0,0 +1,24 @@
+from backend.rag import reciprocal_rank_fusion
+
+
+def test_rrf_uses_ranks_not_scores():
+    vector = [("a", 0.99), ("b", 0.98), ("c", 0.10)]
+    lexical = [("c", 40.0), ("b", 12.0)]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+    assert [key for key, _ in fused] == ["c", "b", "a"]  # found by both beats top of one
+    assert fused[0][1] == 1 / 63 + 1 / 61
+    assert fused[-1][1] == 1 / 61
+
+
+def test_hybrid_search_recovers_exact_terms(engine):
+    # The hashed stub embedder matches words loosely; BM25 pins the exact product name
+    query = "Cisco AnyConnect keeps dropping"
+    assert engine.hybrid_search(query, k=1, mode="lexical")[0][0].startswith("VPN Issues")
+    assert engine.hybrid_search(query, k=1)[0][0].startswith("VPN Issues")
+    assert len(engine.hybrid_search(query, k=3, mode="vector")) == 3
+
+
+def test_keyword_fallback_without_a_vector_store(engine):
+    engine.vectorstore = None
+    hits = engine.hybrid_search("printer offline", k=2)
+    assert hits and hits[0][0].startswith("Printer Issues")
@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+import time
+
+import faiss
+
+from backend.indexer import INDEX_FILE, IndexConfig, article_id, index_lock, load_manifest, sync_index
+from backend.rag import KnowledgeBaseEngine
+from benchmarks.stubs import make_engine
+
+
+def _docs(n, sentences=1):
+    return [{"topic": f"Topic {i}", "content": " ".join(f"Step {j} for topic {i} is documented here." for j in range(sentences))}
+            for i in range(n)]
+
+
+def test_sync_index_embeds_only_added_and_changed_articles(tmp_path, embeddings):
+    path = str(tmp_path / "index")
+    docs = _docs(3)
+    store, report = sync_index(path, docs, embeddings, embedder="stub")
+    assert report["rebuilt"] and report["added"] == 3
+    assert store.index.ntotal == 3
+
+    embeddings.calls = 0
+    store, report = sync_index(path, docs, embeddings, embedder="stub")
+    assert report == {"added": 0, "changed": 0, "removed": 0, "unchanged": 3, "rebuilt": False}
+    assert embeddings.calls == 0
+
+    changed = dict(docs[0], content="Reinstall the client, then sign in again.")
+    store, report = sync_index(path, [changed, docs[2], {"topic": "Topic 9", "content": "A new article."}],
+                               embeddings, embedder="stub")
+    assert report == {"added": 1, "changed": 1, "removed": 1, "unchanged": 1, "rebuilt": False}
+    assert embeddings.calls == 1  # the two new texts in one call
+    assert store.index.ntotal == 3
+    assert set(load_manifest(path)["articles"]) == {article_id(changed), article_id(docs[2]), article_id(
+        {"topic": "Topic 9", "content": "A new article."})}
+    hit = store.similarity_search("Topic 0: Reinstall the client, then sign in again.", k=1)[0]
+    assert hit.metadata["parent_id"] == article_id(changed)
+
+
+def test_embedder_change_rebuilds(tmp_path, embeddings):
+    path = str(tmp_path / "index")
+    sync_index(path, _docs(3), embeddings, embedder="stub")
+    _, report = sync_index(path, _docs(3), embeddings, embedder="other")
+    assert report["rebuilt"] and report["added"] == 3
+
+
+def test_index_type_is_sized_by_chunks_not_articles(tmp_path, embeddings):
+    # 70 articles are too few for IVF (39 training points per list, 2 lists), but 140+ chunks are not
+    config = IndexConfig(index_type="ivf_flat", chunk_size=200, chunk_overlap=20)
+    docs = _docs(70, sentences=8)
+    path = str(tmp_path / "chunked")
+    store, _ = sync_index(path, docs, embeddings, embedder="stub", config=config)
+    assert store.index.ntotal >= 140
+    assert load_manifest(path)["index_type"] == "ivf_flat"
+    assert isinstance(faiss.read_index(os.path.join(path, INDEX_FILE)), faiss.IndexIVFFlat)
+
+    _, report = sync_index(path, docs, embeddings, embedder="stub", config=config)
+    assert not report["rebuilt"]  # the recorded type matches what gets built
+
+    path = str(tmp_path / "whole")
+    store, _ = sync_index(path, _docs(70), embeddings, embedder="stub", config=config)
+    assert store.index.ntotal == 70
+    assert load_manifest(path)["index_type"] == "flat"
+
+
+def _in_thread(fn):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=fn()), daemon=True)
+    thread.start()
+    return thread, result
+
+
+def test_only_writes_wait_for_the_index_lock(tmp_path, embeddings):
+    path = str(tmp_path / "index")
+    docs = _docs(3)
+    sync_index(path, docs, embeddings, embedder="stub")
+    changed = docs + [{"topic": "Topic 9", "content": "A new article."}]
+
+    with index_lock(path):  # another writer, e.g. a bulk ingest, holds the lock
+        thread, result = _in_thread(lambda: sync_index(path, docs, embeddings, embedder="stub"))
+        thread.join(5)
+        assert not thread.is_alive()  # nothing to write: loaded without the lock
+
+        store, report = sync_index(path, changed, embeddings, embedder="stub", wait=False)
+        assert report["deferred"] and report["added"] == 1
+        assert store.index.ntotal == 3  # the current index, until the writer is done
+
+        thread, result = _in_thread(lambda: sync_index(path, changed, embeddings, embedder="stub"))
+        thread.join(0.3)
+        assert thread.is_alive()  # changes to write: waits its turn
+    thread.join(5)
+    store, report = result["value"]
+    assert store.index.ntotal == 4 and "deferred" not in report
+
+
+def test_engine_init_serves_the_current_index_while_locked(tmp_path, embeddings):
+    make_engine(embeddings, index_dir=str(tmp_path))  # builds the index
+    with open(os.path.join("data", "knowledge_base.json")) as f:
+        articles = json.load(f)
+    kb_path = tmp_path / "knowledge_base.json"
+    kb_path.write_text(json.dumps(articles + [{"topic": "Topic 9", "content": "A new article."}]))
+
+    engine = KnowledgeBaseEngine()
+    engine._embeddings = embeddings
+    engine.kb_path = str(kb_path)
+    for name in ("index_path", "tickets_path", "ticket_index_path", "answer_cache_path", "embedding_cache_path"):
+        setattr(engine, name, os.path.join(str(tmp_path), os.path.basename(getattr(engine, name))))
+    with index_lock(engine.index_path):
+        thread, _ = _in_thread(engine.ensure_kb_initialized)
+        thread.join(5)
+        assert not thread.is_alive() and engine.initialized
+        assert engine.vectorstore.index.ntotal == len(articles)
+    for _ in range(50):  # the deferred sync runs in the background once the lock is free
+        if engine.vectorstore.index.ntotal == len(articles) + 1: break
+        time.sleep(0.1)
+    assert engine.vectorstore.index.ntotal == len(articles) + 1
@@ -0,0 +1,124 @@
+import json
+import os
+import sys
+
+import faiss
+import pytest
+
+from backend import ingest
+from backend.indexer import INDEX_FILE, IndexConfig, RebuildRefusedError, load_manifest, sync_index
+from backend.ingest import CHECKPOINT_FILE, SHARD_PREFIX, Ingestor
+
+CONFIG = IndexConfig(index_type="ivf_flat")
+DOCS = [{"topic": f"T{i}", "content": f"content {i}"} for i in range(10)]
+
+
+class Crash(Exception):
+    pass
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "articles.jsonl"
+    with open(path, "w") as f:
+        for i in range(3000):
+            f.write(json.dumps({"topic": f"Q{i}", "content": f"answer words {i} alpha beta {i * 7}"}) + "\n")
+    return str(path)
+
+
+def _ingestor(index_path, embeddings):
+    ingestor = Ingestor(index_path, embeddings, "stub", batch_size=50, workers=2, checkpoint_every=5, config=CONFIG)
+    ingestor.resume()
+    return ingestor
+
+
+def _shards(index_path):
+    return [name for name in os.listdir(index_path) if name.startswith(SHARD_PREFIX)]
+
+
+def test_crash_resumes_from_the_last_checkpoint(tmp_path, embeddings, source):
+    index_path = str(tmp_path / "index")
+    sync_index(index_path, DOCS, embeddings, embedder="stub", config=CONFIG)
+
+    ingestor = _ingestor(index_path, embeddings)
+    commit, calls = ingestor._commit, []
+
+    def crashing_commit(*args):
+        calls.append(args)
+        if len(calls) == 37: raise Crash()
+        return commit(*args)
+
+    ingestor._commit = crashing_commit
+    with pytest.raises(Crash):
+        ingestor.ingest(source)
+    # A killed process drops its connection and lock without closing
+    ingestor.store.close()
+    ingestor._lock.__exit__(None, None, None)
+
+    with open(os.path.join(index_path, CHECKPOINT_FILE)) as f:
+        state = json.load(f)
+    assert state["shards"] and sorted(s["file"] for s in state["shards"]) == sorted(_shards(index_path))
+    assert faiss.read_index(os.path.join(index_path, INDEX_FILE)).ntotal == len(DOCS)
+
+    ingestor = _ingestor(index_path, embeddings)
+    try:
+        ingestor.ingest(source)
+    finally:
+        ingestor.close()
+
+    manifest = load_manifest(index_path)
+    index = faiss.read_index(os.path.join(index_path, INDEX_FILE))
+    assert manifest["index_type"] == "ivf_flat" and manifest["ingested_chunks"] == 3000
+    assert isinstance(index, faiss.IndexIVFFlat) and index.ntotal == 3000 + len(DOCS)
+    assert not _shards(index_path)
+
+    _, report = sync_index(index_path, DOCS, embeddings, embedder="stub", config=CONFIG)
+    assert not report["rebuilt"]
+
+
+def test_reingesting_a_source_is_a_no_op(tmp_path, embeddings, source):
+    index_path = str(tmp_path / "index")
+    sync_index(index_path, DOCS, embeddings, embedder="stub", config=CONFIG)
+    for _ in range(2):
+        ingestor = _ingestor(index_path, embeddings)
+        try:
+            ingestor.ingest(source)
+        finally:
+            ingestor.close()
+    assert faiss.read_index(os.path.join(index_path, INDEX_FILE)).ntotal == 3000 + len(DOCS)
+    vectorstore, _ = sync_index(index_path, DOCS, embeddings, embedder="stub", config=CONFIG)
+    hit = vectorstore.similarity_search("Q1234: answer words 1234 alpha beta 8638", k=1)[0]
+    assert hit.page_content.startswith("Q1234:")
+
+
+def test_rebuilds_never_drop_ingested_records(tmp_path, monkeypatch, embeddings, source):
+    index_path, kb_path = str(tmp_path / "index"), str(tmp_path / "kb.json")
+    sync_index(index_path, DOCS, embeddings, embedder="stub", config=CONFIG)
+    ingestor = _ingestor(index_path, embeddings)
+    try:
+        ingestor.ingest(source)
+    finally:
+        ingestor.close()
+    ntotal = 3000 + len(DOCS)
+
+    # A new index type needs a rebuild: the app keeps serving the current index
+    flat = IndexConfig(index_type="flat")
+    vectorstore, report = sync_index(index_path, DOCS[1:], embeddings, embedder="stub", config=flat)
+    assert report["refused"] and not report["rebuilt"] and vectorstore.index.ntotal == ntotal
+    # ...and a new embedder has no index to serve meanwhile
+    with pytest.raises(RebuildRefusedError):
+        sync_index(index_path, DOCS, embeddings, embedder="other", config=CONFIG)
+    assert faiss.read_index(os.path.join(index_path, INDEX_FILE)).ntotal == ntotal
+
+    # The ingest CLI rebuilds and ingests the recorded sources again
+    with open(kb_path, "w") as f:
+        json.dump(DOCS[1:], f)
+    monkeypatch.setenv("SUPPORTAI_INDEX", "flat")
+    monkeypatch.setattr(ingest, "make_embedder", lambda name: ("stub", embeddings))
+    monkeypatch.setattr(sys, "argv", ["ingest", "--index", index_path, "--kb", kb_path, "--batch-size", "50"])
+    ingest.main()
+    manifest = load_manifest(index_path)
+    assert manifest["index_type"] == "flat" and list(manifest["ingested"]) == [os.path.abspath(source)]
+    assert faiss.read_index(os.path.join(index_path, INDEX_FILE)).ntotal == ntotal - 1
+    _, report = sync_index(index_path, DOCS[1:], embeddings, embedder="stub", config=flat)
+    assert not report["rebuilt"] and not report.get("refused")
@@ -0,0 +1,32 @@
+from backend.lexical import BM25Index, tokenize
+
+TEXTS = [
+    "Printer offline: remove and re-add the printer from Settings.",
+    "VPN: open the Cisco AnyConnect client and reconnect to vpn.company.com.",
+    "Outlook not syncing: restart Outlook, then check the mailbox quota.",
+    "Error 0x80070005 during install: run the installer as administrator.",
+]
+
+
+def test_tokenize_drops_stopwords_and_folds_plurals():
+    assert tokenize("The printers are NOT working for my laptops") == ["printer", "working", "laptop"]
+    assert tokenize("Access denied to class files") == ["access", "denied", "class", "file"]
+
+
+def test_bm25_ranks_by_term_weight():
+    index = BM25Index(TEXTS)
+    assert index.search("my printers are offline", k=1)[0][0] == 0
+    assert index.search("error 0x80070005", k=1)[0][0] == 3
+    # A rare term outweighs a common one
+    ranked = [i for i, _ in BM25Index(TEXTS + ["Restart the printer, then restart Outlook."]).search("outlook quota")]
+    assert ranked[0] == 2
+
+
+def test_bm25_returns_only_matching_documents():
+    index = BM25Index(TEXTS)
+    hits = index.search("reconnect vpn", k=10)
+    assert [i for i, _ in hits] == [1]
+    assert hits[0][1] > 0
+    assert index.search("the and of") == []  # stopwords only
+    assert index.search("kerberos") == []
+    assert BM25Index([]).search("printer") == []
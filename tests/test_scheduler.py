@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.deadline import Deadline
+from backend.scheduler import QueueFullError, Scheduler
+from benchmarks.stubs import StubChatModel
+
+
+def _recording_embedder(calls):
+    def embed_documents(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+    return embed_documents
+
+
+def test_concurrent_embeds_share_one_call():
+    calls = []
+    scheduler = Scheduler(_recording_embedder(calls), window_ms=20)
+
+    async def run():
+        return await asyncio.gather(*(scheduler.embed("x" * i) for i in range(1, 6)))
+
+    assert asyncio.run(run()) == [[1.0], [2.0], [3.0], [4.0], [5.0]]
+    assert calls == [["x", "xx", "xxx", "xxxx", "xxxxx"]] and scheduler.batches == 1
+
+
+def test_full_batch_flushes_without_waiting_for_the_window():
+    calls = []
+    scheduler = Scheduler(_recording_embedder(calls), window_ms=10000, max_batch=2)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(*(scheduler.embed(str(i)) for i in range(4))), 2)
+
+    asyncio.run(run())
+    assert [len(batch) for batch in calls] == [2, 2]
+
+
+def test_embed_errors_reach_every_waiter():
+    def failing(texts):
+        raise ConnectionError("embedder down")
+    scheduler = Scheduler(failing, window_ms=5)
+
+    async def run():
+        return await asyncio.gather(scheduler.embed("a"), scheduler.embed("b"), return_exceptions=True)
+
+    assert all(isinstance(e, ConnectionError) for e in asyncio.run(run()))
+
+
+def test_embed_queue_rejects_past_max_queue():
+    scheduler = Scheduler(_recording_embedder([]), window_ms=50, max_queue=3)
+
+    async def run():
+        return await asyncio.gather(*(scheduler.embed(str(i)) for i in range(5)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert [isinstance(r, QueueFullError) for r in results] == [False, False, False, True, True]
+
+
+def test_generation_slots_bound_concurrency_and_queue():
+    scheduler = Scheduler(_recording_embedder([]), llm_concurrency=2, max_queue=1)
+    running, peak = [0], [0]
+
+    async def generate():
+        async with scheduler.generation_slot():
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.05)
+            running[0] -= 1
+
+    async def run():
+        return await asyncio.gather(*(generate() for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert peak[0] == 2
+    # two run, one waits, the fourth finds the queue full
+    assert [isinstance(r, QueueFullError) for r in results] == [False, False, False, True]
+
+
+def test_generation_slot_wait_times_out():
+    scheduler = Scheduler(_recording_embedder([]), llm_concurrency=1)
+
+    async def run():
+        async with scheduler.generation_slot():
+            with pytest.raises(asyncio.TimeoutError):
+                async with scheduler.generation_slot(timeout=0.05):
+                    pass
+
+    asyncio.run(run())
+
+
+def test_batch_concurrency_is_capped_by_the_scheduler(engine):
+    engine._llm = StubChatModel(first_token_latency=0.1, token_latency=0)
+    engine.scheduler.llm_concurrency = 2
+    texts = ["I forgot my password and cannot log in", "VPN won't connect from home", "Printer shows offline",
+             "Need access to billing"]
+
+    start = time.monotonic()
+    results = asyncio.run(engine.aanalyze_tickets(texts, max_concurrency=100, deadline=Deadline(10)))
+    assert time.monotonic() - start >= 0.2  # two waves of two, not one wave of four
+    assert all(r["resolved"] for r in results)
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from backend.deadline import Deadline
+from backend.rag import TRUNCATED_NOTE
+from benchmarks.stubs import StubEmbeddings
+
+TICKET = "I forgot my password and cannot log in"
+
+
+def _wait_for_index(engine):
+    # record_ticket may hand the first tickets to a background rebuild: wait for it (blocking sync)
+    engine.ticket_index.sync(engine.embeddings, engine.embedder_id or engine.embedder_name)
+
+
+def _context(engine, text=TICKET):
+    category, recs, best_doc = engine.retrieve_context(text)
+    return category, recs, best_doc, engine.embeddings.embed_query(text)
+
+
+def test_resolved_ticket_is_reused(engine):
+    category, recs, best_doc, query_vec = _context(engine)
+    assert engine.record_ticket(TICKET, category, recs, "Use the self-service reset portal.", best_doc=best_doc,
+                                resolved=True)
+    _wait_for_index(engine)
+    assert engine._past_resolution(query_vec, best_doc) == "Use the self-service reset portal."
+    # A different passage is a different problem, however close the wording
+    assert engine._past_resolution(query_vec, best_doc + " (edited)") is None
+
+
+def test_failed_or_fallback_answers_are_not_reused(engine):
+    category, recs, best_doc, query_vec = _context(engine)
+    engine.record_ticket(TICKET, category, recs, "\n\nError generating solution: connection refused",
+                         best_doc=best_doc)
+    engine.record_ticket(TICKET, category, recs, best_doc, best_doc=best_doc)  # "off" mode answer
+    _wait_for_index(engine)
+    assert engine.similar_tickets(None, query_vec=query_vec)[0][1] > engine.ticket_match_threshold
+    assert engine._past_resolution(query_vec, best_doc) is None
+
+
+def test_truncated_stream_is_logged_unresolved(engine, slow_llm):
+    category, recs, best_doc, query_vec = _context(engine)
+    deadline = Deadline(0.3)
+    solution = "".join(engine.stream_solution(TICKET, best_doc, deadline))
+    report = deadline.finish()
+    assert solution.endswith(TRUNCATED_NOTE)
+    assert report["timed_out"] and not report["resolved"]
+
+    ticket_id = engine.record_ticket(TICKET, category, recs, solution, best_doc=best_doc, resolved=report["resolved"])
+    assert engine.tickets.get([ticket_id])[ticket_id]["resolved"] is False
+    _wait_for_index(engine)
+    assert engine._past_resolution(query_vec, best_doc) is None
+
+
+def test_finished_answer_is_resolved_and_reusable(engine):
+    result = engine.analyze_ticket(TICKET, deadline=Deadline(10))
+    assert result["resolved"] and not result["timed_out"]
+    engine.record_ticket(TICKET, result["category"], result["recommendations"], result["solution"],
+                         best_doc=result["best_doc"], resolved=result["resolved"])
+    _wait_for_index(engine)
+    engine.answer_cache.clear()  # only the ticket memory can answer now
+    query_vec = engine.embeddings.embed_query(TICKET)
+    assert engine._past_resolution(query_vec, result["best_doc"]) == result["solution"]
+
+
+def test_batch_reports_which_answers_finished(engine, slow_llm):
+    texts = [TICKET, "VPN won't connect from home"]
+    finished = engine.analyze_ticket_batch(texts, deadline=Deadline(10))
+    assert [r["resolved"] for r in finished] == [True, True]
+
+    engine.answer_cache.clear()
+    timed_out = engine.analyze_ticket_batch(texts, deadline=Deadline(0.2))
+    assert [(r["resolved"], r["timed_out"]) for r in timed_out] == [(False, True), (False, True)]
+    assert all(r["best_doc"] for r in timed_out)
+
+
+def test_analyze_tickets_keeps_its_tuple_contract(engine):
+    texts = [TICKET, "VPN won't connect from home"]
+    results = engine.analyze_tickets(texts)
+    assert all(len(r) == 3 for r in results)
+    assert results == [engine.analyze_full_ticket(text) for text in texts]
+
+
+def test_logging_a_ticket_never_scans_the_table(engine):
+    category, recs, best_doc, _ = _context(engine)
+    engine.record_ticket(TICKET, category, recs, "answer", best_doc=best_doc, resolved=True)
+    _wait_for_index(engine)
+    statements = []
+    engine.tickets._db.set_trace_callback(statements.append)
+    engine.record_ticket(TICKET, category, recs, "answer", best_doc=best_doc, resolved=True)
+    assert statements and not any("COUNT(" in sql.upper() for sql in statements)
+
+
+def test_search_does_not_wait_for_catch_up_embedding(engine):
+    category, recs, best_doc, query_vec = _context(engine)
+    engine.record_ticket(TICKET, category, recs, "answer", best_doc=best_doc, resolved=True)
+    _wait_for_index(engine)
+    engine.tickets.append("Printer shows offline", "Printer Issues", [], "answer")
+    slow = StubEmbeddings(dim=64, call_latency=0.5, text_latency=0)
+    catch_up = threading.Thread(target=engine.ticket_index.catch_up, args=(slow,))
+    catch_up.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    assert engine.ticket_index.search(query_vec)
+    assert time.monotonic() - start < 0.2
+    catch_up.join()
+    assert engine.ticket_index.size == 2
@@ -0,0 +1,54 @@
+from backend.tickets import TicketStore, visible_owner
+
+
+def _store(tmp_path):
+    store = TicketStore(str(tmp_path / "tickets.sqlite"))
+    for i in range(25):
+        store.append(f"ticket {i} about {'printer' if i % 2 else 'vpn'}", "Printer" if i % 2 else "VPN", [],
+                     f"answer {i}", title=f"Title {i}", priority="High" if i % 5 == 0 else "Low",
+                     owner="alice" if i < 10 else "bob")
+    return store
+
+
+def test_pages_are_newest_first_and_cursor_linked(tmp_path):
+    store = _store(tmp_path)
+    seen, cursor = [], None
+    while True:
+        tickets, cursor = store.page(before=cursor, limit=10)
+        seen += [t["id"] for t in tickets]
+        if cursor is None: break
+    assert seen == list(range(25, 0, -1))
+
+    tickets, cursor = store.page(limit=25)
+    assert len(tickets) == 25 and cursor is None  # an exactly full last page has no next page
+
+
+def test_filters_combine(tmp_path):
+    store = _store(tmp_path)
+    tickets, _ = store.page(owner="alice", category="Printer", limit=100)
+    assert [t["text"] for t in tickets] == [f"ticket {i} about printer" for i in (9, 7, 5, 3, 1)]
+    tickets, _ = store.page(priority="High", limit=100)
+    assert {t["id"] for t in tickets} == {1, 6, 11, 16, 21}
+    assert visible_owner("alice", "Employee") == "alice"
+    assert visible_owner("alice", "Support Agent") is None
+
+
+def test_full_text_search(tmp_path):
+    store = _store(tmp_path)
+    assert store.fts
+    tickets, _ = store.page(search="printer", owner="bob", limit=100)
+    assert len(tickets) == 7 and all("printer" in t["text"] for t in tickets)
+    tickets, _ = store.page(search="Title 1", limit=100)  # the last term matches as a prefix
+    assert {t["title"] for t in tickets} == {"Title 1"} | {f"Title {i}" for i in range(10, 20)}
+    tickets, _ = store.page(search="answer 24", limit=100)
+    assert [t["id"] for t in tickets] == [25]
+    # FTS5 operators in user input are matched literally, not parsed
+    assert store.page(search='printer" OR "vpn', limit=100)[0] == []
+    assert store.page(search="NEAR(", limit=100)[0] == []
+
+
+def test_search_paginates_like_the_full_history(tmp_path):
+    store = _store(tmp_path)
+    first, cursor = store.page(search="vpn", limit=5)
+    second, _ = store.page(search="vpn", before=cursor, limit=5)
+    assert [t["id"] for t in first + second] == [25, 23, 21, 19, 17, 15, 13, 11, 9, 7]
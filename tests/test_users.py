@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from backend.users import UserExistsError, UserRepository
+
+
+def _user(username, email):
+    return {"username": username, "password": "x", "name": username.title(), "email": email, "role": "Employee"}
+
+
+def test_username_and_email_are_unique(tmp_path):
+    users = UserRepository(str(tmp_path / "users.sqlite"))
+    users.add(_user("alice", "alice@company.com"))
+    with pytest.raises(UserExistsError, match="username"):
+        users.add(_user("alice", "other@company.com"))
+    with pytest.raises(UserExistsError, match="email"):
+        users.add(_user("alice2", "ALICE@company.com"))  # emails compare case-insensitively
+    users.add(_user("bob", "bob@company.com"))  # the failed inserts left no lock behind
+    assert users.count() == 2
+    assert users.get_by_email("Alice@Company.com")["username"] == "alice"
+
+
+def test_cache_follows_own_and_other_writers(tmp_path):
+    path = str(tmp_path / "users.sqlite")
+    users = UserRepository(path)
+    users.add(_user("alice", "alice@company.com"))
+    assert users.get("alice")["name"] == "Alice"
+
+    users.update("alice", name="Alice Smith", is_admin=True)  # unknown fields are ignored
+    assert users.get("alice")["name"] == "Alice Smith"
+    assert "is_admin" not in users.get("alice")
+
+    UserRepository(path).update("alice", role="Manager")  # another connection, as another process would
+    assert users.get("alice")["role"] == "Manager"
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "users.json"
+    legacy.write_text(json.dumps([_user("alice", "alice@company.com"), _user("bob", "bob@company.com")]))
+    path = str(tmp_path / "users.sqlite")
+    assert UserRepository(path, legacy_json=str(legacy)).count() == 2
+
+    legacy.write_text(json.dumps([_user("carol", "carol@company.com")]))
+    users = UserRepository(path, legacy_json=str(legacy))
+    assert users.count() == 2 and users.get("carol") is None